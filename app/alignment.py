@@ -0,0 +1,172 @@
+import bisect
+import hashlib
+import json
+import logging
+import re
+from difflib import SequenceMatcher
+from typing import Optional
+
+from sqlmodel import Session
+
+from . import jobs, models, scripture
+from .db import shard_of
+from .models import utc_now_iso
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+KIND = "align"
+_WORD = re.compile(r"[0-9a-z]+")
+
+
+def _words(text: Optional[str]) -> list[str]:
+    return _WORD.findall(text.lower()) if text else []
+
+
+def _char_positions(words: list[str]) -> list[int]:
+    """Character offset where each word starts, plus the total; speech time is taken to follow text length."""
+    positions = [0]
+    for word in words:
+        positions.append(positions[-1] + len(word) + 1)
+    return positions
+
+
+def _interpolate(xs: list[float], ys: list[float], x: float) -> float:
+    index = min(max(bisect.bisect_right(xs, x), 1), len(xs) - 1)
+    x0, x1, y0, y1 = xs[index - 1], xs[index], ys[index - 1], ys[index]
+    return y0 if x1 == x0 else y0 + (x - x0) * (y1 - y0) / (x1 - x0)
+
+
+def align(verses: list[Optional[str]], transcript: Optional[str]) -> tuple[list[float], Optional[float]]:
+    """Fraction of the recording (0..1) at which each verse starts, and the share of scripture words matched.
+
+    Scripture and transcript words are aligned with difflib; matched words
+    anchor verse boundaries in the transcript and unmatched stretches are
+    interpolated between anchors. Without a usable transcript verses are
+    spread by their own text length and the share is None.
+    """
+    reference: list[str] = []
+    firsts = []
+    for text in verses:
+        firsts.append(len(reference))
+        reference.extend(_words(text))
+    spoken = _words(transcript)
+    coverage = None
+    ref_anchors, spoken_anchors = [0.0, float(len(reference))], [0.0, float(len(spoken))]
+    if reference and spoken:
+        # autojunk would discard frequent words ("the", "and", "lord"), which are most of scripture.
+        blocks = SequenceMatcher(None, reference, spoken, autojunk=False).get_matching_blocks()
+        matched = sum(block.size for block in blocks)
+        coverage = matched / len(reference)
+        if coverage >= settings.alignment_min_coverage:
+            ref_anchors, spoken_anchors = [0.0], [0.0]
+            for a, b, size in blocks:
+                for k in range(size):
+                    ref_anchors.append(float(a + k))
+                    spoken_anchors.append(float(b + k))
+            ref_anchors.append(float(len(reference)))
+            spoken_anchors.append(float(len(spoken)))
+    if coverage is None or coverage < settings.alignment_min_coverage:
+        spoken, ref_anchors, spoken_anchors = reference, [0.0, float(len(reference))], [0.0, float(len(reference))]
+    positions = _char_positions(spoken)
+    total = positions[-1] or 1
+    word_index = list(range(len(positions)))
+    starts = []
+    for first in firsts:
+        index = _interpolate(ref_anchors, spoken_anchors, first) if len(reference) else 0.0
+        starts.append(_interpolate(word_index, positions, index) / total if len(positions) > 1 else 0.0)
+    # Guard against float jitter so offsets never run backwards.
+    for i in range(1, len(starts)):
+        starts[i] = max(starts[i], starts[i - 1])
+    return starts, coverage
+
+
+def fingerprint(recording: models.Recordings) -> str:
+    """Changes whenever anything the alignment depends on changes, so stale results are dropped."""
+    parts = [
+        recording.blob_key, recording.duration_seconds, recording.chapter_id,
+        recording.verse_index_start, recording.verse_index_end, recording.transcription_text,
+    ]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:32]
+
+
+def run(payload: dict) -> dict:
+    """Job body, run in a worker process."""
+    versions = [payload["version"], "KJV"] if payload["version"] != "KJV" else ["KJV"]
+    for version in versions:
+        verses = scripture.get_verses(payload["book"], payload["chapter"], payload["start"], payload["end"], version)
+        if any(verses):
+            break
+    starts, coverage = align(verses, payload["text"])
+    duration = payload["duration"]
+    return {
+        "version": version,
+        "method": "even" if coverage is None or coverage < settings.alignment_min_coverage else "text",
+        "coverage": None if coverage is None else round(coverage, 4),
+        "offsets": [round(start * duration, 2) for start in starts],
+    }
+
+
+def finish(session: Session, payload: dict, result: dict):
+    recording = session.get(models.Recordings, payload["recording_id"])
+    if recording is None or fingerprint(recording) != payload["fingerprint"]:
+        return
+    alignment = session.get(models.RecordingAlignments, recording.recording_id) or models.RecordingAlignments(
+        recording_id=recording.recording_id
+    )
+    alignment.version = result["version"]
+    alignment.method = result["method"]
+    alignment.coverage = result["coverage"]
+    alignment.offsets = json.dumps(result["offsets"], separators=(",", ":"))
+    alignment.created_at = utc_now_iso()
+    session.add(alignment)
+
+
+def enqueue(session: Session, recording: models.Recordings) -> Optional[models.Jobs]:
+    """Queue alignment once the recording's duration is known (the transcode job calls this)."""
+    if not recording.duration_seconds:
+        return None
+    chapter = session.get(models.Chapters, recording.chapter_id)
+    book = session.get(models.Books, chapter.book_id)
+    bible = session.get(models.Bibles, book.bible_id)
+    return jobs.enqueue(
+        session,
+        KIND,
+        {
+            "recording_id": recording.recording_id,
+            "fingerprint": fingerprint(recording),
+            "book": chapter.canon_book_name,
+            "chapter": chapter.canon_book_chapter,
+            "start": recording.verse_index_start,
+            "end": recording.verse_index_end,
+            "version": bible.version if bible else "KJV",
+            "text": recording.transcription_text,
+            "duration": recording.duration_seconds,
+            "shard": shard_of(recording.recording_id),
+        },
+    )
+
+
+def verse_table(recording: models.Recordings, alignment: models.RecordingAlignments, size: int) -> list[dict]:
+    """Each verse's start/end in seconds and, scaled by time, approximate byte offsets into a file of ``size`` bytes.
+
+    Pass the size of the file being served: the original upload or one of its renditions.
+    """
+    offsets = json.loads(alignment.offsets)
+    duration = recording.duration_seconds or 0.0
+    ends = offsets[1:] + [duration]
+    table = []
+    for verse, start, end in zip(range(recording.verse_index_start, recording.verse_index_end + 1), offsets, ends):
+        table.append(
+            {
+                "verse": verse,
+                "start": start,
+                "end": round(end, 2),
+                "byte_start": int(size * start / duration) if duration else 0,
+                "byte_end": int(size * end / duration) if duration else size,
+            }
+        )
+    return table
+
+
+jobs.register(KIND, run, finish)
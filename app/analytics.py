@@ -0,0 +1,225 @@
+import math
+import sys
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, or_, update
+from sqlmodel import Session, select
+
+from . import crud, models
+from .sketch import DDSketch
+
+HISTOGRAM_BINS = 10
+Agg = models.RecordingAggregates
+
+Scopes = list[tuple[str, int]]
+
+
+def scopes_for(bible_id: int, book_id: int, chapter_id: int) -> Scopes:
+    return [("bible", bible_id), ("book", book_id), ("chapter", chapter_id)]
+
+
+def recording_metrics(rec: models.Recordings) -> tuple[Optional[int], Optional[float]]:
+    """Word count and WPM for a recording, deriving them for rows saved without metrics."""
+    wc = rec.word_count
+    if wc is None and rec.transcription_text:
+        wc = crud.word_count(rec.transcription_text)
+    wpm = rec.wpm
+    if wpm is None and wc and rec.duration_seconds and rec.duration_seconds > 0:
+        wpm = (wc / rec.duration_seconds) * 60
+    return wc, wpm
+
+
+def _deltas(rec: models.Recordings, sign: int) -> tuple[dict, Optional[float]]:
+    wc, wpm = recording_metrics(rec)
+    deltas = {
+        "recording_count": sign,
+        "duration_sum": sign * (rec.duration_seconds or 0.0),
+        "play_total": sign * (rec.accessed_count or 0),
+    }
+    if wc is not None:
+        deltas["word_count_n"] = sign
+        deltas["word_count_sum"] = sign * wc
+    if wpm is not None:
+        deltas["wpm_n"] = sign
+        deltas["wpm_sum"] = sign * wpm
+        deltas["wpm_sumsq"] = sign * wpm * wpm
+    return deltas, wpm
+
+
+def _scoped(stmt, scope: str, scope_id: int):
+    if scope == "chapter":
+        return stmt.where(models.Recordings.chapter_id == scope_id)
+    stmt = stmt.join(models.Chapters, models.Chapters.chapter_id == models.Recordings.chapter_id)
+    if scope == "book":
+        return stmt.where(models.Chapters.book_id == scope_id)
+    stmt = stmt.join(models.Books, models.Books.book_id == models.Chapters.book_id)
+    return stmt.where(models.Books.bible_id == scope_id)
+
+
+def _locked_row(session: Session, scope: str, scope_id: int, deltas: dict) -> Agg:
+    # The UPDATE takes the write lock before the row is read back, so the
+    # sketch read-modify-write below cannot interleave with another writer.
+    result = session.exec(
+        update(Agg)
+        .where(Agg.scope == scope, Agg.scope_id == scope_id)
+        .values({name: getattr(Agg, name) + delta for name, delta in deltas.items()})
+    )
+    if result.rowcount == 0:
+        session.add(Agg(scope=scope, scope_id=scope_id, **deltas))
+        session.flush()
+    return session.get(Agg, (scope, scope_id), populate_existing=True)
+
+
+def apply_recording(session: Session, rec: models.Recordings, scopes: Scopes, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) a recording's contribution to its aggregates.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    deltas, wpm = _deltas(rec, sign)
+    for scope, scope_id in scopes:
+        row = _locked_row(session, scope, scope_id, deltas)
+        if wpm is None:
+            continue
+        sketch = DDSketch.from_json(row.wpm_sketch)
+        sketch.add(wpm, sign)
+        row.wpm_sketch = sketch.to_json()
+        if sign > 0:
+            row.wpm_min = wpm if row.wpm_min is None else min(row.wpm_min, wpm)
+            row.wpm_max = wpm if row.wpm_max is None else max(row.wpm_max, wpm)
+        elif row.wpm_n <= 0:
+            row.wpm_min = row.wpm_max = None
+        elif wpm <= row.wpm_min or wpm >= row.wpm_max:
+            stmt = select(func.min(models.Recordings.wpm), func.max(models.Recordings.wpm)).where(
+                models.Recordings.recording_id != rec.recording_id
+            )
+            row.wpm_min, row.wpm_max = session.exec(_scoped(stmt, scope, scope_id)).one()
+        session.add(row)
+
+
+def record_plays(session: Session, scopes: Scopes, count: int = 1):
+    for scope, scope_id in scopes:
+        session.exec(
+            update(Agg)
+            .where(Agg.scope == scope, Agg.scope_id == scope_id)
+            .values(play_total=Agg.play_total + count)
+        )
+
+
+def rebuild(session: Session, bible_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute aggregates from the recordings table to repair drift. Returns recordings scanned."""
+    stmt = (
+        select(models.Recordings, models.Chapters.book_id, models.Books.bible_id)
+        .join(models.Chapters, models.Chapters.chapter_id == models.Recordings.chapter_id)
+        .join(models.Books, models.Books.book_id == models.Chapters.book_id)
+    )
+    if bible_ids is None:
+        session.exec(delete(Agg))
+    else:
+        bible_ids = list(bible_ids)
+        stmt = stmt.where(models.Books.bible_id.in_(bible_ids))
+        book_ids = select(models.Books.book_id).where(models.Books.bible_id.in_(bible_ids))
+        chapter_ids = select(models.Chapters.chapter_id).where(models.Chapters.book_id.in_(book_ids))
+        session.exec(
+            delete(Agg).where(
+                or_(
+                    (Agg.scope == "bible") & Agg.scope_id.in_(bible_ids),
+                    (Agg.scope == "book") & Agg.scope_id.in_(book_ids),
+                    (Agg.scope == "chapter") & Agg.scope_id.in_(chapter_ids),
+                )
+            )
+        )
+
+    rows: dict[tuple[str, int], Agg] = {}
+    sketches: dict[tuple[str, int], DDSketch] = {}
+    scanned = 0
+    for rec, book_id, bible_id in session.exec(stmt.execution_options(yield_per=1000)):
+        scanned += 1
+        deltas, wpm = _deltas(rec, 1)
+        for key in scopes_for(bible_id, book_id, rec.chapter_id):
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = Agg(scope=key[0], scope_id=key[1])
+                sketches[key] = DDSketch()
+            for name, delta in deltas.items():
+                setattr(row, name, getattr(row, name) + delta)
+            if wpm is not None:
+                sketches[key].add(wpm)
+                row.wpm_min = wpm if row.wpm_min is None else min(row.wpm_min, wpm)
+                row.wpm_max = wpm if row.wpm_max is None else max(row.wpm_max, wpm)
+    for key, row in rows.items():
+        row.wpm_sketch = sketches[key].to_json()
+        session.add(row)
+    session.commit()
+    return scanned
+
+
+def ensure_built(session: Session):
+    """Build aggregates once for databases that predate them."""
+    if session.exec(select(Agg.scope)).first() is None and session.exec(select(models.Recordings.recording_id)).first():
+        rebuild(session)
+
+
+def _histogram(sketch: DDSketch, vmin: Optional[float], vmax: Optional[float], bins: int = HISTOGRAM_BINS) -> list[dict]:
+    total = sketch.count
+    if not total or vmin is None:
+        return []
+    if vmin == vmax:
+        return [{"bin_start": vmin, "bin_end": vmax, "count": total}]
+    width = (vmax - vmin) / bins
+    counts = [0] * bins
+    for value, count in sketch.items():
+        idx = min(max(int((value - vmin) / width), 0), bins - 1)
+        counts[idx] += count
+    return [
+        {"bin_start": vmin + i * width, "bin_end": vmin + (i + 1) * width, "count": count}
+        for i, count in enumerate(counts)
+    ]
+
+
+def summary(session: Session, scope: str, scope_id: int, pending_plays: int = 0) -> dict:
+    """Stats for one scope; ``pending_plays`` adds plays not yet flushed to the table."""
+    row = session.get(Agg, (scope, scope_id))
+    if row is None:
+        row = Agg(scope=scope, scope_id=scope_id)
+    n = row.wpm_n
+    mean = row.wpm_sum / n if n else None
+    sketch = DDSketch.from_json(row.wpm_sketch)
+
+    def quantile(q: float) -> Optional[float]:
+        value = sketch.quantile(q)
+        if value is None or row.wpm_min is None:
+            return value
+        return min(max(value, row.wpm_min), row.wpm_max)
+
+    stats = {
+        "count": n,
+        "min": row.wpm_min,
+        "max": row.wpm_max,
+        "mean": mean,
+        "median": quantile(0.5),
+        "std": math.sqrt(max(row.wpm_sumsq / n - mean * mean, 0.0)) if n else None,
+        "q1": quantile(0.25),
+        "q3": quantile(0.75),
+        "histogram": _histogram(sketch, row.wpm_min, row.wpm_max),
+    }
+    return {
+        "total_recordings": row.recording_count,
+        "total_words": row.word_count_sum,
+        "avg_word_count": row.word_count_sum / row.word_count_n if row.word_count_n else None,
+        "avg_wpm": mean,
+        "avg_duration_seconds": row.duration_sum / row.recording_count if row.recording_count else None,
+        "total_plays": row.play_total + pending_plays,
+        "wpm_stats": stats,
+    }
+
+
+if __name__ == "__main__":
+    from .db import shard_engine, shard_ids
+
+    ids = [int(arg) for arg in sys.argv[1:]] or None
+    scanned = 0
+    # Each shard keeps the aggregates of its own bibles.
+    for number in shard_ids():
+        with Session(shard_engine(number)) as session:
+            scanned += rebuild(session, ids)
+    print(f"Rebuilt recording aggregates from {scanned} recordings")
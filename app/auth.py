@@ -1,20 +1,28 @@
+import hashlib
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from . import models
-from .db import get_session
+from . import metrics, models
+from .cache import TTLCache
+from .db import get_async_session, get_session
+from .passwords import pwd_context
 from .settings import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
+# Validated token -> user snapshot, so repeat requests skip the JWT decode and the Users query.
+_token_cache = TTLCache(maxsize=settings.token_cache_size, ttl=settings.token_cache_ttl_seconds)
+metrics.register_cache("tokens", _token_cache)
 
+
+# Blocking; request handlers use the pooled versions in app/passwords.py.
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -30,21 +38,62 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> models.Users:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _claims(token: str) -> tuple[int, float]:
+    """The token's user id and expiry timestamp."""
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        user_id: int = int(payload.get("sub"))
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+        with metrics.timed("auth_decode"):
+            payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        return int(payload.get("sub")), float(payload["exp"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise _credentials_exception()
+
+
+def _token_key(token: str) -> bytes:
+    # Keyed by digest so the cache never holds usable credentials.
+    return hashlib.sha256(token.encode()).digest()
+
+
+def _cached_user(token: str) -> Optional[models.Users]:
+    snapshot = _token_cache.get(_token_key(token))
+    # A fresh, detached instance each time, so no request can change another's copy.
+    return None if snapshot is None else models.Users(**snapshot)
 
+
+def _remember(token: str, expires: float, user: models.Users):
+    ttl = min(settings.token_cache_ttl_seconds, expires - time.time())
+    if ttl > 0:
+        _token_cache.set(_token_key(token), user.model_dump(), ttl)
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> models.Users:
+    user = _cached_user(token)
+    if user is not None:
+        return user
+    user_id, expires = _claims(token)
     user = session.exec(select(models.Users).where(models.Users.user_id == user_id)).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    _remember(token, expires, user)
+    return user
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_async_session)
+) -> models.Users:
+    user = _cached_user(token)
+    if user is not None:
+        return user
+    user_id, expires = _claims(token)
+    user = await session.get(models.Users, user_id)
+    if user is None:
+        raise _credentials_exception()
+    _remember(token, expires, user)
     return user
@@ -0,0 +1,274 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from sqlmodel import Session, select
+
+from . import models
+from .db import get_shard, shard_ids
+from .settings import settings
+
+# The recording metrics projection (never audio or transcripts) as NumPy
+# columns, sorted by recording_id. One copy per process covers every bible
+# (and every shard); it is rebuilt after analytics_frame_ttl_seconds or on invalidate().
+
+GROUPINGS = ("book", "chapter", "user", "testament", "day", "week", "month", "year")
+BUCKETS = ("day", "week", "month", "year")
+QUANTILES = (0.0, 0.25, 0.5, 0.75, 1.0)
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+@dataclass
+class Frame:
+    recording_id: np.ndarray  # int64
+    bible_id: np.ndarray  # int64
+    user_id: np.ndarray  # int64
+    book_order: np.ndarray  # canonical order; the same book has the same value in every bible
+    chapter: np.ndarray  # chapter number within the book
+    testament: np.ndarray  # index into testaments
+    day: np.ndarray  # days since 1970-01-01 the recording was made
+    wpm: np.ndarray  # float64, NaN where unknown
+    duration: np.ndarray  # float64, NaN where unknown
+    words: np.ndarray  # float64, NaN where unknown
+    plays: np.ndarray  # int64, stored count only
+    book_names: dict  # canonical order -> book name
+    testaments: list
+
+    def __len__(self) -> int:
+        return len(self.recording_id)
+
+
+def _floats(values) -> np.ndarray:
+    return np.fromiter((np.nan if v is None else v for v in values), dtype=np.float64, count=len(values))
+
+
+def _rows(session: Session) -> list:
+    return session.exec(
+        select(
+            models.Recordings.recording_id,
+            models.Books.bible_id,
+            models.Recordings.user_id,
+            models.CanonBooks.canonical_order,
+            models.CanonBooks.canon_book_name,
+            models.Chapters.canon_book_chapter,
+            models.CanonBooks.testament,
+            models.Recordings.date_recorded,
+            models.Recordings.wpm,
+            models.Recordings.duration_seconds,
+            models.Recordings.word_count,
+            models.Recordings.accessed_count,
+        )
+        .join(models.Chapters, models.Chapters.chapter_id == models.Recordings.chapter_id)
+        .join(models.Books, models.Books.book_id == models.Chapters.book_id)
+        .join(models.CanonBooks, models.CanonBooks.canon_book_name == models.Books.canon_book_name)
+        .order_by(models.Recordings.recording_id)
+    ).all()
+
+
+def load() -> Frame:
+    rows = []
+    # Shard ids occupy increasing id ranges, so concatenating shards in order keeps the rows sorted.
+    for number in shard_ids():
+        with Session(get_shard(number).read_engine) as session:
+            rows.extend(_rows(session))
+    columns = list(zip(*rows)) or [()] * 12
+    (ids, bibles, users, orders, names, chapters, testaments, dates, wpm, duration, words, plays) = columns
+    testament_names, testament_codes = np.unique(np.array(testaments, dtype=str), return_inverse=True)
+    days = (np.array([d[:10] for d in dates], dtype="datetime64[D]") - _EPOCH).astype(np.int64)
+    return Frame(
+        recording_id=np.array(ids, dtype=np.int64),
+        bible_id=np.array(bibles, dtype=np.int64),
+        user_id=np.array(users, dtype=np.int64),
+        book_order=np.array(orders, dtype=np.int64),
+        chapter=np.array(chapters, dtype=np.int64),
+        testament=testament_codes.astype(np.int64),
+        day=days,
+        wpm=_floats(wpm),
+        duration=_floats(duration),
+        words=_floats(words),
+        plays=np.array(plays, dtype=np.int64),
+        book_names=dict(zip(orders, names)),
+        testaments=[str(name) for name in testament_names],
+    )
+
+
+_lock = threading.Lock()
+_cached: Optional[tuple[float, Frame]] = None
+
+
+def frame() -> Frame:
+    global _cached
+    with _lock:
+        if _cached is None or time.monotonic() - _cached[0] > settings.analytics_frame_ttl_seconds:
+            _cached = (time.monotonic(), load())
+        return _cached[1]
+
+
+def invalidate():
+    global _cached
+    with _lock:
+        _cached = None
+
+
+def with_pending_plays(f: Frame, pending: dict[int, int]) -> np.ndarray:
+    """Stored play counts plus plays still buffered in this process."""
+    plays = f.plays.copy()
+    if pending and len(f):
+        ids = np.fromiter(pending.keys(), dtype=np.int64, count=len(pending))
+        counts = np.fromiter(pending.values(), dtype=np.int64, count=len(pending))
+        positions = np.minimum(np.searchsorted(f.recording_id, ids), len(f) - 1)
+        found = f.recording_id[positions] == ids
+        np.add.at(plays, positions[found], counts[found])
+    return plays
+
+
+def _distribution(groups: np.ndarray, n_groups: int, values: np.ndarray) -> dict[str, np.ndarray]:
+    """Count, sum, mean, std and quantiles of ``values`` per group, ignoring NaN, without a Python loop."""
+    valid = ~np.isnan(values)
+    g, v = groups[valid], values[valid]
+    count = np.bincount(g, minlength=n_groups)
+    total = np.bincount(g, weights=v, minlength=n_groups)
+    squares = np.bincount(g, weights=v * v, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        std = np.sqrt(np.maximum(squares / count - mean * mean, 0.0))
+    # Sorted by group, then value: each group's values are a contiguous, ordered run.
+    ordered = v[np.lexsort((v, g))]
+    starts = np.cumsum(count) - count
+    stats = {"count": count, "sum": total, "mean": mean, "std": std}
+    for q, name in zip(QUANTILES, ("min", "p25", "median", "p75", "max")):
+        position = np.maximum(count - 1, 0) * q
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        if len(ordered):
+            lo = ordered[np.minimum(starts + low, len(ordered) - 1)]
+            hi = ordered[np.minimum(starts + high, len(ordered) - 1)]
+            value = lo + (hi - lo) * (position - low)
+        else:
+            value = np.zeros(n_groups)
+        stats[name] = np.where(count > 0, value, np.nan)
+    return stats
+
+
+def _bucket_start(bucket: str, key: int) -> str:
+    if bucket == "day":
+        return str(_EPOCH + key)
+    if bucket == "week":
+        return str(_EPOCH + key * 7 - 3)
+    if bucket == "month":
+        return str(np.datetime64(key, "M"))
+    return str(np.datetime64(key, "Y"))
+
+
+def _keys(f: Frame, by: str) -> np.ndarray:
+    if by == "book":
+        return f.book_order
+    if by == "chapter":
+        return f.book_order * 1000 + f.chapter
+    if by == "user":
+        return f.user_id
+    if by == "testament":
+        return f.testament
+    if by == "all":
+        return np.zeros(len(f), dtype=np.int64)
+    if by == "week":
+        # 1970-01-01 was a Thursday; shifting by three days starts weeks on Monday.
+        return (f.day + 3) // 7
+    if by == "month":
+        return (_EPOCH + f.day).astype("datetime64[M]").astype(np.int64)
+    if by == "year":
+        return (_EPOCH + f.day).astype("datetime64[Y]").astype(np.int64)
+    return f.day
+
+
+def _label(f: Frame, by: str, key: int, usernames: dict) -> str:
+    if by == "book":
+        return f.book_names.get(key, str(key))
+    if by == "chapter":
+        return f"{f.book_names.get(key // 1000, key // 1000)} {key % 1000}"
+    if by == "user":
+        return usernames.get(key, str(key))
+    if by == "testament":
+        return f.testaments[key]
+    if by in BUCKETS:
+        return _bucket_start(by, key)
+    if by == "all":
+        return "All"
+    return str(key)
+
+
+def _number(value) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 3)
+
+
+def group(f: Frame, mask: np.ndarray, by: str, plays: np.ndarray, usernames: Optional[dict] = None) -> list[dict]:
+    """WPM, duration and play distributions of the masked recordings per ``by`` key, in key order."""
+    keys, inverse = np.unique(_keys(f, by)[mask], return_inverse=True)
+    n = len(keys)
+    inverse = inverse.reshape(-1)
+    wpm = _distribution(inverse, n, f.wpm[mask])
+    duration = _distribution(inverse, n, f.duration[mask])
+    played = _distribution(inverse, n, plays[mask].astype(np.float64))
+    words = np.bincount(inverse, weights=np.nan_to_num(f.words[mask]), minlength=n)
+    recordings = np.bincount(inverse, minlength=n)
+    usernames = usernames or {}
+    return [
+        {
+            "key": int(key),
+            "label": _label(f, by, int(key), usernames),
+            "recordings": int(recordings[i]),
+            "words": int(words[i]),
+            "wpm": {
+                name: _number(wpm[name][i]) for name in ("mean", "std", "min", "p25", "median", "p75", "max")
+            },
+            "duration": {name: _number(duration[name][i]) for name in ("sum", "mean", "median", "max")},
+            "plays": {name: _number(played[name][i]) for name in ("sum", "mean", "max")},
+        }
+        for i, key in enumerate(keys)
+    ]
+
+
+def trend(f: Frame, mask: np.ndarray, bucket: str, plays: np.ndarray) -> dict:
+    """Per-bucket reading speed plus a least-squares slope of WPM over time (words per minute per 30 days)."""
+    points = group(f, mask, bucket, plays)
+    wpm = f.wpm[mask]
+    days = f.day[mask].astype(np.float64)
+    known = ~np.isnan(wpm)
+    slope = None
+    if known.sum() >= 2 and np.ptp(days[known]) > 0:
+        slope = round(float(np.polyfit(days[known], wpm[known], 1)[0]) * 30, 3)
+    return {"bucket": bucket, "wpm_slope_per_30_days": slope, "points": points}
+
+
+def mask_for(
+    f: Frame,
+    bible_ids,
+    book_order: Optional[int] = None,
+    chapter: Optional[int] = None,
+    user_id: Optional[int] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> np.ndarray:
+    mask = np.isin(f.bible_id, list(bible_ids))
+    if book_order is not None:
+        mask &= f.book_order == book_order
+    if chapter is not None:
+        mask &= f.chapter == chapter
+    if user_id is not None:
+        mask &= f.user_id == user_id
+    if since:
+        mask &= f.day >= (np.datetime64(since[:10], "D") - _EPOCH).astype(np.int64)
+    if until:
+        mask &= f.day <= (np.datetime64(until[:10], "D") - _EPOCH).astype(np.int64)
+    return mask
+
+
+def usernames(session: Session, user_ids) -> dict[int, str]:
+    ids = [int(user_id) for user_id in user_ids]
+    if not ids:
+        return {}
+    return dict(
+        session.exec(select(models.Users.user_id, models.Users.username).where(models.Users.user_id.in_(ids))).all()
+    )
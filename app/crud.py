@@ -1,41 +1,155 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
 from fastapi import HTTPException, status
+from sqlalchemy import delete, or_, update
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 
 from . import models
+from .permissions import Grants, get_grants
+from .settings import settings
+from .storage import get_blob_store
 
 
-def ensure_manage(session: Session, user: models.Users, bible_id: int):
-    auth = session.exec(select(models.Auths).where(models.Auths.user_id == user.user_id)).first()
-    if not auth:
+def ensure_manage(session: Session, user: models.Users, bible_id: int) -> Grants:
+    grants = get_grants(session, user.user_id)
+    if grants.auth_id is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No auth record")
-    link = session.exec(
-        select(models.ManageAuths).where(
-            models.ManageAuths.auth_id == auth.auth_id, models.ManageAuths.bible_id == bible_id
-        )
-    ).first()
-    if not link:
+    if not grants.can_manage(bible_id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No manage access")
-    return auth
+    return grants
 
 
-def ensure_listen(session: Session, user: models.Users, bible_id: int):
-    auth = session.exec(select(models.Auths).where(models.Auths.user_id == user.user_id)).first()
-    if not auth:
+def ensure_listen(session: Session, user: models.Users, bible_id: int) -> Grants:
+    grants = get_grants(session, user.user_id)
+    if grants.auth_id is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No auth record")
-    link = session.exec(
-        select(models.ListenAuths).where(
-            models.ListenAuths.auth_id == auth.auth_id, models.ListenAuths.bible_id == bible_id
-        )
-    ).first()
-    manage = session.exec(
-        select(models.ManageAuths).where(
-            models.ManageAuths.auth_id == auth.auth_id, models.ManageAuths.bible_id == bible_id
-        )
-    ).first()
-    if not link and not manage:
+    if not grants.can_listen(bible_id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No listen access")
-    return auth
+    return grants
 
 
 def word_count(text: str) -> int:
     return len([w for w in text.split() if w]) if text else 0
+
+
+def _blob_in_use(session: Session, blob_key: str) -> bool:
+    return (
+        session.exec(select(models.Recordings.recording_id).where(models.Recordings.blob_key == blob_key)).first()
+        or session.exec(select(models.Renditions.recording_id).where(models.Renditions.blob_key == blob_key)).first()
+    ) is not None
+
+
+def release_blob(session: Session, blob_key: Optional[str]):
+    """Mark a blob for deletion once no recording references it (uploads are deduplicated by hash).
+
+    Only a BlobReleases marker is written, in the caller's transaction; the
+    object itself goes in ``sweep_blobs`` after ``blob_release_grace_seconds``,
+    so an upload of the same content that is still in flight keeps it.
+    """
+    if blob_key:
+        session.merge(models.BlobReleases(blob_key=blob_key, released_at=models.utc_now_iso()))
+
+
+def retain_blob(blob_key: str):
+    """Cancel a pending release of ``blob_key``; the blob store calls this before writing or reusing an object.
+
+    Deleting the marker waits for a sweep holding it, so either the sweep never
+    sees the marker or the object is already gone and gets written again.
+    """
+    # Imported here: app.db imports this module (through app.search).
+    from .db import shard_engine, shard_ids
+
+    for number in shard_ids():
+        with Session(shard_engine(number)) as session:
+            result = session.exec(delete(models.BlobReleases).where(models.BlobReleases.blob_key == blob_key))
+            if result.rowcount:
+                session.commit()
+
+
+def sweep_blobs(limit: int = 500) -> int:
+    """Delete released blobs past the grace period that nothing references any more. Returns how many."""
+    from .db import shard_engine, shard_ids
+
+    cutoff = (datetime.utcnow() - timedelta(seconds=settings.blob_release_grace_seconds)).isoformat()
+    store = get_blob_store()
+    deleted = 0
+    for number in shard_ids():
+        with Session(shard_engine(number)) as session:
+            keys = session.exec(
+                select(models.BlobReleases.blob_key).where(models.BlobReleases.released_at < cutoff).limit(limit)
+            ).all()
+        for blob_key in keys:
+            with Session(shard_engine(number)) as session:
+                # Taking the marker holds the shard's write lock until commit, so retain_blob waits for us.
+                claimed = session.exec(
+                    delete(models.BlobReleases).where(
+                        models.BlobReleases.blob_key == blob_key, models.BlobReleases.released_at < cutoff
+                    )
+                )
+                if claimed.rowcount and not _blob_in_use_anywhere(session, number, blob_key):
+                    store.delete_object(blob_key)
+                    deleted += 1
+                session.commit()
+    return deleted
+
+
+def _blob_in_use_anywhere(session: Session, shard: int, blob_key: str) -> bool:
+    """``session`` is on ``shard``; identical uploads to bibles on different shards share one blob."""
+    from .db import shard_engine, shard_ids
+
+    if _blob_in_use(session, blob_key):
+        return True
+    for number in shard_ids():
+        if number != shard:
+            with Session(shard_engine(number)) as other:
+                if _blob_in_use(other, blob_key):
+                    return True
+    return False
+
+
+def get_state(session: Session, key: str) -> Optional[str]:
+    state = session.get(models.AppState, key)
+    return state.value if state else None
+
+
+def set_state(session: Session, key: str, value: str):
+    state = session.get(models.AppState, key) or models.AppState(key=key)
+    state.value = value
+    session.add(state)
+
+
+def claim_state(session: Session, key: str, lease_seconds: float) -> bool:
+    """Take the lease stored in AppState row ``key``; False while another process holds it.
+
+    A conditional UPDATE, like the job queue's claim, so exactly one of several
+    app processes wins. The lease lapses after ``lease_seconds`` if its holder dies.
+    Commits.
+    """
+    if session.exec(select(models.AppState.key).where(models.AppState.key == key)).first() is None:
+        try:
+            session.add(models.AppState(key=key))
+            session.commit()
+        except IntegrityError:
+            # Another process created the row first.
+            session.rollback()
+    now = datetime.utcnow()
+    result = session.exec(
+        update(models.AppState)
+        .where(
+            models.AppState.key == key,
+            or_(
+                models.AppState.value.is_(None),
+                models.AppState.value < (now - timedelta(seconds=lease_seconds)).isoformat(),
+            ),
+        )
+        .values(value=now.isoformat())
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def release_state(session: Session, key: str):
+    session.exec(update(models.AppState).where(models.AppState.key == key).values(value=None))
+    session.commit()
@@ -1,9 +1,224 @@
-from sqlmodel import SQLModel, Session, create_engine
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
 
+import anyio
+from sqlalchemy import event, inspect, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, Session, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import metrics, migrations, models, search
 from .settings import settings
+from .storage import migrate_legacy_blobs
+
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def _async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}{sep}{rest}"
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _in_memory(url: str) -> bool:
+    return _is_sqlite(url) and make_url(url).database in (None, "", ":memory:")
+
+
+def _pool_options(url: str) -> dict:
+    # In-memory SQLite uses a single-connection pool that takes no sizing options.
+    if _in_memory(url):
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+
+
+def sqlite_pragmas(read_only: bool = False) -> list[str]:
+    pragmas = [
+        # WAL lets readers run while one connection writes; NORMAL only syncs at checkpoints.
+        f"PRAGMA journal_mode={settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        # Wait for the write lock instead of failing with "database is locked".
+        f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}",
+        f"PRAGMA mmap_size={settings.sqlite_mmap_size}",
+        f"PRAGMA cache_size=-{settings.sqlite_cache_kib}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+def _apply_pragmas(sync_engine, read_only: bool, attach: Optional[str] = None):
+    pragmas = sqlite_pragmas(read_only)
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        if attach:
+            cursor.execute("ATTACH DATABASE ? AS shared", (attach,))
+        cursor.close()
+
+
+def make_engine(url: str, read_only: bool = False, attach: Optional[str] = None, name: Optional[str] = None):
+    engine = create_engine(url, echo=False, **_pool_options(url))
+    if _is_sqlite(url):
+        _apply_pragmas(engine, read_only, attach)
+    metrics.instrument_engine(engine, name or ("read" if read_only else "primary"))
+    return engine
+
+
+def make_async_engine(url: str, read_only: bool = False, attach: Optional[str] = None, name: Optional[str] = None):
+    engine = create_async_engine(url, echo=False, **_pool_options(url))
+    if _is_sqlite(url):
+        _apply_pragmas(engine.sync_engine, read_only, attach)
+    metrics.instrument_engine(engine.sync_engine, name or ("async_read" if read_only else "async_primary"))
+    return engine
+
+
+engine = make_engine(settings.database_url)
+async_engine = make_async_engine(settings.async_database_url or _async_url(settings.database_url))
+if settings.read_database_url:
+    read_engine = make_engine(settings.read_database_url, read_only=True)
+    async_read_engine = make_async_engine(
+        settings.async_read_database_url or _async_url(settings.read_database_url), read_only=True
+    )
+elif _is_sqlite(settings.database_url) and not _in_memory(settings.database_url):
+    # Reads get their own query_only pool on the same file; in WAL mode they never block the writer.
+    read_engine = make_engine(settings.database_url, read_only=True)
+    async_read_engine = make_async_engine(
+        settings.async_database_url or _async_url(settings.database_url), read_only=True
+    )
+else:
+    read_engine, async_read_engine = engine, async_engine
+
+
+# Sharding (settings.shard_count > 0): a bible's recordings, renditions, alignments, aggregates,
+# playlist revision, transcript index and the jobs queued for them live in one shard file. Shard connections ATTACH the
+# primary as "shared", so the tables a shard lacks (users, grants, canon, uploads, ...) resolve there
+# and every query runs unchanged on a shard session. Writes to one bible only take its shard's write lock.
+# A transaction that writes both files is not atomic across them (SQLite only guarantees that with a
+# rollback journal, not WAL), so write paths keep to the shard and the few that also touch the primary
+# (resumable upload commits, maintenance progress) commit the shard first and tolerate a retry.
+# The shard is in the top bits of recording_id; shard 0 is the primary itself.
+
+SHARD_BITS = 40
+SHARD_TABLES = (
+    "recordings", "renditions", "recordingalignments", "recordingaggregates", "playlistrevisions", "jobs",
+    "blobreleases", "schemamigrations",
+)
+
+
+@dataclass
+class Shard:
+    engine: Any
+    read_engine: Any
+    async_engine: Any
+    async_read_engine: Any
+
+
+_shards = {0: Shard(engine, read_engine, async_engine, async_read_engine)}
+_shards_lock = threading.Lock()
+_bible_shards: dict[int, int] = {}
+
+
+def shard_of(recording_id: int) -> int:
+    return recording_id >> SHARD_BITS
+
+
+def shard_ids() -> list[int]:
+    return list(range(settings.shard_count + 1))
+
+
+def _shard_url(number: int) -> str:
+    return f"sqlite:///{Path(settings.shard_dir) / f'shard-{number}.db'}"
+
+
+def get_shard(number: int) -> Shard:
+    """Engines for shard ``number``. Unknown shards map to the primary, where their ids are simply not found."""
+    if not 0 < number <= settings.shard_count:
+        number = 0
+    shard = _shards.get(number)
+    if shard is None:
+        with _shards_lock:
+            shard = _shards.get(number)
+            if shard is None:
+                url, shared, name = _shard_url(number), make_url(settings.database_url).database, f"shard{number}"
+                shard = _shards[number] = Shard(
+                    make_engine(url, attach=shared, name=name),
+                    make_engine(url, read_only=True, attach=shared, name=f"{name}_read"),
+                    make_async_engine(_async_url(url), attach=shared, name=f"async_{name}"),
+                    make_async_engine(_async_url(url), read_only=True, attach=shared, name=f"async_{name}_read"),
+                )
+    return shard
+
 
+def shard_engine(number: int):
+    return get_shard(number).engine
 
-engine = create_engine(settings.database_url, echo=False)
+
+def shard_for_bible(bible_id: int) -> int:
+    """The bible's shard, assigned and stored on ``Bibles.shard`` the first time it is needed."""
+    if not settings.shard_count:
+        return 0
+    shard = _bible_shards.get(bible_id)
+    if shard is not None:
+        return shard
+    with Session(engine) as session:
+        bible = session.get(models.Bibles, bible_id)
+        if bible is None:
+            return 0
+        if bible.shard is None:
+            # Bibles with recordings from before sharding was turned on stay in the primary.
+            legacy = session.exec(
+                select(models.Recordings.recording_id)
+                .join(models.Chapters, models.Chapters.chapter_id == models.Recordings.chapter_id)
+                .join(models.Books, models.Books.book_id == models.Chapters.book_id)
+                .where(models.Books.bible_id == bible_id)
+                .limit(1)
+            ).first()
+            assigned = 0 if legacy is not None else (bible_id - 1) % settings.shard_count + 1
+            session.exec(
+                update(models.Bibles)
+                .where(models.Bibles.bible_id == bible_id, models.Bibles.shard.is_(None))
+                .values(shard=assigned)
+            )
+            session.commit()
+            session.refresh(bible)
+        shard = _bible_shards[bible_id] = bible.shard
+    return shard
+
+
+async def _async_shard_for_bible(bible_id: int) -> int:
+    shard = _bible_shards.get(bible_id) if settings.shard_count else 0
+    return shard if shard is not None else await anyio.to_thread.run_sync(shard_for_bible, bible_id)
+
+
+def bible_session(bible_id: int, read: bool = False) -> Session:
+    shard = get_shard(shard_for_bible(bible_id))
+    return Session(shard.read_engine if read else shard.engine)
+
+
+async def async_bible_session(bible_id: int, read: bool = False) -> AsyncSession:
+    shard = get_shard(await _async_shard_for_bible(bible_id))
+    return AsyncSession(shard.async_read_engine if read else shard.async_engine, expire_on_commit=False)
+
+
+def recording_session(recording_id: int, read: bool = False) -> Session:
+    shard = get_shard(shard_of(recording_id))
+    return Session(shard.read_engine if read else shard.engine)
 
 
 def get_session():
@@ -11,19 +226,80 @@ def get_session():
         yield session
 
 
-def init_db():
+def get_read_session():
+    """Session for endpoints that only read; may lag the primary when a replica is configured."""
+    with Session(read_engine) as session:
+        yield session
+
+
+async def get_async_session():
+    # Objects stay usable after commit; async sessions cannot lazy-load expired attributes.
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+async def get_async_read_session():
+    async with AsyncSession(async_read_engine, expire_on_commit=False) as session:
+        yield session
+
+
+# Sessions on the shard of the request's bible_id or recording_id; without sharding, the ones above.
+
+
+def get_bible_session(bible_id: int):
+    with bible_session(bible_id) as session:
+        yield session
+
+
+def get_bible_read_session(bible_id: int):
+    with bible_session(bible_id, read=True) as session:
+        yield session
+
+
+async def get_async_bible_read_session(bible_id: int):
+    async with await async_bible_session(bible_id, read=True) as session:
+        yield session
+
+
+def get_recording_session(recording_id: int):
+    with recording_session(recording_id) as session:
+        yield session
+
+
+async def get_async_recording_read_session(recording_id: int):
+    shard = get_shard(shard_of(recording_id))
+    async with AsyncSession(shard.async_read_engine, expire_on_commit=False) as session:
+        yield session
+
+
+def init_db(migrate_blobs: bool = True):
+    fresh = not inspect(engine).has_table("recordings")
     SQLModel.metadata.create_all(engine)
-    _ensure_recordings_metrics_columns()
-
-
-def _ensure_recordings_metrics_columns():
-    """Add missing analytics columns if the DB already existed."""
-    with engine.connect() as conn:
-        existing = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(recordings)").fetchall()}
-        to_add = []
-        if "word_count" not in existing:
-            to_add.append("ALTER TABLE recordings ADD COLUMN word_count INTEGER")
-        if "wpm" not in existing:
-            to_add.append("ALTER TABLE recordings ADD COLUMN wpm REAL")
-        for stmt in to_add:
-            conn.exec_driver_sql(stmt)
+    search.create_tables(engine)
+    migrations.upgrade(engine, fresh=fresh)
+    if migrate_blobs:
+        migrate_legacy_blobs(engine)
+    for number in shard_ids()[1:]:
+        _init_shard(number)
+
+
+def _init_shard(number: int):
+    if not _is_sqlite(settings.database_url) or _in_memory(settings.database_url):
+        raise RuntimeError("SHARD_COUNT needs DATABASE_URL to be a SQLite file")
+    Path(settings.shard_dir).mkdir(parents=True, exist_ok=True)
+    # Without the attachment, so only the shard's own tables are looked for and created.
+    setup = create_engine(_shard_url(number))
+    try:
+        fresh = not inspect(setup).has_table("recordings")
+        SQLModel.metadata.create_all(setup, tables=[SQLModel.metadata.tables[name] for name in SHARD_TABLES])
+        search.create_transcript_table(setup)
+        migrations.upgrade(setup, fresh=fresh, shard=True)
+        with setup.begin() as conn:
+            # AUTOINCREMENT continues from sqlite_sequence, so the shard's ids start above number << SHARD_BITS.
+            conn.exec_driver_sql(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT 'recordings', ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'recordings')",
+                (number << SHARD_BITS,),
+            )
+    finally:
+        setup.dispose()
@@ -0,0 +1,231 @@
+import functools
+import json
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from sqlalchemy import and_, or_, update
+from sqlmodel import Session, select
+
+from . import models
+from .models import utc_now_iso
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+Job = models.Jobs
+
+
+@dataclass
+class Handler:
+    # Runs in a worker process with the decoded payload; must be a module-level function.
+    run: Callable[[dict], Any]
+    # Runs in the app process with a fresh session to persist run()'s result; the worker commits.
+    finish: Callable[[Session, dict, Any], None]
+    # Maintenance work: claimed only when no other job is waiting, one at a time per worker.
+    background: bool = False
+
+
+HANDLERS: dict[str, Handler] = {}
+
+
+def register(
+    kind: str, run: Callable[[dict], Any], finish: Callable[[Session, dict, Any], None], background: bool = False
+):
+    HANDLERS[kind] = Handler(run, finish, background)
+
+
+def enqueue(session: Session, kind: str, payload: dict, run_after: Optional[str] = None) -> Job:
+    """Queue a job in the caller's transaction, so it exists only if the caller commits."""
+    job = Job(kind=kind, payload=json.dumps(payload))
+    if run_after is not None:
+        job.run_after = run_after
+    session.add(job)
+    return job
+
+
+def _iso_ago(seconds: float) -> str:
+    return (datetime.utcnow() - timedelta(seconds=seconds)).isoformat()
+
+
+def _claimable(now: str):
+    # Running jobs whose lease expired belong to a worker that died mid-job.
+    return or_(
+        and_(Job.status == "queued", Job.run_after <= now),
+        and_(Job.status == "running", Job.locked_at < _iso_ago(settings.job_lease_seconds)),
+    )
+
+
+def claim(session: Session, kinds: list[str]) -> Optional[Job]:
+    """Atomically take the oldest runnable job; safe with several app processes."""
+    now = utc_now_iso()
+    for job_id in session.exec(
+        select(Job.job_id).where(Job.kind.in_(kinds), _claimable(now)).order_by(Job.job_id).limit(5)
+    ).all():
+        result = session.exec(
+            update(Job)
+            .where(Job.job_id == job_id, _claimable(now))
+            .values(status="running", locked_at=now, attempts=Job.attempts + 1)
+        )
+        session.commit()
+        if result.rowcount == 1:
+            return session.get(Job, job_id, populate_existing=True)
+    return None
+
+
+def complete(session: Session, job: Job):
+    job.status = "done"
+    job.error = None
+    job.finished_at = utc_now_iso()
+    session.add(job)
+
+
+def fail(session: Session, job: Job, error: str):
+    """Requeue with exponential backoff, or give up after ``job_max_attempts``."""
+    job.error = error[-2000:]
+    if job.attempts >= settings.job_max_attempts:
+        job.status = "failed"
+        job.finished_at = utc_now_iso()
+    else:
+        job.status = "queued"
+        job.run_after = (datetime.utcnow() + timedelta(seconds=30 * 2 ** (job.attempts - 1))).isoformat()
+    job.locked_at = None
+    session.add(job)
+
+
+class Worker:
+    """Polls the Jobs tables of ``engines`` and runs handlers on a process pool.
+
+    One worker per app process; claims are atomic, so several processes can
+    share a database. With sharding every shard file has its own Jobs table
+    (see app/db.py), so a recording's jobs commit with the recording; engines
+    are polled in turn and a job is finished on the engine it came from.
+    """
+
+    def __init__(self, engines: list, processes: int = 1, poll_seconds: float = 1.0):
+        self.engines = engines
+        self.processes = max(1, processes)
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._slots = threading.Semaphore(self.processes)
+        self._background_lock = threading.Lock()
+        self._background_running = 0
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._next_engine = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        # Spawned children import the app afresh instead of inheriting open DB connections.
+        self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="job-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def notify(self):
+        """Skip the poll delay, e.g. right after enqueueing."""
+        self._wake.set()
+
+    def _claim(self) -> Optional[tuple[Any, Job]]:
+        """The next job and its engine, starting after the engine the last claim came from."""
+        foreground = [kind for kind, handler in HANDLERS.items() if not handler.background]
+        background = [kind for kind, handler in HANDLERS.items() if handler.background]
+        order = self.engines[self._next_engine:] + self.engines[: self._next_engine]
+        for kinds in (foreground, background if self._background_running == 0 else []):
+            if not kinds:
+                continue
+            for position, engine in enumerate(order):
+                with Session(engine) as session:
+                    job = claim(session, kinds)
+                if job is not None:
+                    self._next_engine = (self._next_engine + position + 1) % len(self.engines)
+                    return engine, job
+        return None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if not self._slots.acquire(timeout=self.poll_seconds):
+                continue
+            try:
+                claimed = self._claim()
+                if claimed is not None:
+                    engine, job = claimed
+                    job_id, kind, payload = job.job_id, job.kind, json.loads(job.payload)
+                    if HANDLERS[kind].background:
+                        with self._background_lock:
+                            self._background_running += 1
+            except Exception:
+                logger.exception("Claiming a job failed")
+                claimed = None
+            if claimed is None:
+                self._slots.release()
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            try:
+                future = self._pool.submit(HANDLERS[kind].run, payload)
+            except Exception as exc:
+                future = Future()
+                future.set_exception(exc)
+            future.add_done_callback(functools.partial(self._done, engine, job_id, kind, payload))
+
+    def _done(self, engine, job_id: int, kind: str, payload: dict, future: Future):
+        try:
+            with Session(engine) as session:
+                job = session.get(Job, job_id)
+                try:
+                    HANDLERS[kind].finish(session, payload, future.result())
+                    complete(session, job)
+                except Exception as exc:
+                    session.rollback()
+                    job = session.get(Job, job_id)
+                    logger.warning("Job %s (%s) failed: %r", job_id, kind, exc)
+                    fail(session, job, repr(exc))
+                session.commit()
+        except Exception:
+            logger.exception("Recording the outcome of job %s failed", job_id)
+        finally:
+            if HANDLERS[kind].background:
+                with self._background_lock:
+                    self._background_running -= 1
+            self._slots.release()
+            self._wake.set()
+
+
+_worker: Optional[Worker] = None
+
+
+def start_worker(engines: list) -> Optional[Worker]:
+    global _worker
+    if settings.jobs_enabled and _worker is None:
+        _worker = Worker(engines, settings.job_workers, settings.job_poll_seconds)
+        _worker.start()
+    return _worker
+
+
+def stop_worker():
+    global _worker
+    if _worker is not None:
+        _worker.stop()
+        _worker = None
+
+
+def notify():
+    if _worker is not None:
+        _worker.notify()
@@ -1,19 +1,33 @@
-import io
-import zipfile
-from datetime import timedelta
-from typing import List, Optional
+import base64
+import functools
+import time
+from datetime import date, datetime, timedelta
+from typing import Literal, Optional
 
-from fastapi import Depends, FastAPI, File, Form, HTTPException, UploadFile
+import anyio
+from fastapi import Depends, FastAPI, File, Form, Header, HTTPException, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import delete, tuple_
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from . import auth as auth_utils
-from . import crud, models, schemas
-from .db import get_session, init_db
+from . import (
+    alignment, analytics, columnar, crud, jobs, maintenance, metrics, models, navigation, passages, passwords,
+    permissions, playlist, plays, resumable, schemas, search, transcode, uploads, zipstream,
+)
+from .db import (
+    async_bible_session, bible_session, engine, get_async_bible_read_session, get_async_read_session,
+    get_async_recording_read_session, get_async_session, get_bible_read_session, get_bible_session, get_read_session,
+    get_recording_session, get_session, init_db, recording_session, shard_engine, shard_ids,
+)
 from .models import utc_now_iso
+from .ranges import ranged_response
 from .seed import seed
+from .settings import settings
+from .storage import BlobRef, get_blob_store
 from . import scripture
 
 app = FastAPI(title="Personal Audio Bible")
@@ -23,8 +37,27 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(uploads.UploadSizeLimitMiddleware, max_bytes=settings.max_upload_bytes)
+if settings.metrics_enabled:
+    # Outermost, so rejected and failed requests are counted too.
+    app.add_middleware(metrics.MetricsMiddleware)
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
+AUDIO_EXTENSIONS = {
+    "audio/webm": ".webm",
+    "audio/wav": ".wav",
+    "audio/x-wav": ".wav",
+    "audio/ogg": ".ogg",
+    "audio/opus": ".opus",
+    "audio/mpeg": ".mp3",
+    "audio/mp4": ".m4a",
+}
+
+
+def _audio_extension(mime: Optional[str]) -> str:
+    base = (mime or "").split(";", 1)[0].strip().lower()
+    return AUDIO_EXTENSIONS.get(base, ".bin")
+
 
 def _compute_metrics(text: Optional[str], duration: Optional[float]) -> tuple[Optional[int], Optional[float]]:
     if not text:
@@ -39,39 +72,62 @@ def _compute_metrics(text: Optional[str], duration: Optional[float]) -> tuple[Op
 def on_startup():
     init_db()
     seed()
+    with Session(engine) as session:
+        if search.available(engine):
+            search.index_scripture(session)
+            search.index_transcripts(session)
+    for number in shard_ids():
+        with Session(shard_engine(number)) as session:
+            analytics.ensure_built(session)
+    resumable.collect_garbage(engine, force=True)
+    jobs.start_worker([shard_engine(number) for number in shard_ids()])
+    maintenance.start_scheduler(engine)
+    plays.play_log.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    maintenance.stop_scheduler()
+    jobs.stop_worker()
+    plays.play_log.stop()
+    passwords.pool.shutdown()
 
 
 # Auth endpoints
 @app.post("/api/register", response_model=schemas.Token)
-def register(payload: schemas.UserCreate, session: Session = Depends(get_session)):
-    existing = session.exec(
-        select(models.Users).where(
-            (models.Users.username == payload.username) | (models.Users.email == payload.email)
+async def register(payload: schemas.UserCreate, session: AsyncSession = Depends(get_async_session)):
+    existing = (
+        await session.exec(
+            select(models.Users).where(
+                (models.Users.username == payload.username) | (models.Users.email == payload.email)
+            )
         )
     ).first()
     if existing:
         raise HTTPException(status_code=400, detail="User already exists")
-    hashed = auth_utils.get_password_hash(payload.password)
+    # bcrypt runs on the password pool; this request waits there without holding a thread.
+    hashed = await passwords.hash_password(payload.password)
     user = models.Users(
         username=payload.username, name=payload.name, email=payload.email, password=hashed
     )
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
 
     auth = models.Auths(user_id=user.user_id)
     session.add(auth)
-    session.commit()
-    session.refresh(auth)
+    await session.commit()
+    await session.refresh(auth)
 
     # Grant default access to bible 1
     for cls in (models.ManageAuths, models.ListenAuths):
-        grant = session.exec(
-            select(cls).where(cls.auth_id == auth.auth_id, cls.bible_id == 1)
+        grant = (
+            await session.exec(select(cls).where(cls.auth_id == auth.auth_id, cls.bible_id == 1))
         ).first()
         if not grant:
             session.add(cls(auth_id=auth.auth_id, bible_id=1))
-    session.commit()
+    await session.commit()
+    permissions.invalidate(user.user_id)
 
     token = auth_utils.create_access_token({"sub": str(user.user_id)})
     user_read = schemas.UserRead.model_validate(user)
@@ -79,87 +135,85 @@ def register(payload: schemas.UserCreate, session: Session = Depends(get_session
 
 
 @app.post("/api/login", response_model=schemas.Token)
-def login(payload: schemas.UserLogin, session: Session = Depends(get_session)):
-    user = session.exec(
-        select(models.Users).where(
-            (models.Users.username == payload.username_or_email)
-            | (models.Users.email == payload.username_or_email)
+async def login(payload: schemas.UserLogin, session: AsyncSession = Depends(get_async_session)):
+    user = (
+        await session.exec(
+            select(models.Users).where(
+                (models.Users.username == payload.username_or_email)
+                | (models.Users.email == payload.username_or_email)
+            )
         )
     ).first()
-    if not user or not auth_utils.verify_password(payload.password, user.password):
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect credentials")
+    valid, new_hash = await passwords.check_password(payload.password, user.password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Incorrect credentials")
+    if new_hash:
+        # Stored with fewer rounds than bcrypt_rounds; keep the stronger hash.
+        user.password = new_hash
+        session.add(user)
+        await session.commit()
     token = auth_utils.create_access_token({"sub": str(user.user_id)}, timedelta(minutes=1440))
     user_read = schemas.UserRead.model_validate(user)
     return schemas.Token(access_token=token, user=user_read)
 
 
 # Bible navigation
-@app.get("/api/bibles")
+@app.get("/api/bibles", response_model=list[schemas.BibleRead])
 def get_bibles(
-    session: Session = Depends(get_session), current_user: models.Users = Depends(auth_utils.get_current_user)
+    session: Session = Depends(get_read_session), current_user: models.Users = Depends(auth_utils.get_current_user)
 ):
-    auth = session.exec(select(models.Auths).where(models.Auths.user_id == current_user.user_id)).first()
-    if not auth:
-        return []
-    bible_ids = {
-        *[row.bible_id for row in session.exec(select(models.ListenAuths).where(models.ListenAuths.auth_id == auth.auth_id))],
-        *[row.bible_id for row in session.exec(select(models.ManageAuths).where(models.ManageAuths.auth_id == auth.auth_id))],
-    }
+    bible_ids = permissions.get_grants(session, current_user.user_id).bible_ids
     return session.exec(select(models.Bibles).where(models.Bibles.bible_id.in_(bible_ids))).all() if bible_ids else []
 
 
+def _nav_response(request: Request, body: bytes, etag: str) -> Response:
+    # Revalidated on every use, so the per-request access check always runs; unchanged data costs a 304.
+    return ranged_response(
+        request,
+        size=len(body),
+        etag=etag,
+        read=lambda start, end: iter([body[start:end]]),
+        media_type="application/json",
+        headers={"Cache-Control": "public, no-cache"},
+    )
+
+
 @app.get("/api/bibles/{bible_id}/books")
-def get_books(
+async def get_books(
     bible_id: int,
-    session: Session = Depends(get_session),
-    current_user: models.Users = Depends(auth_utils.get_current_user),
+    request: Request,
+    session: AsyncSession = Depends(get_async_read_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user_async),
 ):
-    crud.ensure_listen(session, current_user, bible_id)
-    results = session.exec(
-        select(models.Books, models.CanonBooks)
-        .where(models.Books.bible_id == bible_id)
-        .join(models.CanonBooks, models.CanonBooks.canon_book_name == models.Books.canon_book_name)
-        .order_by(models.CanonBooks.canonical_order)
-    ).all()
-    # Return JSON-friendly objects in the same shape the frontend expects
-    return [
-        {"Books": book.model_dump(), "CanonBooks": canon.model_dump()}
-        for book, canon in results
-    ]
+    await session.run_sync(crud.ensure_listen, current_user, bible_id)
+    body, etag = await navigation.books(session, bible_id)
+    return _nav_response(request, body, etag)
 
 
 @app.get("/api/books/{book_id}/chapters")
-def get_chapters(
+async def get_chapters(
     book_id: int,
-    session: Session = Depends(get_session),
-    current_user: models.Users = Depends(auth_utils.get_current_user),
+    request: Request,
+    session: AsyncSession = Depends(get_async_read_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user_async),
 ):
-    book = session.get(models.Books, book_id)
-    if not book:
+    cached = await navigation.chapters(session, book_id)
+    if cached is None:
         raise HTTPException(status_code=404, detail="Book not found")
-    crud.ensure_listen(session, current_user, book.bible_id)
-    results = session.exec(
-        select(models.Chapters, models.CanonChapters)
-        .where(models.Chapters.book_id == book_id)
-        .join(
-            models.CanonChapters,
-            (models.CanonChapters.canon_book_name == models.Chapters.canon_book_name)
-            & (models.CanonChapters.canon_book_chapter == models.Chapters.canon_book_chapter),
-        )
-        .order_by(models.CanonChapters.canon_book_chapter)
-    ).all()
-    return [
-        {"Chapters": chapter.model_dump(), "CanonChapters": canon.model_dump()}
-        for chapter, canon in results
-    ]
+    body, etag, bible_id = cached
+    await session.run_sync(crud.ensure_listen, current_user, bible_id)
+    return _nav_response(request, body, etag)
 
 
 @app.get("/api/versions")
 def get_versions(
+    request: Request,
     current_user: models.Users = Depends(auth_utils.get_current_user),
 ):
-    versions = scripture.get_versions()
-    return versions or ["KJV"]
+    body, etag = navigation.versions()
+    return _nav_response(request, body, etag)
 
 
 @app.get("/api/verses")
@@ -182,187 +236,368 @@ def get_verses(
     return {"text": text}
 
 
-def _aggregate(values: list[float]) -> Optional[float]:
-    return sum(values) / len(values) if values else None
+def _passages_response(request: Request, references: list[str], versions: list[str]) -> Response:
+    versions = tuple(dict.fromkeys(versions))
+    unknown = [version for version in versions if version not in scripture.get_versions()]
+    if unknown or not versions:
+        raise HTTPException(status_code=400, detail=f"Unknown version: {', '.join(unknown) or '(none)'}")
+    try:
+        spans = [span for reference in references for span in passages.parse(reference)]
+    except passages.InvalidReference as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    total = passages.verse_total(spans)
+    if total > settings.passage_max_verses:
+        raise HTTPException(status_code=400, detail=f"At most {settings.passage_max_verses} verses per request")
+    if total > settings.passage_stream_verses or "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(passages.ndjson(spans, versions), media_type="application/x-ndjson")
+    return Response(passages.as_json(spans, versions), media_type="application/json")
 
 
-def _percentile(sorted_vals: list[float], p: float) -> Optional[float]:
-    if not sorted_vals:
-        return None
-    k = (len(sorted_vals) - 1) * p
-    f = int(k)
-    c = min(f + 1, len(sorted_vals) - 1)
-    if f == c:
-        return sorted_vals[int(k)]
-    return sorted_vals[f] * (c - k) + sorted_vals[c] * (k - f)
+@app.get("/api/passages")
+def get_passages(
+    request: Request,
+    ref: list[str] = Query(..., min_length=1),
+    version: list[str] = Query(["KJV"]),
+    current_user: models.Users = Depends(auth_utils.get_current_user),
+):
+    """Verse-by-verse text for references such as ``ref=John 3:16-4:2; Rom 8``, versions side by side.
 
+    Large results (or ``Accept: application/x-ndjson``) stream one passage per line.
+    """
+    return _passages_response(request, ref, version)
 
-def _stddev(values: list[float], mean: float) -> Optional[float]:
-    if not values or mean is None:
-        return None
-    var = sum((v - mean) ** 2 for v in values) / len(values)
-    return var**0.5
+
+@app.post("/api/passages")
+def post_passages(
+    payload: schemas.PassageRequest,
+    request: Request,
+    current_user: models.Users = Depends(auth_utils.get_current_user),
+):
+    """Same as ``GET /api/passages`` for request bodies too long for a URL."""
+    return _passages_response(request, payload.references, payload.versions)
 
 
-def _histogram(values: list[float], bins: int = 10) -> list[dict]:
-    if not values:
-        return []
-    vmin, vmax = min(values), max(values)
-    if vmin == vmax:
-        return [{"bin_start": vmin, "bin_end": vmax, "count": len(values)}]
-    width = (vmax - vmin) / bins
-    edges = [vmin + i * width for i in range(bins + 1)]
-    counts = [0] * bins
-    for v in values:
-        idx = min(int((v - vmin) / width), bins - 1)
-        counts[idx] += 1
-    hist = []
-    for i, count in enumerate(counts):
-        hist.append({"bin_start": edges[i], "bin_end": edges[i + 1], "count": count})
-    return hist
+def _pending_plays(scope: str, scope_id: int) -> int:
+    return plays.play_log.pending_for_scope(scope, scope_id)
 
 
 @app.get("/api/bibles/{bible_id}/analytics")
 def bible_analytics(
     bible_id: int,
-    session: Session = Depends(get_session),
+    book_id: Optional[int] = None,
+    chapter_id: Optional[int] = None,
+    session: Session = Depends(get_bible_read_session),
     current_user: models.Users = Depends(auth_utils.get_current_user),
 ):
     crud.ensure_listen(session, current_user, bible_id)
-    rows = session.exec(
-        select(models.Recordings, models.Chapters, models.Books)
-        .join(models.Chapters, models.Chapters.chapter_id == models.Recordings.chapter_id)
-        .join(models.Books, models.Books.book_id == models.Chapters.book_id)
-        .where(models.Books.bible_id == bible_id)
-    ).all()
-    total_words = 0
-    total_duration = 0.0
-    total_plays = 0
-    wpm_values: list[float] = []
-    word_values: list[int] = []
-    by_book: dict[str, dict] = {}
-
-    for rec, chap, _book in rows:
-        wc = rec.word_count
-        if wc is None and rec.transcription_text:
-            wc = crud.word_count(rec.transcription_text)
-        if wc is not None:
-            total_words += wc
-            word_values.append(wc)
-        if rec.duration_seconds:
-            total_duration += rec.duration_seconds
-        total_plays += rec.accessed_count
-        wpm = rec.wpm
-        if wpm is None and wc and rec.duration_seconds and rec.duration_seconds > 0:
-            wpm = (wc / rec.duration_seconds) * 60
-        if wpm is not None:
-            wpm_values.append(wpm)
-
-    wpm_values_sorted = sorted(wpm_values)
-    mean_wpm = _aggregate(wpm_values)
-    stats = {
-        "count": len(wpm_values),
-        "min": min(wpm_values) if wpm_values else None,
-        "max": max(wpm_values) if wpm_values else None,
-        "mean": mean_wpm,
-        "median": _percentile(wpm_values_sorted, 0.5),
-        "std": _stddev(wpm_values, mean_wpm) if mean_wpm is not None else None,
-        "q1": _percentile(wpm_values_sorted, 0.25),
-        "q3": _percentile(wpm_values_sorted, 0.75),
-        "histogram": _histogram(wpm_values),
-    }
+    if chapter_id is not None:
+        chapter = session.get(models.Chapters, chapter_id)
+        book = session.get(models.Books, chapter.book_id) if chapter else None
+        if not book or book.bible_id != bible_id:
+            raise HTTPException(status_code=404, detail="Chapter not found")
+        return analytics.summary(session, "chapter", chapter_id, _pending_plays("chapter", chapter_id))
+    if book_id is not None:
+        book = session.get(models.Books, book_id)
+        if not book or book.bible_id != bible_id:
+            raise HTTPException(status_code=404, detail="Book not found")
+        return analytics.summary(session, "book", book_id, _pending_plays("book", book_id))
+    return analytics.summary(session, "bible", bible_id, _pending_plays("bible", bible_id))
+
+
+def _frame_scope(
+    session: Session, bible_id: int, book_id: Optional[int], chapter_id: Optional[int]
+) -> tuple[Optional[int], Optional[int]]:
+    """Canonical book order and chapter number for the columnar filters."""
+    if chapter_id is not None:
+        chapter = session.get(models.Chapters, chapter_id)
+        book = session.get(models.Books, chapter.book_id) if chapter else None
+        if not book or book.bible_id != bible_id:
+            raise HTTPException(status_code=404, detail="Chapter not found")
+        return session.get(models.CanonBooks, book.canon_book_name).canonical_order, chapter.canon_book_chapter
+    if book_id is not None:
+        book = session.get(models.Books, book_id)
+        if not book or book.bible_id != bible_id:
+            raise HTTPException(status_code=404, detail="Book not found")
+        return session.get(models.CanonBooks, book.canon_book_name).canonical_order, None
+    return None, None
+
+
+def _iso(day: Optional[date]) -> Optional[str]:
+    return day.isoformat() if day else None
+
+
+@app.get("/api/bibles/{bible_id}/analytics/groups")
+def bible_analytics_groups(
+    bible_id: int,
+    by: Literal[columnar.GROUPINGS] = "book",
+    book_id: Optional[int] = None,
+    chapter_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    session: Session = Depends(get_read_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user),
+):
+    """WPM, duration and play distributions per book, chapter, user, testament or date bucket."""
+    crud.ensure_listen(session, current_user, bible_id)
+    book_order, chapter = _frame_scope(session, bible_id, book_id, chapter_id)
+    frame = columnar.frame()
+    mask = columnar.mask_for(frame, [bible_id], book_order, chapter, user_id, _iso(since), _iso(until))
+    names = columnar.usernames(session, set(frame.user_id[mask].tolist())) if by == "user" else None
+    counts = columnar.with_pending_plays(frame, plays.play_log.pending_all())
+    return {"by": by, "groups": columnar.group(frame, mask, by, counts, names)}
+
+
+@app.get("/api/bibles/{bible_id}/analytics/trend")
+def bible_analytics_trend(
+    bible_id: int,
+    bucket: Literal[columnar.BUCKETS] = "week",
+    book_id: Optional[int] = None,
+    chapter_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    session: Session = Depends(get_read_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user),
+):
+    """Reading speed over time, one point per day, week, month or year."""
+    crud.ensure_listen(session, current_user, bible_id)
+    book_order, chapter = _frame_scope(session, bible_id, book_id, chapter_id)
+    frame = columnar.frame()
+    mask = columnar.mask_for(frame, [bible_id], book_order, chapter, user_id, _iso(since), _iso(until))
+    return columnar.trend(frame, mask, bucket, columnar.with_pending_plays(frame, plays.play_log.pending_all()))
 
+
+@app.get("/api/analytics/compare")
+def compare_bibles(
+    bible_id: Optional[list[int]] = Query(None),
+    by: Literal["all", "testament", "book"] = "all",
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    session: Session = Depends(get_read_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user),
+):
+    """The same statistics side by side for several bibles (default: every bible the user can listen to)."""
+    if bible_id:
+        for requested in bible_id:
+            crud.ensure_listen(session, current_user, requested)
+        bible_ids = list(dict.fromkeys(bible_id))
+    else:
+        bible_ids = sorted(permissions.get_grants(session, current_user.user_id).bible_ids)
+    bibles = session.exec(select(models.Bibles).where(models.Bibles.bible_id.in_(bible_ids))).all()
+    frame = columnar.frame()
+    counts = columnar.with_pending_plays(frame, plays.play_log.pending_all())
+    groups: dict[int, dict] = {}
+    for bid in bible_ids:
+        mask = columnar.mask_for(frame, [bid], since=_iso(since), until=_iso(until))
+        for row in columnar.group(frame, mask, by, counts):
+            entry = groups.setdefault(row["key"], {"key": row["key"], "label": row["label"], "bibles": {}})
+            entry["bibles"][bid] = {k: v for k, v in row.items() if k not in ("key", "label")}
     return {
-        "total_recordings": len(rows),
-        "total_words": total_words,
-        "avg_word_count": _aggregate(word_values),
-        "avg_wpm": mean_wpm,
-        "avg_duration_seconds": (total_duration / len(rows)) if rows else None,
-        "total_plays": total_plays,
-        "wpm_stats": stats,
+        "by": by,
+        "bibles": [
+            schemas.BibleRead.model_validate(bible)
+            for bible in sorted(bibles, key=lambda b: bible_ids.index(b.bible_id))
+        ],
+        "groups": [groups[key] for key in sorted(groups)],
     }
 
 
+@app.get("/api/search")
+def search_text(
+    q: str = Query(..., min_length=1, max_length=200),
+    scope: Literal["scripture", "transcripts"] = "scripture",
+    version: Optional[str] = None,
+    bible_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    session: Session = Depends(get_read_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user),
+):
+    """Ranked (BM25) full-text search over scripture verses or a bible's transcripts.
+
+    Supports ``"exact phrases"`` and ``prefix*`` terms; matches are wrapped in ``<mark>``.
+    """
+    if not search.available(engine):
+        raise HTTPException(status_code=503, detail="Search requires SQLite FTS5")
+    match = search.build_match(q)
+    if match is None:
+        raise HTTPException(status_code=400, detail="Empty query")
+    if scope == "transcripts":
+        if bible_id is None:
+            raise HTTPException(status_code=400, detail="bible_id is required for transcript search")
+        crud.ensure_listen(session, current_user, bible_id)
+        with bible_session(bible_id, read=True) as shard_session:
+            results = search.search_transcripts(shard_session, match, bible_id, limit, offset)
+    else:
+        results = search.search_scripture(session, match, version, limit, offset)
+    return {"query": q, "scope": scope, "results": results}
+
+
 # Recordings CRUD
-@app.get("/api/bibles/{bible_id}/recordings", response_model=List[schemas.RecordingRead])
-def list_recordings(
+def _encode_cursor(canonical_order: int, chapter_number: int, recording_id: int) -> str:
+    raw = f"{canonical_order}.{chapter_number}.{recording_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[int, int, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        order, chapter, recording_id = (int(part) for part in raw.split("."))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return order, chapter, recording_id
+
+
+@app.get(
+    "/api/bibles/{bible_id}/recordings",
+    response_model=schemas.RecordingPage,
+    response_model_exclude_unset=True,
+)
+async def list_recordings(
     bible_id: int,
-    session: Session = Depends(get_session),
-    current_user: models.Users = Depends(auth_utils.get_current_user),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    book_id: Optional[int] = None,
+    chapter_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    recorded_after: Optional[str] = None,
+    recorded_before: Optional[str] = None,
+    fields: Literal["full", "summary"] = "full",
+    session: AsyncSession = Depends(get_async_bible_read_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user_async),
 ):
-    crud.ensure_listen(session, current_user, bible_id)
-    results = session.exec(
-        select(models.Recordings, models.Chapters, models.Books)
+    """Recordings in canonical order, paged by a keyset cursor.
+
+    ``fields=summary`` leaves out transcripts. Filters combine with AND;
+    dates are ISO-8601 strings compared against ``date_recorded``.
+    """
+    await session.run_sync(crud.ensure_listen, current_user, bible_id)
+    include_text = fields == "full"
+    columns = [
+        models.CanonBooks.canonical_order,
+        models.Chapters.canon_book_name,
+        models.Chapters.canon_book_chapter,
+        models.Recordings.recording_id,
+        models.Recordings.verse_index_start,
+        models.Recordings.verse_index_end,
+        models.Recordings.date_recorded,
+        models.Recordings.accessed_count,
+        models.Recordings.duration_seconds,
+        models.Recordings.wpm,
+    ]
+    if include_text:
+        columns.append(models.Recordings.transcription_text)
+    stmt = (
+        select(*columns)
         .join(models.Chapters, models.Chapters.chapter_id == models.Recordings.chapter_id)
         .join(models.Books, models.Books.book_id == models.Chapters.book_id)
+        .join(models.CanonBooks, models.CanonBooks.canon_book_name == models.Books.canon_book_name)
         .where(models.Books.bible_id == bible_id)
-    ).all()
-    output = []
-    for rec, chap, book in results:
-        canon = session.exec(
-            select(models.CanonChapters).where(
-                models.CanonChapters.canon_book_name == chap.canon_book_name,
-                models.CanonChapters.canon_book_chapter == chap.canon_book_chapter,
+    )
+    if book_id is not None:
+        stmt = stmt.where(models.Books.book_id == book_id)
+    if chapter_id is not None:
+        stmt = stmt.where(models.Recordings.chapter_id == chapter_id)
+    if user_id is not None:
+        stmt = stmt.where(models.Recordings.user_id == user_id)
+    if recorded_after:
+        stmt = stmt.where(models.Recordings.date_recorded >= recorded_after)
+    if recorded_before:
+        stmt = stmt.where(models.Recordings.date_recorded < recorded_before)
+    if cursor:
+        stmt = stmt.where(
+            tuple_(
+                models.CanonBooks.canonical_order, models.Chapters.canon_book_chapter, models.Recordings.recording_id
             )
-        ).first()
-        stored_wpm = rec.wpm
-        stored_wc = rec.word_count
-        if stored_wpm is None and rec.duration_seconds and rec.duration_seconds > 0 and rec.transcription_text:
-            stored_wc = crud.word_count(rec.transcription_text)
-            stored_wpm = (stored_wc / rec.duration_seconds) * 60
-        output.append(
+            > _decode_cursor(cursor)
+        )
+    stmt = stmt.order_by(
+        models.CanonBooks.canonical_order, models.Chapters.canon_book_chapter, models.Recordings.recording_id
+    ).limit(limit + 1)
+    rows = (await session.exec(stmt)).all()
+
+    items = []
+    for row in rows[:limit]:
+        wpm = row.wpm
+        extra = {}
+        if include_text:
+            extra["transcription_text"] = row.transcription_text
+        items.append(
             schemas.RecordingRead(
-                recording_id=rec.recording_id,
-                book_name=chap.canon_book_name,
-                chapter_number=chap.canon_book_chapter,
-                verse_start=rec.verse_index_start,
-                verse_end=rec.verse_index_end,
-                date_recorded=rec.date_recorded,
-                accessed_count=rec.accessed_count,
-                duration_seconds=rec.duration_seconds,
-                transcription_text=rec.transcription_text,
-                computed_wpm=stored_wpm,
+                recording_id=row.recording_id,
+                book_name=row.canon_book_name,
+                chapter_number=row.canon_book_chapter,
+                verse_start=row.verse_index_start,
+                verse_end=row.verse_index_end,
+                date_recorded=row.date_recorded,
+                accessed_count=row.accessed_count + plays.play_log.pending(row.recording_id),
+                duration_seconds=row.duration_seconds,
+                computed_wpm=wpm,
+                **extra,
             )
         )
-    return output
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = _encode_cursor(last.canonical_order, last.canon_book_chapter, last.recording_id)
+    return schemas.RecordingPage(items=items, next_cursor=next_cursor)
 
 
-@app.post("/api/recordings")
-def create_recording(
-    bible_id: int = Form(...),
-    chapter_id: int = Form(...),
-    verse_index_start: int = Form(...),
-    verse_index_end: int = Form(...),
-    duration_seconds: Optional[float] = Form(None),
-    transcription_text: Optional[str] = Form(None),
-    file: UploadFile = File(...),
-    session: Session = Depends(get_session),
-    current_user: models.Users = Depends(auth_utils.get_current_user),
-):
-    book = session.exec(
-        select(models.Books)
-        .join(models.Chapters, models.Chapters.book_id == models.Books.book_id)
-        .where(models.Chapters.chapter_id == chapter_id)
-    ).first()
-    if not book:
-        raise HTTPException(status_code=400, detail="Invalid chapter")
-    crud.ensure_manage(session, current_user, book.bible_id)
-    canon_chapter = session.exec(
-        select(models.CanonChapters).where(
-            models.CanonChapters.canon_book_name == book.canon_book_name,
-            models.CanonChapters.canon_book_chapter == session.get(models.Chapters, chapter_id).canon_book_chapter,
+def _index_new_recording(session: Session, recording: models.Recordings, book: models.Books):
+    scopes = analytics.scopes_for(book.bible_id, book.book_id, recording.chapter_id)
+    analytics.apply_recording(session, recording, scopes)
+    if search.available(engine):
+        search.index_recording(session, recording.recording_id, book.bible_id, recording.transcription_text)
+    playlist.invalidate(session, book.bible_id)
+    # Transcoding also replaces the client-reported duration with the probed one.
+    transcode.enqueue(session, recording)
+
+
+async def _recording_target(
+    session: AsyncSession,
+    current_user: models.Users,
+    chapter_id: int,
+    verse_index_start: int,
+    verse_index_end: int,
+) -> models.Books:
+    """Check the chapter, manage access and verse range for a new recording; returns the chapter's book."""
+    row = (
+        await session.exec(
+            select(models.Books, models.Chapters.canon_book_chapter)
+            .join(models.Chapters, models.Chapters.book_id == models.Books.book_id)
+            .where(models.Chapters.chapter_id == chapter_id)
         )
     ).first()
+    if not row:
+        raise HTTPException(status_code=400, detail="Invalid chapter")
+    book, chapter_number = row
+    await session.run_sync(crud.ensure_manage, current_user, book.bible_id)
+    canon_chapter = await session.get(models.CanonChapters, (book.canon_book_name, chapter_number))
     if not canon_chapter:
         raise HTTPException(status_code=400, detail="Missing canon data")
     if verse_index_start < 1 or verse_index_end < verse_index_start:
         raise HTTPException(status_code=400, detail="Invalid verse range")
     if verse_index_end > canon_chapter.verse_count:
         raise HTTPException(status_code=400, detail="Verse end exceeds chapter")
+    return book
+
 
-    content = file.file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="Empty file")
+async def _add_recording(
+    session: AsyncSession,
+    current_user: models.Users,
+    book: models.Books,
+    blob: BlobRef,
+    *,
+    chapter_id: int,
+    verse_index_start: int,
+    verse_index_end: int,
+    duration_seconds: Optional[float],
+    transcription_text: Optional[str],
+    file_mime: Optional[str],
+    upload_id: Optional[str] = None,
+) -> models.Recordings:
+    """Insert a recording for a stored blob and update analytics, search and the transcode queue."""
     word_count, wpm = _compute_metrics(transcription_text, duration_seconds)
     recording = models.Recordings(
         user_id=current_user.user_id,
@@ -370,23 +605,326 @@ def create_recording(
         date_recorded=utc_now_iso(),
         verse_index_start=verse_index_start,
         verse_index_end=verse_index_end,
-        file=content,
-        file_mime=file.content_type,
+        blob_key=blob.key,
+        file_size=blob.size,
+        file_sha256=blob.sha256,
+        file_crc32=blob.crc32,
+        file_mime=file_mime,
         duration_seconds=duration_seconds,
         transcription_text=transcription_text,
         word_count=word_count,
         wpm=wpm,
+        upload_id=upload_id,
     )
     session.add(recording)
-    session.commit()
-    session.refresh(recording)
+    await session.flush()
+    await session.run_sync(_index_new_recording, recording, book)
+    return recording
+
+
+@app.post("/api/recordings")
+async def create_recording(
+    bible_id: int = Form(...),
+    chapter_id: int = Form(...),
+    verse_index_start: int = Form(...),
+    verse_index_end: int = Form(...),
+    duration_seconds: Optional[float] = Form(None),
+    transcription_text: Optional[str] = Form(None),
+    file: UploadFile = File(...),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user_async),
+):
+    book = await _recording_target(session, current_user, chapter_id, verse_index_start, verse_index_end)
+    blob = await uploads.store_upload(file)
+    async with await async_bible_session(book.bible_id) as shard_session:
+        recording = await _add_recording(
+            shard_session,
+            current_user,
+            book,
+            blob,
+            chapter_id=chapter_id,
+            verse_index_start=verse_index_start,
+            verse_index_end=verse_index_end,
+            duration_seconds=duration_seconds,
+            transcription_text=transcription_text,
+            file_mime=file.content_type,
+        )
+        await shard_session.commit()
+    columnar.invalidate()
+    jobs.notify()
     return {"recording_id": recording.recording_id}
 
 
+# Resumable uploads: create, append chunks with PATCH (resuming from the offset HEAD reports), commit.
+def _upload_state(upload: models.Uploads) -> dict:
+    return {
+        "upload_id": upload.upload_id,
+        "offset": upload.offset,
+        "size": upload.size,
+        "recording_id": upload.recording_id,
+    }
+
+
+def _offset_headers(offset: int, size: Optional[int]) -> dict:
+    headers = {"Upload-Offset": str(offset), "Cache-Control": "no-store"}
+    if size is not None:
+        headers["Upload-Length"] = str(size)
+    return headers
+
+
+async def _own_upload(session: AsyncSession, upload_id: str, current_user: models.Users) -> models.Uploads:
+    upload = await session.get(models.Uploads, upload_id)
+    if upload is None or upload.user_id != current_user.user_id:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+
+@app.post("/api/uploads", status_code=201)
+async def create_upload(
+    payload: schemas.UploadCreate,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user_async),
+):
+    """Start a resumable upload. Metadata is checked now and again at commit."""
+    await _recording_target(
+        session, current_user, payload.chapter_id, payload.verse_index_start, payload.verse_index_end
+    )
+    if payload.size is not None and payload.size > settings.max_upload_bytes:
+        raise HTTPException(status_code=413, detail="Upload too large")
+    await anyio.to_thread.run_sync(resumable.collect_garbage, engine)
+    upload = models.Uploads(upload_id=resumable.new_upload_id(), user_id=current_user.user_id, **payload.model_dump())
+    await anyio.to_thread.run_sync(resumable.create_staging_file, upload.upload_id)
+    session.add(upload)
+    await session.commit()
+    response.headers.update({"Location": f"/api/uploads/{upload.upload_id}", **_offset_headers(0, upload.size)})
+    return _upload_state(upload)
+
+
+@app.head("/api/uploads/{upload_id}")
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(
+    upload_id: str,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user_async),
+):
+    """Current offset; a client resumes by sending the bytes from there."""
+    upload = await _own_upload(session, upload_id, current_user)
+    response.headers.update(_offset_headers(upload.offset, upload.size))
+    return _upload_state(upload)
+
+
+@app.patch("/api/uploads/{upload_id}", status_code=204)
+async def append_upload(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user_async),
+):
+    """Append the raw request body at ``Upload-Offset``.
+
+    ``Upload-Checksum: sha256 <base64>`` (or md5/sha1) verifies the chunk; a
+    mismatch discards it with 460. A wrong offset gets 409 with the real one.
+    """
+    checksum = resumable.parse_checksum(upload_checksum)
+    upload = await resumable.lease(session, upload_id, current_user.user_id)
+    offset, size = upload.offset, upload.size
+    try:
+        if upload_offset != offset:
+            raise HTTPException(status_code=409, detail="Offset mismatch", headers=_offset_headers(offset, size))
+        offset = await resumable.append(request, upload, checksum)
+    finally:
+        await resumable.release(session, upload_id, offset=offset)
+    return Response(status_code=204, headers=_offset_headers(offset, size))
+
+
+@app.post("/api/uploads/{upload_id}/commit")
+async def commit_upload(
+    upload_id: str,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user_async),
+):
+    """Turn a complete upload into a recording. Retrying after success returns the same recording."""
+    upload = await _own_upload(session, upload_id, current_user)
+    if upload.recording_id is not None:
+        return {"recording_id": upload.recording_id}
+    bible_id = (
+        await session.exec(
+            select(models.Books.bible_id)
+            .join(models.Chapters, models.Chapters.book_id == models.Books.book_id)
+            .where(models.Chapters.chapter_id == upload.chapter_id)
+        )
+    ).first()
+    if bible_id is None:
+        raise HTTPException(status_code=400, detail="Invalid chapter")
+    # The rest runs on the bible's shard, which reaches the upload row through the shared database.
+    async with await async_bible_session(bible_id) as shard_session:
+        recording_id = await _commit_upload(shard_session, upload_id, current_user)
+    columnar.invalidate()
+    jobs.notify()
+    return {"recording_id": recording_id}
+
+
+async def _commit_upload(session: AsyncSession, upload_id: str, current_user: models.Users) -> int:
+    """Store the staged file and add its recording on the bible's shard, then mark the upload committed.
+
+    The recording is committed in the shard and the upload row in the shared
+    database, in two transactions. If marking the upload fails, a retry finds
+    the recording by its ``upload_id``. The staged file is removed last, so a
+    failed commit can always be retried.
+    """
+    upload = await resumable.lease(session, upload_id, current_user.user_id)
+    recording = (
+        await session.exec(select(models.Recordings).where(models.Recordings.upload_id == upload_id))
+    ).first()
+    if recording is not None:
+        await resumable.release(session, upload_id, recording_id=recording.recording_id)
+        await anyio.to_thread.run_sync(resumable.remove_staging_file, upload_id)
+        return recording.recording_id
+    blob = None
+    try:
+        if upload.offset == 0:
+            raise HTTPException(status_code=400, detail="Empty file")
+        if upload.size is not None and upload.offset != upload.size:
+            raise HTTPException(
+                status_code=409, detail="Upload incomplete", headers=_offset_headers(upload.offset, upload.size)
+            )
+        book = await _recording_target(
+            session, current_user, upload.chapter_id, upload.verse_index_start, upload.verse_index_end
+        )
+        path = resumable.staging_path(upload.upload_id)
+        blob = await anyio.to_thread.run_sync(
+            get_blob_store().store_path, path, crud.retain_blob, limiter=uploads.upload_limiter
+        )
+        recording = await _add_recording(
+            session,
+            current_user,
+            book,
+            blob,
+            chapter_id=upload.chapter_id,
+            verse_index_start=upload.verse_index_start,
+            verse_index_end=upload.verse_index_end,
+            duration_seconds=upload.duration_seconds,
+            transcription_text=upload.transcription_text,
+            file_mime=upload.file_mime,
+            upload_id=upload_id,
+        )
+        await session.commit()
+    except BaseException:
+        await session.rollback()
+        if blob is not None:
+            # The blob may now be referenced by nothing; the sweep deletes it if that stays so.
+            await session.run_sync(crud.release_blob, blob.key)
+            await session.commit()
+        await resumable.release(session, upload_id)
+        raise
+    await resumable.release(session, upload_id, recording_id=recording.recording_id)
+    await anyio.to_thread.run_sync(resumable.remove_staging_file, upload_id)
+    return recording.recording_id
+
+
+@app.delete("/api/uploads/{upload_id}", status_code=204)
+async def abort_upload(
+    upload_id: str,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user_async),
+):
+    upload = await resumable.lease(session, upload_id, current_user.user_id)
+    await session.delete(upload)
+    await session.commit()
+    await anyio.to_thread.run_sync(resumable.remove_staging_file, upload_id)
+    return Response(status_code=204)
+
+
+def _starts_playback(request: Request, response: Response) -> bool:
+    """Whether serving ``response`` starts playback, so it counts as a play.
+
+    Revalidations (304) and refused ranges send no audio. Seeking issues
+    follow-up Range requests, and players probe with short ranges such as
+    ``bytes=0-1`` first; only a full response or the open-ended ``bytes=0-``
+    counts.
+    """
+    if response.status_code not in (200, 206):
+        return False
+    range_header = request.headers.get("range", "").replace(" ", "")
+    return not range_header or range_header == "bytes=0-"
+
+
+def _record_play(recording: models.Recordings, book: models.Books, listener: Optional[int] = None):
+    # Buffered and written in batches (app/plays.py); no write transaction per play.
+    scopes = analytics.scopes_for(book.bible_id, book.book_id, recording.chapter_id)
+    if listener is None:
+        plays.play_log.record(recording.recording_id, scopes)
+    else:
+        plays.play_log.record_once(recording.recording_id, listener, scopes)
+
+
+@app.get("/api/recordings/{recording_id}/verses")
+async def get_recording_verses(
+    recording_id: int,
+    request: Request,
+    quality: Optional[Literal["original", "low", "medium", "high"]] = None,
+    session: AsyncSession = Depends(get_async_recording_read_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user_async),
+):
+    """Where each verse starts and ends in the recording, for seeking.
+
+    Offsets come from aligning the transcript to the scripture text after
+    transcoding; byte offsets assume a constant bitrate through the file that
+    ``/audio`` serves for the same ``quality`` and ``Save-Data``, reported as
+    ``quality``. Clients whose ``Accept`` header makes ``/audio`` fall back to
+    the original must ask for ``quality=original``. 404 until the alignment
+    job has run.
+    """
+    row = (
+        await session.exec(
+            select(models.Recordings, models.Books.bible_id, models.RecordingAlignments)
+            .join(models.Chapters, models.Chapters.chapter_id == models.Recordings.chapter_id)
+            .join(models.Books, models.Books.book_id == models.Chapters.book_id)
+            .outerjoin(
+                models.RecordingAlignments, models.RecordingAlignments.recording_id == models.Recordings.recording_id
+            )
+            .where(models.Recordings.recording_id == recording_id)
+        )
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    recording, bible_id, aligned = row
+    await session.run_sync(crud.ensure_listen, current_user, bible_id)
+    if aligned is None:
+        raise HTTPException(status_code=404, detail="Verse offsets not computed yet")
+    renditions = {
+        rendition.quality: rendition
+        for rendition in (
+            await session.exec(select(models.Renditions).where(models.Renditions.recording_id == recording_id))
+        ).all()
+    }
+    # The JSON request's own Accept header says nothing about playback, so only quality and Save-Data count.
+    rendition = transcode.pick_rendition(
+        renditions, quality, "", request.headers.get("save-data", "").lower() == "on"
+    )
+    size = rendition.file_size if rendition is not None else recording.file_size or 0
+    return {
+        "recording_id": recording_id,
+        "duration_seconds": recording.duration_seconds,
+        "quality": rendition.quality if rendition is not None else "original",
+        "file_size": size,
+        "version": aligned.version,
+        "method": aligned.method,
+        "coverage": aligned.coverage,
+        "verses": alignment.verse_table(recording, aligned, size),
+    }
+
+
 @app.get("/api/recordings/{recording_id}/audio")
 def stream_audio(
     recording_id: int,
-    session: Session = Depends(get_session),
+    request: Request,
+    quality: Optional[Literal["original", "low", "medium", "high"]] = None,
+    session: Session = Depends(get_recording_session),
     current_user: models.Users = Depends(auth_utils.get_current_user),
 ):
     recording = session.get(models.Recordings, recording_id)
@@ -398,18 +936,45 @@ def stream_audio(
     book = session.get(models.Books, chapter.book_id)
     crud.ensure_listen(session, current_user, book.bible_id)
 
-    recording.accessed_count += 1
-    recording.date_last_accessed = utc_now_iso()
-    session.add(recording)
-    session.commit()
+    renditions = {
+        rendition.quality: rendition
+        for rendition in session.exec(
+            select(models.Renditions).where(models.Renditions.recording_id == recording_id)
+        ).all()
+    }
+    rendition = transcode.pick_rendition(
+        renditions,
+        quality,
+        request.headers.get("accept", ""),
+        request.headers.get("save-data", "").lower() == "on",
+    )
+    if rendition is not None:
+        blob_key, size, sha256, mime = rendition.blob_key, rendition.file_size, rendition.file_sha256, rendition.mime
+        modified = rendition.created_at
+    else:
+        blob_key, size, sha256 = recording.blob_key, recording.file_size, recording.file_sha256
+        mime = recording.file_mime or "application/octet-stream"
+        modified = recording.date_recorded
 
-    return StreamingResponse(io.BytesIO(recording.file), media_type=recording.file_mime or "application/octet-stream")
+    store = get_blob_store()
+    response = ranged_response(
+        request,
+        size=size,
+        etag=f'"{sha256}"',
+        read=lambda start, end: store.get_object(blob_key, start, end),
+        media_type=mime,
+        last_modified=datetime.fromisoformat(modified),
+        headers={"Cache-Control": "private, no-cache", "Vary": "Accept, Save-Data"},
+    )
+    if _starts_playback(request, response):
+        _record_play(recording, book)
+    return response
 
 
 @app.delete("/api/recordings/{recording_id}")
 def delete_recording(
     recording_id: int,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_recording_session),
     current_user: models.Users = Depends(auth_utils.get_current_user),
 ):
     recording = session.get(models.Recordings, recording_id)
@@ -420,36 +985,170 @@ def delete_recording(
     if not book:
         raise HTTPException(status_code=404, detail="Book missing")
     crud.ensure_manage(session, current_user, book.bible_id)
+    blob_keys = {recording.blob_key}
+    blob_keys.update(
+        session.exec(select(models.Renditions.blob_key).where(models.Renditions.recording_id == recording_id)).all()
+    )
+    session.exec(delete(models.Renditions).where(models.Renditions.recording_id == recording_id))
+    session.exec(delete(models.RecordingAlignments).where(models.RecordingAlignments.recording_id == recording_id))
+    analytics.apply_recording(session, recording, analytics.scopes_for(book.bible_id, book.book_id, chapter.chapter_id), sign=-1)
+    if search.available(engine):
+        search.remove_recording(session, recording_id)
     session.delete(recording)
+    for blob_key in blob_keys:
+        crud.release_blob(session, blob_key)
+    playlist.invalidate(session, book.bible_id)
     session.commit()
+    plays.play_log.discard(recording_id)
+    columnar.invalidate()
     return {"ok": True}
 
 
+@app.get("/api/bibles/{bible_id}/playlist")
+def bible_playlist(
+    bible_id: int,
+    request: Request,
+    book_id: Optional[int] = None,
+    chapter_id: Optional[int] = None,
+    quality: Literal["original", "low", "medium", "high"] = settings.default_rendition,
+    session: Session = Depends(get_bible_session),
+    current_user: models.Users = Depends(auth_utils.get_current_user),
+):
+    """Recordings of a bible, book or chapter in reading order as one continuous playlist.
+
+    Each recording is split into short byte-range segments with signed,
+    cacheable URLs (``/api/segments/...``), so playback can start after the
+    first segment. Clients feed the segments to Media Source Extensions.
+    """
+    crud.ensure_listen(session, current_user, bible_id)
+    body, etag = playlist.manifest(session, bible_id, book_id, chapter_id, quality, current_user.user_id)
+    data = body.encode()
+    return ranged_response(
+        request,
+        size=len(data),
+        etag=etag,
+        read=lambda start, end: iter([data[start:end]]),
+        media_type="application/json",
+        headers={"Cache-Control": "private, no-cache"},
+    )
+
+
+@app.get("/api/segments/{blob_key}/{start:int}-{end:int}")
+def get_segment(
+    blob_key: str,
+    start: int,
+    end: int,
+    request: Request,
+    mime: str,
+    exp: int,
+    sig: str,
+    play: Optional[int] = None,
+    listener: Optional[int] = None,
+):
+    """One playlist segment. Authorised by the URL signature, so players need no auth header.
+
+    A first segment names the recording and the user its manifest was built
+    for. Since the URL can be replayed, that user's play counts at most once
+    per ``play_repeat_seconds``.
+    """
+    if end <= start or not playlist.verify(blob_key, start, end, mime, exp, play, listener, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired segment URL")
+    store = get_blob_store()
+    response = ranged_response(
+        request,
+        size=end - start,
+        etag=f'"{blob_key}:{start}-{end}"',
+        read=lambda lo, hi: store.get_object(blob_key, start + lo, start + hi),
+        media_type=mime,
+        # Segments are immutable (content-addressed blobs), so clients may cache them until the URL expires.
+        headers={"Cache-Control": f"private, max-age={max(exp - int(time.time()), 0)}, immutable"},
+    )
+    if play is not None and _starts_playback(request, response):
+        with recording_session(play) as session:
+            recording = session.get(models.Recordings, play)
+            chapter = session.get(models.Chapters, recording.chapter_id) if recording else None
+            if chapter:
+                _record_play(recording, session.get(models.Books, chapter.book_id), listener)
+    return response
+
+
 @app.get("/api/bibles/{bible_id}/download")
 def download_zip(
     bible_id: int,
-    session: Session = Depends(get_session),
+    request: Request,
+    session: Session = Depends(get_bible_read_session),
     current_user: models.Users = Depends(auth_utils.get_current_user),
 ):
     crud.ensure_listen(session, current_user, bible_id)
-    mem = io.BytesIO()
-    with zipfile.ZipFile(mem, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
-        recordings = session.exec(
-            select(models.Recordings, models.Chapters, models.Books)
-            .join(models.Chapters, models.Chapters.chapter_id == models.Recordings.chapter_id)
-            .join(models.Books, models.Books.book_id == models.Chapters.book_id)
-            .where(models.Books.bible_id == bible_id)
-        ).all()
-        counter = {}
-        for rec, chap, book in recordings:
-            key = (chap.canon_book_name, chap.canon_book_chapter)
-            counter[key] = counter.get(key, 0) + 1
-            suffix = f"_{counter[key]:03d}" if counter[key] > 1 else ""
-            ext = ".webm" if rec.file_mime == "audio/webm" else ".wav" if rec.file_mime == "audio/wav" else ".bin"
-            path = f"{chap.canon_book_name}/{chap.canon_book_chapter:02d}{suffix}{ext}"
-            zf.writestr(path, rec.file)
-    mem.seek(0)
-    return StreamingResponse(mem, media_type="application/zip", headers={"Content-Disposition": "attachment; filename=bible.zip"})
+    store = get_blob_store()
+    rows = session.exec(
+        select(
+            models.Recordings.blob_key,
+            models.Recordings.file_size,
+            models.Recordings.file_sha256,
+            models.Recordings.file_crc32,
+            models.Recordings.file_mime,
+            models.Recordings.date_recorded,
+            models.Chapters.canon_book_name,
+            models.Chapters.canon_book_chapter,
+        )
+        .join(models.Chapters, models.Chapters.chapter_id == models.Recordings.chapter_id)
+        .join(models.Books, models.Books.book_id == models.Chapters.book_id)
+        .join(models.CanonBooks, models.CanonBooks.canon_book_name == models.Books.canon_book_name)
+        .where(models.Books.bible_id == bible_id)
+        .order_by(models.CanonBooks.canonical_order, models.Chapters.canon_book_chapter, models.Recordings.recording_id)
+        .execution_options(yield_per=500)
+    )
+    entries = []
+    counter = {}
+    for blob_key, size, sha256, crc, mime, date_recorded, book_name, chapter_number in rows:
+        key = (book_name, chapter_number)
+        counter[key] = counter.get(key, 0) + 1
+        suffix = f"_{counter[key]:03d}" if counter[key] > 1 else ""
+        compress = zipstream.should_compress(mime)
+        # Recordings stored before CRCs were tracked have none until the backfill_crc32 task reaches them;
+        # their entries get a data descriptor, so the archive is streamed rather than served by range.
+        entries.append(
+            zipstream.ZipEntry(
+                name=f"{book_name}/{chapter_number:02d}{suffix}{_audio_extension(mime)}",
+                size=size,
+                read=functools.partial(store.get_object, blob_key),
+                mtime=datetime.fromisoformat(date_recorded),
+                compress=compress,
+                crc32=crc,
+                fingerprint=sha256,
+            )
+        )
+    archive = zipstream.ZipStream(entries)
+    headers = {"Content-Disposition": "attachment; filename=bible.zip"}
+    if not archive.seekable:
+        return StreamingResponse(archive.stream(), media_type="application/zip", headers=headers)
+    return ranged_response(
+        request,
+        size=archive.size,
+        etag=archive.etag,
+        read=archive.read,
+        media_type="application/zip",
+        headers={**headers, "Cache-Control": "private, no-cache"},
+    )
+
+
+@app.get("/api/maintenance")
+def maintenance_status(
+    session: Session = Depends(get_read_session), current_user: models.Users = Depends(auth_utils.get_current_user)
+):
+    # Progress spans every bible, so it is shown only to users who manage at least one.
+    if not permissions.get_grants(session, current_user.user_id).manage:
+        raise HTTPException(status_code=403, detail="No manage access")
+    return maintenance.status(session)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    # Async so thread-pool gauges are read on the event loop; unauthenticated, like most scrape targets.
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/", include_in_schema=False)
@@ -0,0 +1,334 @@
+import json
+import logging
+import sys
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from sqlalchemy import func, or_
+from sqlmodel import Session, select
+
+from . import crud, jobs, models, transcode
+from .db import get_shard, shard_ids, shard_of
+from .models import utc_now_iso
+from .settings import settings
+from .storage import get_blob_store
+
+logger = logging.getLogger(__name__)
+
+Rec = models.Recordings
+
+
+@dataclass
+class Task:
+    """Maintenance work over recordings, done as a chain of durable batch jobs.
+
+    Each batch job carries the ids to process, all from one shard; its finish
+    step queues the next batch after ``maintenance_pause_seconds``, moving on
+    to the next shard when one is done. Progress is kept in AppState under
+    ``maintenance:<name>``.
+
+    The chain's jobs and progress live in the primary. A batch from another
+    shard is committed to that shard first and its progress afterwards, in a
+    second transaction; if that one fails, the retried job applies the same
+    values again, which is harmless.
+    """
+
+    name: str
+    # Recordings that still need the task.
+    needs: Callable[[], Any]
+    # Runs in a worker process: {"ids": [...]} -> per-id results.
+    run: Callable[[dict], dict]
+    # Runs in the app process: persist one recording's result.
+    apply: Callable[[Session, models.Recordings, models.Books, Any], None]
+    # Try each recording only once: later runs start after the last id an earlier run reached.
+    once: bool = False
+
+
+TASKS: dict[str, Task] = {}
+
+
+def _state_key(name: str) -> str:
+    return f"maintenance:{name}"
+
+
+def progress(session: Session, name: str) -> dict:
+    row = session.get(models.AppState, _state_key(name))
+    return json.loads(row.value) if row and row.value else {"status": "idle"}
+
+
+def _save(session: Session, name: str, state: dict):
+    state["updated_at"] = utc_now_iso()
+    session.merge(models.AppState(key=_state_key(name), value=json.dumps(state)))
+
+
+def _next_batch(task: Task, after: int, limit: int) -> tuple[int, list[int]]:
+    """The shard and ids of the next recordings after ``after`` that need ``task``, in id order."""
+    # Shard ids occupy increasing id ranges, so one cursor walks every shard in turn.
+    for number in shard_ids()[shard_of(after):]:
+        with Session(get_shard(number).engine) as session:
+            ids = session.exec(
+                select(Rec.recording_id)
+                .where(task.needs(), Rec.recording_id > after)
+                .order_by(Rec.recording_id)
+                .limit(limit)
+            ).all()
+        if ids:
+            return number, ids
+    return 0, []
+
+
+def _count(task: Task, after: int) -> int:
+    total = 0
+    for number in shard_ids():
+        with Session(get_shard(number).engine) as session:
+            total += session.exec(
+                select(func.count()).select_from(Rec).where(task.needs(), Rec.recording_id > after)
+            ).one()
+    return total
+
+
+def _active(session: Session, name: str) -> bool:
+    return (
+        session.exec(
+            select(models.Jobs.job_id).where(models.Jobs.kind == name, models.Jobs.status.in_(["queued", "running"]))
+        ).first()
+        is not None
+    )
+
+
+def start(session: Session, name: str) -> dict:
+    """Queue the first batch if the task has work and is not already running; returns its progress."""
+    task = TASKS[name]
+    state = progress(session, name)
+    if _active(session, name):
+        return state
+    after = state.get("last_id", 0) if task.once else 0
+    total = _count(task, after)
+    if not total:
+        return state
+    shard, ids = _next_batch(task, after, settings.maintenance_batch_size)
+    jobs.enqueue(session, name, {"ids": ids, "shard": shard})
+    state.update(status="running", total=total, done=0, started_at=utc_now_iso(), finished_at=None)
+    _save(session, name, state)
+    session.commit()
+    jobs.notify()
+    return state
+
+
+def _apply_batch(session: Session, task: Task, ids: list[int], result: dict):
+    rows = session.exec(
+        select(Rec, models.Books)
+        .join(models.Chapters, models.Chapters.chapter_id == Rec.chapter_id)
+        .join(models.Books, models.Books.book_id == models.Chapters.book_id)
+        .where(Rec.recording_id.in_(ids))
+    ).all()
+    for recording, book in rows:
+        value = result.get(str(recording.recording_id))
+        if value is not None:
+            task.apply(session, recording, book, value)
+            session.add(recording)
+
+
+def _finish(session: Session, payload: dict, result: dict):
+    """``session`` is on the primary, where the chain's jobs and progress are kept."""
+    name = payload["task"]
+    task = TASKS[name]
+    ids = payload["ids"]
+    if payload.get("shard"):
+        with Session(get_shard(payload["shard"]).engine) as shard_session:
+            _apply_batch(shard_session, task, ids, result)
+            shard_session.commit()
+    else:
+        _apply_batch(session, task, ids, result)
+    state = progress(session, name)
+    state["done"] = state.get("done", 0) + len(ids)
+    state["last_id"] = max(ids, default=state.get("last_id", 0))
+    shard, following = _next_batch(task, ids[-1], settings.maintenance_batch_size) if ids else (0, [])
+    if following:
+        # Pause between batches so the chain never monopolises the worker or the write lock.
+        run_after = (datetime.utcnow() + timedelta(seconds=settings.maintenance_pause_seconds)).isoformat()
+        jobs.enqueue(session, name, {"ids": following, "shard": shard}, run_after=run_after)
+    else:
+        state["status"] = "done"
+        state["finished_at"] = utc_now_iso()
+    _save(session, name, state)
+
+
+def register(task: Task):
+    TASKS[task.name] = task
+
+    def finish(session: Session, payload: dict, result: dict):
+        _finish(session, {**payload, "task": task.name}, result)
+
+    jobs.register(task.name, task.run, finish, background=True)
+
+
+# Word counts and WPM for rows saved before metrics were stored, or with a duration but no WPM.
+
+
+def _metrics_needed():
+    return or_(
+        (Rec.word_count.is_(None)) & (Rec.transcription_text.is_not(None)),
+        (Rec.wpm.is_(None)) & (Rec.word_count > 0) & (Rec.duration_seconds > 0),
+    )
+
+
+def _count_words(payload: dict) -> dict:
+    with Session(get_shard(payload.get("shard", 0)).read_engine) as session:
+        rows = session.exec(
+            select(Rec.recording_id, Rec.transcription_text).where(Rec.recording_id.in_(payload["ids"]))
+        ).all()
+    return {str(recording_id): crud.word_count(text) if text else 0 for recording_id, text in rows}
+
+
+def _apply_word_count(session: Session, recording: models.Recordings, book: models.Books, word_count: int):
+    transcode.refresh_metrics(session, recording, book, recording.duration_seconds, word_count)
+
+
+# Durations read from the stored audio (ffprobe, or the WAV header) for rows that have none.
+
+
+def _duration_needed():
+    return Rec.duration_seconds.is_(None) & Rec.blob_key.is_not(None)
+
+
+def _probe_durations(payload: dict) -> dict:
+    with Session(get_shard(payload.get("shard", 0)).read_engine) as session:
+        rows = session.exec(select(Rec.recording_id, Rec.blob_key).where(Rec.recording_id.in_(payload["ids"]))).all()
+    durations = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for recording_id, blob_key in rows:
+            path = Path(tmp) / str(recording_id)
+            try:
+                transcode.fetch_blob(blob_key, path)
+            except OSError:
+                continue
+            durations[str(recording_id)] = transcode.probe_duration(path)
+            path.unlink()
+    return durations
+
+
+def _apply_duration(session: Session, recording: models.Recordings, book: models.Books, duration: float):
+    transcode.refresh_metrics(session, recording, book, duration)
+
+
+# CRC-32s for recordings stored before they were tracked. Until then, zip downloads stream those
+# entries with data descriptors, which rules out Content-Length and range requests.
+
+
+def _crc_needed():
+    return Rec.file_crc32.is_(None) & Rec.blob_key.is_not(None)
+
+
+def _compute_crcs(payload: dict) -> dict:
+    with Session(get_shard(payload.get("shard", 0)).read_engine) as session:
+        rows = session.exec(select(Rec.recording_id, Rec.blob_key).where(Rec.recording_id.in_(payload["ids"]))).all()
+    store = get_blob_store()
+    crcs = {}
+    for recording_id, blob_key in rows:
+        try:
+            crcs[str(recording_id)] = store.crc32(blob_key)
+        except OSError:
+            continue
+    return crcs
+
+
+def _apply_crc(session: Session, recording: models.Recordings, book: models.Books, crc: int):
+    recording.file_crc32 = crc
+
+
+register(Task("backfill_metrics", _metrics_needed, _count_words, _apply_word_count))
+register(Task("derive_durations", _duration_needed, _probe_durations, _apply_duration, once=True))
+register(Task("backfill_crc32", _crc_needed, _compute_crcs, _apply_crc, once=True))
+
+
+class Scheduler:
+    """Starts every task with outstanding work every ``interval`` seconds; the job worker does the rest.
+
+    Each pass also deletes released blobs whose grace period is over (crud.sweep_blobs).
+    """
+
+    def __init__(self, engine, interval: float):
+        self.engine = engine
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self):
+        for name in TASKS:
+            try:
+                with Session(self.engine) as session:
+                    start(session, name)
+            except Exception:
+                logger.exception("Starting maintenance task %s failed", name)
+        try:
+            swept = crud.sweep_blobs()
+            if swept:
+                logger.info("Deleted %d unused blobs", swept)
+        except Exception:
+            logger.exception("Sweeping released blobs failed")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+
+_scheduler: Optional[Scheduler] = None
+
+
+def start_scheduler(engine) -> Optional[Scheduler]:
+    global _scheduler
+    if settings.jobs_enabled and settings.maintenance_enabled and _scheduler is None:
+        _scheduler = Scheduler(engine, settings.maintenance_interval_seconds)
+        _scheduler.start()
+    return _scheduler
+
+
+def stop_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.stop()
+        _scheduler = None
+
+
+def status(session: Session) -> dict:
+    """Progress of each task and job counts by kind and status, summed over the shards' job queues."""
+    counts: dict[str, dict[str, int]] = {}
+    for number in shard_ids():
+        with Session(get_shard(number).read_engine) as shard_session:
+            rows = shard_session.exec(
+                select(models.Jobs.kind, models.Jobs.status, func.count())
+                .group_by(models.Jobs.kind, models.Jobs.status)
+            ).all()
+        for kind, job_status, count in rows:
+            by_status = counts.setdefault(kind, {})
+            by_status[job_status] = by_status.get(job_status, 0) + count
+    return {"tasks": {name: progress(session, name) for name in TASKS}, "jobs": counts}
+
+
+if __name__ == "__main__":
+    from .db import engine, init_db
+
+    init_db(migrate_blobs=False)
+    with Session(engine) as session:
+        for name in sys.argv[1:] or list(TASKS):
+            state = start(session, name)
+            print(f"{name}: {state.get('status')} ({state.get('done', 0)}/{state.get('total', 0)})")
+    print("Queued; a running app's job worker processes the batches.")
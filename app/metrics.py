@@ -0,0 +1,354 @@
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional
+
+import anyio
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import profiling
+from .settings import settings
+
+# Process-local metrics in the Prometheus text format, served at /metrics.
+# Every worker process keeps its own numbers; scrape each one (or sum them).
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+_registry: list["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[tuple[str, tuple, str, float]]:
+        """(suffix, label values, extra label, value) for each exposed line."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", key, "", value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down; ``collect`` computes label values -> value at scrape time instead."""
+
+    kind = "gauge"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple = (), collect: Optional[Callable[[], dict]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.collect is None:
+            yield from super().samples()
+            return
+        for key, value in self.collect().items():
+            yield "", key, "", value
+
+
+class CollectedCounter(Gauge):
+    """Counter whose totals are kept elsewhere (e.g. cache hit counts) and read at scrape time."""
+
+    kind = "counter"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts, then sum and count.
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield "_bucket", key, f'le="{_format_value(float(bound))}"', cumulative
+            yield "_bucket", key, 'le="+Inf"', count
+            yield "_sum", key, "", total
+            yield "_count", key, "", count
+
+
+def render() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+# Requests
+
+requests_total = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+request_seconds = Histogram("http_request_duration_seconds", "Time to the last body byte.", ("method", "route"))
+response_bytes = Counter("http_response_bytes_total", "Response body bytes sent (audio, zip, ...).", ("route",))
+requests_in_progress = Gauge("http_requests_in_progress", "Requests currently being served.")
+
+# Database
+
+db_queries = Counter("db_queries_total", "SQL statements executed.", ("engine",))
+db_query_seconds = Histogram("db_query_duration_seconds", "Time per SQL statement.", ("engine",), QUERY_BUCKETS)
+db_queries_per_request = Histogram(
+    "db_queries_per_request", "SQL statements issued while serving one request.", ("route",), COUNT_BUCKETS
+)
+db_seconds_per_request = Histogram("db_seconds_per_request", "Time spent in SQL while serving one request.", ("route",))
+
+# Hot-path sections (auth decode, grant loads, scripture load, blob reads, ...)
+
+section_seconds = Histogram("section_duration_seconds", "Time spent in instrumented code sections.", ("section",))
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Copied into threadpool workers and SQLAlchemy's async greenlets, so queries
+# made anywhere on behalf of a request add to that request's stats.
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def instrument_engine(sync_engine, name: str):
+    """Count and time every statement run through ``sync_engine`` (pass ``engine.sync_engine`` for async ones)."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        db_queries.inc(engine=name)
+        db_query_seconds.observe(elapsed, engine=name)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+
+@contextmanager
+def timed(section: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        section_seconds.observe(time.perf_counter() - start, section=section)
+
+
+def timed_iter(section: str, iterator: Iterable) -> Iterator:
+    """Yield from ``iterator``, observing the total time spent producing items (not consuming them)."""
+    iterator = iter(iterator)
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += time.perf_counter() - start
+                return
+            elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        section_seconds.observe(elapsed, section=section)
+
+
+def timed_generator(section: str):
+    """Decorator form of ``timed_iter`` for generator functions."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return timed_iter(section, fn(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+# Caches: TTLCache instances or functools.lru_cache functions, read at scrape time.
+
+_caches: dict[str, object] = {}
+
+
+def register_cache(name: str, cache):
+    _caches[name] = cache
+
+
+def _cache_stats() -> dict[str, tuple[int, int, int]]:
+    stats = {}
+    for name, cache in _caches.items():
+        if hasattr(cache, "cache_info"):
+            info = cache.cache_info()
+            stats[name] = (info.hits, info.misses, info.currsize)
+        else:
+            stats[name] = (cache.hits, cache.misses, len(cache))
+    return stats
+
+
+CollectedCounter("cache_hits_total", "Cache hits.", ("cache",), lambda: {(k,): v[0] for k, v in _cache_stats().items()})
+CollectedCounter(
+    "cache_misses_total", "Cache misses.", ("cache",), lambda: {(k,): v[1] for k, v in _cache_stats().items()}
+)
+Gauge("cache_entries", "Entries currently cached.", ("cache",), lambda: {(k,): v[2] for k, v in _cache_stats().items()})
+Gauge(
+    "cache_hit_ratio",
+    "Hits / lookups since the process started.",
+    ("cache",),
+    lambda: {(k,): hits / (hits + misses) for k, (hits, misses, _) in _cache_stats().items() if hits + misses},
+)
+
+
+# Thread pools: anyio capacity limiters, read at scrape time (must be called on the event loop).
+
+_limiters: dict[str, Callable[[], anyio.CapacityLimiter]] = {
+    # Sync endpoints and dependencies run here; when it is full, requests queue.
+    "default": anyio.to_thread.current_default_thread_limiter,
+}
+
+
+def register_limiter(name: str, limiter: anyio.CapacityLimiter):
+    _limiters[name] = lambda: limiter
+
+
+def _limiter_stats() -> dict[str, tuple[float, float, int]]:
+    stats = {}
+    for name, get_limiter in _limiters.items():
+        limiter = get_limiter()
+        statistics = limiter.statistics()
+        stats[name] = (statistics.borrowed_tokens, statistics.total_tokens, statistics.tasks_waiting)
+    return stats
+
+
+Gauge("threadpool_busy", "Threads in use.", ("pool",), lambda: {(k,): v[0] for k, v in _limiter_stats().items()})
+Gauge("threadpool_size", "Thread limit.", ("pool",), lambda: {(k,): v[1] for k, v in _limiter_stats().items()})
+Gauge(
+    "threadpool_waiting",
+    "Tasks waiting for a free thread.",
+    ("pool",),
+    lambda: {(k,): v[2] for k, v in _limiter_stats().items()},
+)
+
+
+def _route_label(scope: Scope) -> str:
+    # The route template keeps label cardinality bounded; unmatched paths share one label.
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Per-request latency, status, bytes sent and DB usage; also starts header-triggered profiles."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        profile = profiling.maybe_start(scope) if settings.profiling_enabled else None
+        status = 500
+        sent = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile is not None:
+                    message["headers"] = [*message.get("headers", []), (b"x-profile", profile.name.encode())]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        requests_in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            requests_in_progress.dec()
+            _request_stats.reset(token)
+            if profile is not None:
+                profile.stop()
+            route = _route_label(scope)
+            requests_total.inc(method=scope["method"], route=route, status=status)
+            request_seconds.observe(elapsed, method=scope["method"], route=route)
+            response_bytes.inc(sent, route=route)
+            db_queries_per_request.observe(stats.queries, route=route)
+            db_seconds_per_request.observe(stats.db_seconds, route=route)
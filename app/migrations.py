@@ -0,0 +1,118 @@
+import logging
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import Connection, Engine, inspect, text
+from sqlmodel import SQLModel, select
+
+from . import models
+from .models import utc_now_iso
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    # Runs inside one transaction; must only use SQL that SQLite and PostgreSQL both accept.
+    apply: Callable[[Connection], None]
+    # Also applied to shard files (see app/db.py); such migrations may only touch db.SHARD_TABLES.
+    shard: bool = False
+
+
+def _add_columns(conn: Connection, table: str, names: list[str]):
+    """Add columns declared on the model but missing from an older database."""
+    existing = {column["name"] for column in inspect(conn).get_columns(table)}
+    model = SQLModel.metadata.tables[table]
+    for name in names:
+        if name in existing:
+            continue
+        column_type = model.c[name].type.compile(dialect=conn.dialect)
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+
+def _create_indexes(conn: Connection, table: str, names: list[str]):
+    indexes = {index.name: index for index in SQLModel.metadata.tables[table].indexes}
+    for name in names:
+        indexes[name].create(conn, checkfirst=True)
+
+
+def _recording_metrics_columns(conn: Connection):
+    _add_columns(conn, "recordings", ["word_count", "wpm", "blob_key", "file_size", "file_sha256", "file_crc32"])
+    _create_indexes(conn, "recordings", ["ix_recordings_blob_key"])
+
+
+def _seed_unique_keys(conn: Connection):
+    # The bulk seeder upserts against these.
+    _create_indexes(conn, "books", ["ux_books_bible_book"])
+    _create_indexes(conn, "chapters", ["ux_chapters_book_chapter"])
+
+
+def _hot_join_indexes(conn: Connection):
+    _create_indexes(conn, "auths", ["ix_auths_user_auth"])
+    _create_indexes(conn, "recordings", ["ix_recordings_chapter_verse", "ix_recordings_user_id"])
+
+
+def _bible_shard_column(conn: Connection):
+    _add_columns(conn, "bibles", ["shard"])
+
+
+def _recording_upload_id(conn: Connection):
+    _add_columns(conn, "recordings", ["upload_id"])
+    _create_indexes(conn, "recordings", ["ux_recordings_upload_id"])
+
+
+def _rendition_created_at(conn: Connection):
+    _add_columns(conn, "renditions", ["created_at"])
+    # When older renditions were made is unknown; now is never earlier than that, so caches revalidate.
+    conn.execute(text("UPDATE renditions SET created_at = :now WHERE created_at IS NULL"), {"now": utc_now_iso()})
+
+
+MIGRATIONS = [
+    Migration(1, "recording metrics and blob columns", _recording_metrics_columns, shard=True),
+    Migration(2, "seed unique keys", _seed_unique_keys),
+    Migration(3, "indexes for hot joins", _hot_join_indexes),
+    Migration(4, "bible shard", _bible_shard_column),
+    Migration(5, "recording upload id", _recording_upload_id, shard=True),
+    Migration(6, "rendition created at", _rendition_created_at, shard=True),
+]
+
+
+def upgrade(engine: Engine, fresh: bool = False, shard: bool = False) -> list[int]:
+    """Apply pending migrations in order and return their versions.
+
+    A database just created by ``create_all`` already has the current schema,
+    so ``fresh`` only records every migration as applied. A ``shard`` file only
+    gets the migrations marked ``shard``.
+    """
+    applied = []
+    with engine.begin() as conn:
+        done = set(conn.execute(select(models.SchemaMigrations.version)).scalars())
+    for migration in MIGRATIONS:
+        if migration.version in done or (shard and not migration.shard):
+            continue
+        with engine.begin() as conn:
+            if not fresh:
+                logger.info("Applying migration %d: %s", migration.version, migration.name)
+                migration.apply(conn)
+            conn.execute(
+                models.SchemaMigrations.__table__.insert().values(
+                    version=migration.version, name=migration.name, applied_at=utc_now_iso()
+                )
+            )
+        applied.append(migration.version)
+    return applied
+
+
+def current_version(engine: Engine) -> int:
+    with engine.connect() as conn:
+        versions = conn.execute(select(models.SchemaMigrations.version)).scalars().all()
+    return max(versions, default=0)
+
+
+if __name__ == "__main__":
+    from .db import engine, init_db
+
+    init_db(migrate_blobs=False)
+    print(f"Schema version {current_version(engine)} (latest {MIGRATIONS[-1].version})")
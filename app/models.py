@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import Optional
 
 from sqlmodel import Field, SQLModel
-from sqlalchemy import PrimaryKeyConstraint, ForeignKeyConstraint, LargeBinary
+from sqlalchemy import Index, PrimaryKeyConstraint, ForeignKeyConstraint
 
 
 class Users(SQLModel, table=True):
@@ -17,6 +17,9 @@ class Auths(SQLModel, table=True):
     auth_id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.user_id")
 
+    # Covers the grant lookup (user_id -> auth_id) without touching the table.
+    __table_args__ = (Index("ix_auths_user_auth", "user_id", "auth_id"),)
+
 
 class ListenAuths(SQLModel, table=True):
     auth_id: int = Field(foreign_key="auths.auth_id")
@@ -37,6 +40,8 @@ class Bibles(SQLModel, table=True):
     name: str
     language: str
     version: str
+    # Shard holding the bible's recordings (see app/db.py); None until sharding first needs it.
+    shard: Optional[int] = None
 
 
 class CanonBooks(SQLModel, table=True):
@@ -56,6 +61,8 @@ class Books(SQLModel, table=True):
     bible_id: int = Field(foreign_key="bibles.bible_id")
     canon_book_name: str = Field(foreign_key="canonbooks.canon_book_name")
 
+    __table_args__ = (Index("ux_books_bible_book", "bible_id", "canon_book_name", unique=True),)
+
 
 class Chapters(SQLModel, table=True):
     chapter_id: Optional[int] = Field(default=None, primary_key=True)
@@ -68,24 +75,144 @@ class Chapters(SQLModel, table=True):
             ["canon_book_name", "canon_book_chapter"],
             ["canonchapters.canon_book_name", "canonchapters.canon_book_chapter"],
         ),
+        Index("ux_chapters_book_chapter", "book_id", "canon_book_chapter", unique=True),
     )
 
 
 class Recordings(SQLModel, table=True):
     recording_id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="users.user_id")
+    user_id: int = Field(foreign_key="users.user_id", index=True)
     chapter_id: int = Field(foreign_key="chapters.chapter_id")
     date_recorded: str
     date_last_accessed: Optional[str] = None
     verse_index_start: int
     verse_index_end: int
     accessed_count: int = Field(default=0)
-    file: bytes = Field(sa_type=LargeBinary)
+    # Audio lives in the blob store (see app/storage.py), keyed by content hash.
+    blob_key: Optional[str] = Field(default=None, index=True)
+    file_size: Optional[int] = None
+    file_sha256: Optional[str] = None
+    file_crc32: Optional[int] = None
     file_mime: Optional[str] = None
     duration_seconds: Optional[float] = None
     transcription_text: Optional[str] = None
     word_count: Optional[int] = None
     wpm: Optional[float] = None
+    # The resumable upload this recording was committed from, so a retried commit finds it.
+    upload_id: Optional[str] = None
+
+    # Joins from a bible's chapters reach its recordings already in reading order.
+    # AUTOINCREMENT lets each shard start its ids at its own offset (see app/db.py).
+    __table_args__ = (
+        Index("ix_recordings_chapter_verse", "chapter_id", "verse_index_start", "recording_id"),
+        Index("ux_recordings_upload_id", "upload_id", unique=True),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class Renditions(SQLModel, table=True):
+    """Transcoded copies of a recording's audio (see app/transcode.py)."""
+
+    recording_id: int = Field(foreign_key="recordings.recording_id", primary_key=True)
+    quality: str = Field(primary_key=True)  # "low", "medium" or "high"
+    mime: str
+    bitrate: int  # bits per second
+    blob_key: str = Field(index=True)
+    file_size: int
+    file_sha256: str
+    created_at: str = Field(default_factory=lambda: utc_now_iso())
+
+
+class RecordingAlignments(SQLModel, table=True):
+    """Where each verse starts inside a recording (see app/alignment.py)."""
+
+    recording_id: int = Field(foreign_key="recordings.recording_id", primary_key=True)
+    version: str  # scripture version the transcript was aligned against
+    method: str  # "text" (aligned to the transcript) or "even" (spread by verse length)
+    coverage: Optional[float] = None  # share of scripture words found in the transcript
+    offsets: str = "[]"  # JSON list of start seconds, one per verse from verse_index_start
+    created_at: str = Field(default_factory=lambda: utc_now_iso())
+
+
+class Jobs(SQLModel, table=True):
+    """Durable background work queue (see app/jobs.py)."""
+
+    job_id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str
+    payload: str = "{}"  # JSON
+    status: str = Field(default="queued", index=True)  # queued, running, done or failed
+    attempts: int = Field(default=0)
+    run_after: str = Field(default_factory=lambda: utc_now_iso())
+    locked_at: Optional[str] = None
+    error: Optional[str] = None
+    created_at: str = Field(default_factory=lambda: utc_now_iso())
+    finished_at: Optional[str] = None
+
+
+class Uploads(SQLModel, table=True):
+    """Resumable upload in progress; its bytes are staged on disk (see app/resumable.py)."""
+
+    upload_id: str = Field(primary_key=True)
+    user_id: int = Field(foreign_key="users.user_id")
+    chapter_id: int = Field(foreign_key="chapters.chapter_id")
+    verse_index_start: int
+    verse_index_end: int
+    duration_seconds: Optional[float] = None
+    transcription_text: Optional[str] = None
+    file_mime: Optional[str] = None
+    size: Optional[int] = None  # declared total, if the client knows it
+    offset: int = Field(default=0)  # bytes received and synced to disk
+    locked_at: Optional[str] = None  # set while a request appends or commits
+    recording_id: Optional[int] = None  # set once committed, so a retried commit is answered again
+    created_at: str = Field(default_factory=lambda: utc_now_iso())
+    updated_at: str = Field(default_factory=lambda: utc_now_iso(), index=True)
+
+
+class PlaylistRevisions(SQLModel, table=True):
+    """Bumped whenever a bible's playlist changes, in the same transaction (see app/playlist.py)."""
+
+    bible_id: int = Field(primary_key=True)
+    revision: int = Field(default=0)
+
+
+class RecordingAggregates(SQLModel, table=True):
+    """Running recording metrics per bible, book and chapter (see app/analytics.py)."""
+
+    scope: str = Field(primary_key=True)  # "bible", "book" or "chapter"
+    scope_id: int = Field(primary_key=True)
+    recording_count: int = Field(default=0)
+    word_count_n: int = Field(default=0)
+    word_count_sum: int = Field(default=0)
+    duration_sum: float = Field(default=0.0)
+    play_total: int = Field(default=0)
+    wpm_n: int = Field(default=0)
+    wpm_sum: float = Field(default=0.0)
+    wpm_sumsq: float = Field(default=0.0)
+    wpm_min: Optional[float] = None
+    wpm_max: Optional[float] = None
+    wpm_sketch: Optional[str] = None
+
+
+class BlobReleases(SQLModel, table=True):
+    """Blobs that lost a reference; deleted later if still unused (see crud.sweep_blobs)."""
+
+    blob_key: str = Field(primary_key=True)
+    released_at: str = Field(default_factory=lambda: utc_now_iso(), index=True)
+
+
+class AppState(SQLModel, table=True):
+    """Small key/value store for bookkeeping such as index fingerprints."""
+
+    key: str = Field(primary_key=True)
+    value: Optional[str] = None
+
+
+class SchemaMigrations(SQLModel, table=True):
+    """Versions applied by app/migrations.py."""
+
+    version: int = Field(primary_key=True)
+    name: str
+    applied_at: str
 
 
 # Utility helpers
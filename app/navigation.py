@@ -0,0 +1,81 @@
+import hashlib
+import json
+from typing import Optional
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import metrics, models, scripture
+from .cache import TTLCache
+from .settings import settings
+
+# Pre-serialized books/chapters/versions responses: (json bytes, etag[, bible_id]).
+# Canon data only changes when seeding runs, which calls invalidate(); the TTL
+# bounds staleness for processes that did not run the seed themselves.
+_cache = TTLCache(maxsize=settings.nav_cache_size, ttl=settings.nav_cache_ttl_seconds)
+metrics.register_cache("navigation", _cache)
+
+
+def invalidate():
+    _cache.clear()
+
+
+def _serialize(data) -> tuple[bytes, str]:
+    body = json.dumps(data, separators=(",", ":")).encode()
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+async def books(session: AsyncSession, bible_id: int) -> tuple[bytes, str]:
+    key = ("books", bible_id)
+    cached = _cache.get(key)
+    if cached is None:
+        results = (
+            await session.exec(
+                select(models.Books, models.CanonBooks)
+                .where(models.Books.bible_id == bible_id)
+                .join(models.CanonBooks, models.CanonBooks.canon_book_name == models.Books.canon_book_name)
+                .order_by(models.CanonBooks.canonical_order)
+            )
+        ).all()
+        # Same shape the frontend has always received.
+        cached = _serialize(
+            [{"Books": book.model_dump(), "CanonBooks": canon.model_dump()} for book, canon in results]
+        )
+        _cache.set(key, cached)
+    return cached
+
+
+async def chapters(session: AsyncSession, book_id: int) -> Optional[tuple[bytes, str, int]]:
+    """Chapters of a book plus the book's bible_id for the access check; None if there is no such book."""
+    key = ("chapters", book_id)
+    cached = _cache.get(key)
+    if cached is None:
+        book = await session.get(models.Books, book_id)
+        if not book:
+            return None
+        results = (
+            await session.exec(
+                select(models.Chapters, models.CanonChapters)
+                .where(models.Chapters.book_id == book_id)
+                .join(
+                    models.CanonChapters,
+                    (models.CanonChapters.canon_book_name == models.Chapters.canon_book_name)
+                    & (models.CanonChapters.canon_book_chapter == models.Chapters.canon_book_chapter),
+                )
+                .order_by(models.CanonChapters.canon_book_chapter)
+            )
+        ).all()
+        body, etag = _serialize(
+            [{"Chapters": chapter.model_dump(), "CanonChapters": canon.model_dump()} for chapter, canon in results]
+        )
+        cached = (body, etag, book.bible_id)
+        _cache.set(key, cached)
+    return cached
+
+
+def versions() -> tuple[bytes, str]:
+    cached = _cache.get("versions")
+    if cached is None:
+        cached = _serialize(scripture.get_versions() or ["KJV"])
+        _cache.set("versions", cached)
+    return cached
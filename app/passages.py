@@ -0,0 +1,219 @@
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterator, Optional
+
+from . import metrics, scripture
+from .settings import settings
+
+# Common abbreviations that are not simply a prefix of the book name; "1jn" style
+# forms of numbered books are looked up without their number.
+ABBREVIATIONS = {
+    "gn": "Genesis",
+    "lv": "Leviticus",
+    "nm": "Numbers",
+    "dt": "Deuteronomy",
+    "jdg": "Judges",
+    "qoh": "Ecclesiastes",
+    "sos": "Song of Solomon",
+    "canticles": "Song of Solomon",
+    "ezk": "Ezekiel",
+    "mt": "Matthew",
+    "mk": "Mark",
+    "lk": "Luke",
+    "jn": "John",
+    "jhn": "John",
+    "phil": "Philippians",
+    "php": "Philippians",
+    "phm": "Philemon",
+    "jas": "James",
+    "revelations": "Revelation",
+}
+_ORDINALS = {
+    "i": "1", "ii": "2", "iii": "3", "first": "1", "second": "2", "third": "3", "1st": "1", "2nd": "2", "3rd": "3",
+}
+# Book (optionally numbered) followed by chapter/verse numbers.
+_REFERENCE = re.compile(
+    r"^\s*((?:[123]|i{1,3}|first|second|third|1st|2nd|3rd)?\s*[a-z][a-z. ]*?)\s*(\d[\d\s:,-]*)?$", re.I
+)
+_PART = re.compile(r"^(\d+)(?::(\d+))?(?:-(\d+)(?::(\d+))?)?$")
+
+
+class InvalidReference(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Span:
+    """Verses ``start``..``end`` of one chapter."""
+
+    book: str
+    chapter: int
+    start: int
+    end: int
+
+    @property
+    def label(self) -> str:
+        verses = str(self.start) if self.start == self.end else f"{self.start}-{self.end}"
+        return f"{self.book} {self.chapter}:{verses}"
+
+
+def _normalize(name: str) -> str:
+    words = name.lower().replace(".", " ").split()
+    if words and words[0] in _ORDINALS:
+        words[0] = _ORDINALS[words[0]]
+    return "".join(words)
+
+
+@lru_cache()
+def _book_names() -> dict[str, str]:
+    """Normalized name, abbreviation or unambiguous prefix -> canonical book name."""
+    names: dict[str, str] = {}
+    prefixes: dict[str, set] = {}
+    for book in scripture.CANONICAL_ORDER:
+        full = _normalize(book)
+        names[full] = book
+        # Numbered books need the number plus at least two letters ("1co").
+        for length in range(3 if full[0].isdigit() else 2, len(full)):
+            prefixes.setdefault(full[:length], set()).add(book)
+    for prefix, books in prefixes.items():
+        if len(books) == 1 and prefix not in names:
+            names[prefix] = next(iter(books))
+    names.update(ABBREVIATIONS)
+    return names
+
+
+def resolve_book(name: str) -> Optional[str]:
+    key = _normalize(name)
+    book = _book_names().get(key)
+    if book is None and key[:1].isdigit() and key[1:] in ABBREVIATIONS:
+        numbered = f"{key[0]} {ABBREVIATIONS[key[1:]]}"
+        book = numbered if numbered in scripture.CANONICAL_ORDER else None
+    return book
+
+
+def _verse_count(book: str, chapter: int) -> int:
+    count = scripture.get_chapter_count(book, chapter)
+    if not count:
+        raise InvalidReference(f"{book} has no chapter {chapter}")
+    return count
+
+
+@lru_cache()
+def _chapter_totals() -> dict[str, int]:
+    totals: dict[str, int] = {}
+    for book, chapter in scripture.load_scripture_data().chapter_counts:
+        totals[book] = max(totals.get(book, 0), chapter)
+    return totals
+
+
+def _chapters(book: str) -> int:
+    return _chapter_totals().get(book, 0)
+
+
+def _span(book: str, chapter: int, start: Optional[int], end: Optional[int]) -> Span:
+    count = _verse_count(book, chapter)
+    start = start if start is not None else 1
+    end = end if end is not None else count
+    if start < 1 or end > count:
+        raise InvalidReference(f"{book} {chapter} has verses 1-{count}")
+    if end < start:
+        raise InvalidReference(f"{book} {chapter}:{start}-{end} runs backwards")
+    return Span(book, chapter, start, end)
+
+
+def _expand(book: str, chapter: int, verse: Optional[int], end_chapter: int, end_verse: Optional[int]) -> list[Span]:
+    if end_chapter < chapter:
+        raise InvalidReference(f"{book} {chapter}-{end_chapter} runs backwards")
+    if chapter == end_chapter:
+        return [_span(book, chapter, verse, end_verse)]
+    spans = [_span(book, chapter, verse, None)]
+    spans += [_span(book, c, None, None) for c in range(chapter + 1, end_chapter)]
+    spans.append(_span(book, end_chapter, None, end_verse))
+    return spans
+
+
+def parse(reference: str) -> list[Span]:
+    """Expand references like ``"John 3:16-4:2; Rom 8"`` into per-chapter verse spans.
+
+    ``;`` separates references. Within one, commas continue the same book:
+    ``"John 3:16, 18-20"`` lists verses of chapter 3 and ``"Rom 8, 9"`` lists
+    chapters. A bare book means the whole book; in one-chapter books
+    (Jude, Philemon, ...) bare numbers are verses.
+    """
+    spans: list[Span] = []
+    for text in filter(None, (part.strip() for part in reference.replace("–", "-").split(";"))):
+        match = _REFERENCE.match(text)
+        book = resolve_book(match.group(1)) if match else None
+        if book is None:
+            raise InvalidReference(f"Unknown reference: {text!r}")
+        chapters = _chapters(book)
+        if not chapters:
+            raise InvalidReference(f"{book} is not in the scripture source")
+        if not match.group(2):
+            spans += _expand(book, 1, None, chapters, None)
+            continue
+        chapter: Optional[int] = 1 if chapters == 1 else None
+        in_verses = chapters == 1
+        for part in match.group(2).split(","):
+            numbers = _PART.match(re.sub(r"\s+", "", part))
+            if not numbers:
+                raise InvalidReference(f"Cannot read {part.strip()!r} in {text!r}")
+            first, first_verse, last, last_verse = (int(n) if n else None for n in numbers.groups())
+            if first_verse is not None:
+                chapter, in_verses = first, True
+                if last_verse is not None:
+                    spans += _expand(book, first, first_verse, last, last_verse)
+                    chapter = last
+                else:
+                    spans += _expand(book, first, first_verse, first, first_verse if last is None else last)
+            elif in_verses:
+                if last_verse is not None:
+                    spans += _expand(book, chapter, first, last, last_verse)
+                    chapter = last
+                else:
+                    spans += _expand(book, chapter, first, chapter, first if last is None else last)
+            else:
+                spans += _expand(book, first, None, first if last is None else last, None)
+    if not spans:
+        raise InvalidReference("No references given")
+    return spans
+
+
+@lru_cache(maxsize=settings.passage_cache_size)
+def render(span: Span, versions: tuple[str, ...]) -> bytes:
+    """One passage as a JSON object, versions side by side per verse (null where a version lacks a verse)."""
+    texts = {
+        version: scripture.get_verses(span.book, span.chapter, span.start, span.end, version) for version in versions
+    }
+    return json.dumps(
+        {
+            "reference": span.label,
+            "book": span.book,
+            "chapter": span.chapter,
+            "start": span.start,
+            "end": span.end,
+            "verses": [
+                {"verse": verse, "text": {version: texts[version][index] for version in versions}}
+                for index, verse in enumerate(range(span.start, span.end + 1))
+            ],
+        },
+        separators=(",", ":"),
+    ).encode()
+
+
+metrics.register_cache("passages", render)
+
+
+def verse_total(spans: list[Span]) -> int:
+    return sum(span.end - span.start + 1 for span in spans)
+
+
+def ndjson(spans: list[Span], versions: tuple[str, ...]) -> Iterator[bytes]:
+    for span in spans:
+        yield render(span, versions) + b"\n"
+
+
+def as_json(spans: list[Span], versions: tuple[str, ...]) -> bytes:
+    return b'{"passages":[' + b",".join(render(span, versions) for span in spans) + b"]}"
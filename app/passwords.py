@@ -0,0 +1,112 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from . import metrics
+from .settings import settings
+
+# bcrypt is slow on purpose (about 0.25s at 12 rounds). It runs on a small pool of
+# its own, so a burst of logins never ties up the request threadpool that serves
+# audio and navigation, and calls beyond password_hash_max_pending get a 503
+# instead of an unbounded queue.
+
+# Hashes below bcrypt_rounds are replaced on the next successful login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed)
+
+
+rejected = metrics.Counter("password_hash_rejected_total", "Password hashes refused because too many were pending.")
+
+
+class PasswordPool:
+    """Runs bcrypt calls on dedicated processes (or threads) with at most ``max_pending`` in flight."""
+
+    def __init__(self, workers: int, max_pending: int, processes: bool = True):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.processes = processes
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.processes:
+                    context = multiprocessing.get_context("spawn")
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=context)
+                else:
+                    # bcrypt releases the GIL, so threads also hash in parallel.
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password")
+            return self._executor
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.in_flight -= 1
+
+    async def run(self, fn: Callable, *args):
+        with self._lock:
+            if self.in_flight >= self.max_pending:
+                rejected.inc()
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many sign-ins in progress",
+                    headers={"Retry-After": "1"},
+                )
+            self.in_flight += 1
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Released when the call really ends, even if the request was cancelled while waiting.
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenExecutor:
+            # A worker died; start a fresh pool for the next call.
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+pool = PasswordPool(
+    settings.password_hash_workers, settings.password_hash_max_pending, settings.password_hash_processes
+)
+metrics.Gauge("password_hash_in_flight", "Password hashes queued or running.", collect=lambda: {(): pool.in_flight})
+
+
+async def hash_password(password: str) -> str:
+    with metrics.timed("password_hash"):
+        return await pool.run(_hash, password)
+
+
+async def check_password(password: str, hashed: str) -> tuple[bool, Optional[str]]:
+    """Whether ``password`` matches, and a new hash to store if the old one is below ``bcrypt_rounds``."""
+    with metrics.timed("password_verify"):
+        return await pool.run(_verify, password, hashed)
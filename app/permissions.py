@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import literal, union_all
+from sqlmodel import Session, select
+
+from . import metrics, models
+from .cache import TTLCache
+from .settings import settings
+
+
+@dataclass(frozen=True)
+class Grants:
+    auth_id: Optional[int]
+    listen: frozenset
+    manage: frozenset
+
+    @property
+    def bible_ids(self) -> frozenset:
+        return self.listen | self.manage
+
+    def can_listen(self, bible_id: int) -> bool:
+        return bible_id in self.listen or bible_id in self.manage
+
+    def can_manage(self, bible_id: int) -> bool:
+        return bible_id in self.manage
+
+
+# Keyed by user_id. Entries expire after the TTL even without explicit
+# invalidation, which bounds staleness across worker processes.
+_grants_cache = TTLCache(maxsize=settings.grant_cache_size, ttl=settings.grant_cache_ttl_seconds)
+metrics.register_cache("grants", _grants_cache)
+
+
+def load_grants(session: Session, user_id: int) -> Grants:
+    """Fetch a user's auth record and every listen/manage grant in one round trip."""
+    listen = (
+        select(models.Auths.auth_id, models.ListenAuths.bible_id, literal("listen").label("kind"))
+        .select_from(models.Auths)
+        .outerjoin(models.ListenAuths, models.ListenAuths.auth_id == models.Auths.auth_id)
+        .where(models.Auths.user_id == user_id)
+    )
+    manage = (
+        select(models.Auths.auth_id, models.ManageAuths.bible_id, literal("manage").label("kind"))
+        .join(models.ManageAuths, models.ManageAuths.auth_id == models.Auths.auth_id)
+        .where(models.Auths.user_id == user_id)
+    )
+    auth_id = None
+    granted = {"listen": set(), "manage": set()}
+    for row_auth_id, bible_id, kind in session.exec(union_all(listen, manage)):
+        if auth_id is None or row_auth_id < auth_id:
+            auth_id = row_auth_id
+        if bible_id is not None:
+            granted[kind].add(bible_id)
+    return Grants(auth_id, frozenset(granted["listen"]), frozenset(granted["manage"]))
+
+
+def get_grants(session: Session, user_id: int) -> Grants:
+    grants = _grants_cache.get(user_id)
+    if grants is None:
+        with metrics.timed("grants"):
+            grants = load_grants(session, user_id)
+        _grants_cache.set(user_id, grants)
+    return grants
+
+
+def invalidate(user_id: Optional[int] = None):
+    """Drop cached grants for one user (or everyone) after grants change."""
+    if user_id is None:
+        _grants_cache.clear()
+    else:
+        _grants_cache.pop(user_id)
@@ -0,0 +1,238 @@
+import hashlib
+import hmac
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urlencode
+
+from sqlalchemy import and_, update
+from sqlmodel import Session, select
+
+from . import metrics, models
+from .cache import TTLCache
+from .settings import settings
+
+# Segments are byte ranges of a recording's blob; never smaller than this.
+MIN_SEGMENT_BYTES = 4 * 1024
+# Used to estimate the duration of recordings that have none yet.
+FALLBACK_BYTES_PER_SECOND = 4_000
+
+
+@dataclass
+class Segment:
+    start: int
+    end: int
+    duration: float
+
+
+@dataclass
+class Item:
+    recording_id: int
+    book_name: str
+    chapter_number: int
+    verse_start: int
+    verse_end: int
+    blob_key: str
+    mime: str
+    duration: float
+    segments: list[Segment] = field(default_factory=list)
+
+
+@dataclass
+class Playlist:
+    bible_id: int
+    quality: str
+    items: list[Item]
+    # Segment URLs are signed until this unix time.
+    expires: int
+    # The user the manifest was built for; first-segment URLs carry it so plays count once per listener.
+    listener: int
+
+    @property
+    def target_duration(self) -> int:
+        return max((math.ceil(seg.duration) for item in self.items for seg in item.segments), default=1)
+
+
+# Keyed by (bible_id, revision, book_id, chapter_id, quality, listener). The revision is
+# read from the bible's PlaylistRevisions row, which invalidate() bumps in the transaction
+# that changes the playlist, so no process serves a stale manifest.
+_cache = TTLCache(maxsize=settings.playlist_cache_size, ttl=settings.playlist_cache_ttl_seconds)
+metrics.register_cache("playlist", _cache)
+
+Revision = models.PlaylistRevisions
+
+
+def invalidate(session: Session, bible_id: int):
+    """Retire cached manifests of a bible whose recordings or renditions change; the caller commits."""
+    result = session.exec(
+        update(Revision).where(Revision.bible_id == bible_id).values(revision=Revision.revision + 1)
+    )
+    if result.rowcount == 0:
+        session.add(Revision(bible_id=bible_id, revision=1))
+
+
+def revision(session: Session, bible_id: int) -> int:
+    row = session.get(Revision, bible_id)
+    return row.revision if row else 0
+
+
+def sign(
+    blob_key: str,
+    start: int,
+    end: int,
+    mime: str,
+    expires: int,
+    play: Optional[int] = None,
+    listener: Optional[int] = None,
+) -> str:
+    message = f"{blob_key}:{start}:{end}:{mime}:{expires}:{play or ''}:{listener or ''}".encode()
+    return hmac.new(settings.secret_key.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def verify(
+    blob_key: str,
+    start: int,
+    end: int,
+    mime: str,
+    expires: int,
+    play: Optional[int],
+    listener: Optional[int],
+    sig: str,
+) -> bool:
+    expected = sign(blob_key, start, end, mime, expires, play, listener)
+    return expires >= time.time() and hmac.compare_digest(expected, sig)
+
+
+def segment_url(item: Item, index: int, expires: int, listener: int) -> str:
+    seg = item.segments[index]
+    # The first segment of each recording counts a play for the listener it was issued to.
+    play, listener = (item.recording_id, listener) if index == 0 else (None, None)
+    params = {"mime": item.mime, "exp": expires}
+    if play is not None:
+        params.update(play=play, listener=listener)
+    params["sig"] = sign(item.blob_key, seg.start, seg.end, item.mime, expires, play, listener)
+    return f"/api/segments/{item.blob_key}/{seg.start}-{seg.end}?{urlencode(params)}"
+
+
+def _split(size: int, duration: float) -> list[Segment]:
+    per_second = size / duration if duration > 0 else FALLBACK_BYTES_PER_SECOND
+    step = max(MIN_SEGMENT_BYTES, math.ceil(per_second * settings.segment_seconds))
+    return [
+        Segment(start, min(start + step, size), (min(start + step, size) - start) / per_second)
+        for start in range(0, size, step)
+    ]
+
+
+def _load(
+    session: Session, bible_id: int, book_id: Optional[int], chapter_id: Optional[int], quality: str
+) -> list[Item]:
+    rendition = models.Renditions
+    stmt = (
+        select(
+            models.Recordings.recording_id,
+            models.Chapters.canon_book_name,
+            models.Chapters.canon_book_chapter,
+            models.Recordings.verse_index_start,
+            models.Recordings.verse_index_end,
+            models.Recordings.blob_key,
+            models.Recordings.file_size,
+            models.Recordings.file_mime,
+            models.Recordings.duration_seconds,
+            rendition.blob_key.label("rendition_key"),
+            rendition.file_size.label("rendition_size"),
+            rendition.mime.label("rendition_mime"),
+        )
+        .join(models.Chapters, models.Chapters.chapter_id == models.Recordings.chapter_id)
+        .join(models.Books, models.Books.book_id == models.Chapters.book_id)
+        .join(models.CanonBooks, models.CanonBooks.canon_book_name == models.Books.canon_book_name)
+        .outerjoin(
+            rendition,
+            and_(rendition.recording_id == models.Recordings.recording_id, rendition.quality == quality),
+        )
+        .where(models.Books.bible_id == bible_id, models.Recordings.blob_key.is_not(None))
+    )
+    if book_id is not None:
+        stmt = stmt.where(models.Books.book_id == book_id)
+    if chapter_id is not None:
+        stmt = stmt.where(models.Recordings.chapter_id == chapter_id)
+    stmt = stmt.order_by(
+        models.CanonBooks.canonical_order,
+        models.Chapters.canon_book_chapter,
+        models.Recordings.verse_index_start,
+        models.Recordings.recording_id,
+    )
+    items = []
+    for row in session.exec(stmt):
+        if row.rendition_key:
+            blob_key, size, mime = row.rendition_key, row.rendition_size, row.rendition_mime
+        else:
+            blob_key, size, mime = row.blob_key, row.file_size, row.file_mime or "application/octet-stream"
+        if not size:
+            continue
+        duration = row.duration_seconds or size / FALLBACK_BYTES_PER_SECOND
+        items.append(
+            Item(
+                recording_id=row.recording_id,
+                book_name=row.canon_book_name,
+                chapter_number=row.canon_book_chapter,
+                verse_start=row.verse_index_start,
+                verse_end=row.verse_index_end,
+                blob_key=blob_key,
+                mime=mime,
+                duration=duration,
+                segments=_split(size, duration),
+            )
+        )
+    return items
+
+
+def _build(
+    session: Session, bible_id: int, book_id: Optional[int], chapter_id: Optional[int], quality: str, listener: int
+) -> Playlist:
+    # Round expiry to the hour so rebuilt manifests keep identical, cacheable segment URLs.
+    expires = int((time.time() + settings.segment_url_ttl_seconds) // 3600 * 3600 + 3600)
+    return Playlist(bible_id, quality, _load(session, bible_id, book_id, chapter_id, quality), expires, listener)
+
+
+def manifest(
+    session: Session, bible_id: int, book_id: Optional[int], chapter_id: Optional[int], quality: str, listener: int
+) -> tuple[str, str]:
+    """Rendered JSON manifest for ``listener`` and its ETag, cached until the bible changes."""
+    key = (bible_id, revision(session, bible_id), book_id, chapter_id, quality, listener)
+    cached = _cache.get(key)
+    if cached is None:
+        body = to_json(_build(session, bible_id, book_id, chapter_id, quality, listener))
+        cached = (body, '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"')
+        _cache.set(key, cached)
+    return cached
+
+
+def to_json(playlist: Playlist) -> str:
+    return json.dumps(
+        {
+            "bible_id": playlist.bible_id,
+            "quality": playlist.quality,
+            "target_duration": playlist.target_duration,
+            "duration": sum(item.duration for item in playlist.items),
+            "expires": playlist.expires,
+            "items": [
+                {
+                    "recording_id": item.recording_id,
+                    "book_name": item.book_name,
+                    "chapter_number": item.chapter_number,
+                    "verse_start": item.verse_start,
+                    "verse_end": item.verse_end,
+                    "mime": item.mime,
+                    "duration": item.duration,
+                    "segments": [
+                        {"url": segment_url(item, index, playlist.expires, playlist.listener), "duration": seg.duration}
+                        for index, seg in enumerate(item.segments)
+                    ],
+                }
+                for item in playlist.items
+            ],
+        },
+        separators=(",", ":"),
+    )
@@ -0,0 +1,198 @@
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Optional
+
+from sqlalchemy import bindparam, update
+from sqlmodel import Session, select
+
+from . import analytics, models
+from .db import shard_engine, shard_of
+from .models import utc_now_iso
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+_recordings = models.Recordings.__table__
+_BUMP = (
+    update(_recordings)
+    .where(_recordings.c.recording_id == bindparam("b_id"))
+    .values(
+        accessed_count=_recordings.c.accessed_count + bindparam("b_count"),
+        date_last_accessed=bindparam("b_last"),
+    )
+)
+
+
+class PlayLog:
+    """Buffers play events in memory and writes them to the database in batches.
+
+    Streaming a recording only appends to this log, so plays no longer take
+    the SQLite write lock. A background thread flushes every
+    ``play_flush_seconds``, one transaction per shard (see app/db.py); a shard
+    whose flush fails keeps its events for the next one, and ``stop()`` flushes
+    what is left (at-least-once on shutdown). Pending counts are exposed so
+    read paths can add them to what is stored.
+    """
+
+    def __init__(self, shard_engine: Callable[[int], Any], interval: float, repeat_seconds: float = 0.0):
+        self.shard_engine = shard_engine
+        self.interval = interval
+        self.repeat_seconds = repeat_seconds
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._last: dict[int, str] = {}
+        # Scope totals per shard, so a failed shard's share can be put back on its own.
+        self._scopes: dict[int, Counter] = {}
+        # The scopes each pending recording counts towards, so discard() can take its plays back out.
+        self._members: dict[int, analytics.Scopes] = {}
+        # Events taken by a flush that has not committed yet.
+        self._flushing: tuple[Counter, dict[int, Counter], dict[int, analytics.Scopes]] = (Counter(), {}, {})
+        # When each (recording, listener) last counted through record_once().
+        self._heard: dict[tuple[int, int], float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, recording_id: int, scopes: analytics.Scopes, count: int = 1):
+        with self._lock:
+            self._counts[recording_id] += count
+            self._last[recording_id] = utc_now_iso()
+            self._members[recording_id] = scopes
+            shard_scopes = self._scopes.setdefault(shard_of(recording_id), Counter())
+            for scope in scopes:
+                shard_scopes[scope] += count
+
+    def record_once(self, recording_id: int, listener: int, scopes: analytics.Scopes) -> bool:
+        """Record a play unless ``listener`` already played the recording in the last ``repeat_seconds``.
+
+        For requests that can be replayed, such as signed segment URLs. The
+        window is kept per process.
+        """
+        now = time.monotonic()
+        with self._lock:
+            heard = self._heard.get((recording_id, listener))
+            if heard is not None and now - heard < self.repeat_seconds:
+                return False
+            self._heard[(recording_id, listener)] = now
+        self.record(recording_id, scopes)
+        return True
+
+    def discard(self, recording_id: int):
+        """Forget pending plays of a deleted recording."""
+        shard = shard_of(recording_id)
+        with self._lock:
+            count = self._counts.pop(recording_id, 0)
+            self._last.pop(recording_id, None)
+            _subtract(self._scopes.get(shard), self._members.pop(recording_id, ()), count)
+            # A running flush keeps its per-recording counts (it may put them back on failure),
+            # but its scope totals drop the recording now.
+            counts, scopes, members = self._flushing
+            _subtract(scopes.get(shard), members.get(recording_id, ()), counts[recording_id])
+
+    def pending(self, recording_id: int) -> int:
+        with self._lock:
+            return self._counts[recording_id] + self._flushing[0][recording_id]
+
+    def pending_all(self) -> dict[int, int]:
+        """Snapshot of every recording's pending plays."""
+        with self._lock:
+            return dict(self._counts + self._flushing[0])
+
+    def pending_for_scope(self, scope: str, scope_id: int) -> int:
+        key = (scope, scope_id)
+        with self._lock:
+            return sum(c[key] for c in self._scopes.values()) + sum(c[key] for c in self._flushing[1].values())
+
+    def flush(self) -> int:
+        """Write buffered plays in one transaction per shard. Returns the number of recordings updated."""
+        with self._flush_lock:
+            with self._lock:
+                counts, last, scopes, members = self._counts, self._last, self._scopes, self._members
+                if not counts:
+                    return 0
+                self._counts, self._last, self._scopes, self._members = Counter(), {}, {}, {}
+                self._flushing = (counts, scopes, members)
+            by_shard: dict[int, Counter] = {}
+            for recording_id, count in counts.items():
+                by_shard.setdefault(shard_of(recording_id), Counter())[recording_id] = count
+            flushed = 0
+            try:
+                for shard, shard_counts in by_shard.items():
+                    try:
+                        with Session(self.shard_engine(shard)) as session:
+                            _apply(session, shard_counts, last)
+                            session.commit()
+                        flushed += len(shard_counts)
+                    except Exception:
+                        logger.exception("Flushing %d play counts failed; will retry", len(shard_counts))
+                        with self._lock:
+                            self._counts.update(shard_counts)
+                            self._scopes.setdefault(shard, Counter()).update(scopes.get(shard, Counter()))
+                            for recording_id in shard_counts:
+                                self._members.setdefault(recording_id, members[recording_id])
+                                stamp = last[recording_id]
+                                self._last[recording_id] = max(stamp, self._last.get(recording_id, stamp))
+            finally:
+                with self._lock:
+                    self._flushing = (Counter(), {}, {})
+            return flushed
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="play-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+            self._forget_heard()
+
+    def _forget_heard(self):
+        cutoff = time.monotonic() - self.repeat_seconds
+        with self._lock:
+            self._heard = {key: heard for key, heard in self._heard.items() if heard >= cutoff}
+
+
+def _subtract(shard_scopes: Optional[Counter], scopes: analytics.Scopes, count: int):
+    if shard_scopes is None or not count:
+        return
+    for scope in scopes:
+        shard_scopes[scope] -= count
+        if shard_scopes[scope] <= 0:
+            del shard_scopes[scope]
+
+
+def _apply(session: Session, counts: Counter, last: dict[int, str]):
+    ids = list(counts)
+    session.exec(
+        _BUMP,
+        params=[{"b_id": rec_id, "b_count": counts[rec_id], "b_last": last[rec_id]} for rec_id in ids],
+    )
+    # Scope totals are derived from recordings that still exist, so plays of a
+    # recording deleted before the flush do not leak into the aggregates.
+    per_scope: Counter = Counter()
+    rows = session.exec(
+        select(models.Recordings.recording_id, models.Chapters.chapter_id, models.Books.book_id, models.Books.bible_id)
+        .join(models.Chapters, models.Chapters.chapter_id == models.Recordings.chapter_id)
+        .join(models.Books, models.Books.book_id == models.Chapters.book_id)
+        .where(models.Recordings.recording_id.in_(ids))
+    )
+    for recording_id, chapter_id, book_id, bible_id in rows:
+        for scope in analytics.scopes_for(bible_id, book_id, chapter_id):
+            per_scope[scope] += counts[recording_id]
+    for scope, count in per_scope.items():
+        analytics.record_plays(session, [scope], count)
+
+
+# One log per process; main starts and stops its flusher with the app.
+play_log = PlayLog(shard_engine, settings.play_flush_seconds, settings.play_repeat_seconds)
@@ -0,0 +1,76 @@
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+from starlette.types import Scope
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+HEADER = b"x-profile"
+# Threads whose innermost frame is in one of these are idle (waiting for work or I/O).
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py")
+
+# One profile at a time: samples cover every thread in the process.
+_active = threading.Lock()
+
+
+class Profile:
+    """Samples the stacks of all busy threads until stopped, then writes them in collapsed-stack form.
+
+    The output (``frame;frame;frame count`` per line) feeds flamegraph tools.
+    Threads serving other requests at the same time show up too.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profile-{name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        stacks: Counter = Counter()
+        interval = settings.profile_interval_ms / 1000
+        me = threading.get_ident()
+        try:
+            while not self._stop.wait(interval):
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == me or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    stacks[";".join(reversed(stack))] += 1
+            path = Path(settings.profile_dir)
+            path.mkdir(parents=True, exist_ok=True)
+            (path / self.name).write_text("".join(f"{stack} {count}\n" for stack, count in stacks.most_common()))
+        except Exception:
+            logger.exception("Writing profile %s failed", self.name)
+        finally:
+            _active.release()
+
+
+def maybe_start(scope: Scope) -> Optional[Profile]:
+    """Start a profile if the request asks for one with ``X-Profile`` (and wins the sample draw)."""
+    value = next((v for k, v in scope["headers"] if k == HEADER), None)
+    if value is None:
+        return None
+    if settings.profile_token and value.decode("latin-1") != settings.profile_token:
+        return None
+    if random.random() >= settings.profile_sample_rate or not _active.acquire(blocking=False):
+        return None
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-")[:60]
+    return Profile(f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{slug}-{os.getpid()}.folded")
@@ -0,0 +1,170 @@
+import secrets
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+# Refuse to build multipart responses for pathological Range headers.
+MAX_RANGES = 32
+
+Reader = Callable[[int, int], Iterator[bytes]]
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a ``Range`` header into sorted, merged half-open ``(start, end)`` spans.
+
+    Returns None when the header is malformed (the caller should then serve
+    the whole file) and raises RangeNotSatisfiable when no span overlaps it.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    spans = []
+    for part in spec.split(","):
+        part = part.strip()
+        first, dash, last = part.partition("-")
+        if not dash:
+            return None
+        try:
+            if first == "":
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start, end = max(size - suffix, 0), size
+            else:
+                start = int(first)
+                end = int(last) + 1 if last else size
+                if last and end <= start:
+                    return None
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        spans.append((start, min(end, size)))
+    if not spans:
+        raise RangeNotSatisfiable()
+    spans.sort()
+    merged = [spans[0]]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def _if_range_matches(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    if last_modified is None:
+        return False
+    try:
+        return http_date(last_modified) == http_date(parsedate_to_datetime(if_range))
+    except (TypeError, ValueError):
+        return False
+
+
+def _multipart(
+    read: Reader, spans: List[Tuple[int, int]], size: int, media_type: str, boundary: str
+) -> Tuple[int, Iterator[bytes]]:
+    heads = [
+        (
+            f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n"
+        ).encode()
+        for start, end in spans
+    ]
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    length = sum(len(h) for h in heads) + sum(end - start for start, end in spans) + 2 * (len(spans) - 1) + len(tail)
+
+    def body():
+        for i, (start, end) in enumerate(spans):
+            if i:
+                yield b"\r\n"
+            yield heads[i]
+            yield from read(start, end)
+        yield tail
+
+    return length, body()
+
+
+def ranged_response(
+    request: Request,
+    *,
+    size: int,
+    etag: str,
+    read: Reader,
+    media_type: str,
+    last_modified: Optional[datetime] = None,
+    headers: Optional[dict] = None,
+) -> Response:
+    """Serve ``size`` bytes produced by ``read(start, end)`` honouring validators and Range."""
+    base = {"Accept-Ranges": "bytes", "ETag": etag, **(headers or {})}
+    if last_modified is not None:
+        base["Last-Modified"] = http_date(last_modified)
+
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=base)
+
+    range_header = request.headers.get("range")
+    spans = None
+    if range_header and _if_range_matches(request, etag, last_modified):
+        try:
+            spans = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**base, "Content-Range": f"bytes */{size}"})
+
+    if not spans:
+        return StreamingResponse(
+            read(0, size), media_type=media_type, headers={**base, "Content-Length": str(size)}
+        )
+    if len(spans) == 1:
+        start, end = spans[0]
+        return StreamingResponse(
+            read(start, end),
+            status_code=206,
+            media_type=media_type,
+            headers={**base, "Content-Length": str(end - start), "Content-Range": f"bytes {start}-{end - 1}/{size}"},
+        )
+    boundary = secrets.token_hex(12)
+    length, body = _multipart(read, spans, size, media_type, boundary)
+    return StreamingResponse(
+        body,
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers={**base, "Content-Length": str(length)},
+    )
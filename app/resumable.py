@@ -0,0 +1,189 @@
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import secrets
+import shutil
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+import anyio
+from fastapi import HTTPException, Request
+from sqlalchemy import or_, update
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.requests import ClientDisconnect
+
+from . import models
+from .models import utc_now_iso
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+Upload = models.Uploads
+
+CHECKSUM_ALGORITHMS = {"md5", "sha1", "sha256"}
+# tus uses 460 for a chunk whose Upload-Checksum does not match.
+CHECKSUM_MISMATCH = 460
+
+
+def staging_dir() -> Path:
+    path = Path(settings.upload_staging_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def staging_path(upload_id: str) -> Path:
+    return staging_dir() / upload_id
+
+
+def new_upload_id() -> str:
+    return secrets.token_hex(16)
+
+
+def create_staging_file(upload_id: str):
+    staging_path(upload_id).touch(exist_ok=False)
+
+
+def remove_staging_file(upload_id: str):
+    staging_path(upload_id).unlink(missing_ok=True)
+
+
+def _unshare(path: Path):
+    """Give ``path`` its own copy of the data if it is also linked into the blob store."""
+    if path.stat().st_nlink > 1:
+        copy = path.with_name(f"{path.name}.copy")
+        shutil.copyfile(path, copy)
+        os.replace(copy, path)
+
+
+def parse_checksum(header: Optional[str]) -> Optional[tuple[str, bytes]]:
+    """Parse ``Upload-Checksum: <algorithm> <base64 digest>``."""
+    if not header:
+        return None
+    algorithm, _, encoded = header.strip().partition(" ")
+    if algorithm.lower() not in CHECKSUM_ALGORITHMS:
+        raise HTTPException(status_code=400, detail=f"Unsupported checksum algorithm: {algorithm}")
+    try:
+        return algorithm.lower(), base64.b64decode(encoded.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Malformed Upload-Checksum")
+
+
+def _iso_ago(seconds: float) -> str:
+    return (datetime.utcnow() - timedelta(seconds=seconds)).isoformat()
+
+
+async def lease(session: AsyncSession, upload_id: str, user_id: int) -> Upload:
+    """Take the upload for one append or commit; a second concurrent request gets 409."""
+    result = await session.exec(
+        update(Upload)
+        .where(
+            Upload.upload_id == upload_id,
+            Upload.user_id == user_id,
+            Upload.recording_id.is_(None),
+            or_(Upload.locked_at.is_(None), Upload.locked_at < _iso_ago(settings.upload_lease_seconds)),
+        )
+        .values(locked_at=utc_now_iso())
+    )
+    await session.commit()
+    upload = await session.get(Upload, upload_id, populate_existing=True)
+    if upload is None or upload.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if result.rowcount != 1:
+        if upload.recording_id is not None:
+            raise HTTPException(status_code=409, detail="Upload already committed")
+        raise HTTPException(status_code=409, detail="Upload is busy")
+    return upload
+
+
+async def release(session: AsyncSession, upload_id: str, **values):
+    """End the lease, saving ``values`` (e.g. the new offset) in the same commit."""
+    await session.exec(
+        update(Upload).where(Upload.upload_id == upload_id).values(locked_at=None, updated_at=utc_now_iso(), **values)
+    )
+    await session.commit()
+
+
+def _room(upload: Upload) -> int:
+    limit = settings.max_upload_bytes if upload.size is None else min(upload.size, settings.max_upload_bytes)
+    return limit - upload.offset
+
+
+async def append(request: Request, upload: Upload, checksum: Optional[tuple[str, bytes]]) -> int:
+    """Write the request body at the upload's offset and return the new offset.
+
+    Bytes past the recorded offset (left by an append that died mid-way) are
+    dropped first. If the client disconnects, what arrived is kept unless the
+    chunk carried a checksum, which can then no longer be verified. The file
+    is fsynced before the caller records the new offset.
+    """
+    path = staging_path(upload.upload_id)
+    if not path.exists():
+        raise HTTPException(status_code=410, detail="Upload data expired")
+    # A commit that failed after storing the file leaves it hard-linked to a blob, which must not change.
+    await anyio.to_thread.run_sync(_unshare, path)
+    digest = hashlib.new(checksum[0]) if checksum else None
+    room = _room(upload)
+    written = 0
+    async with await anyio.open_file(path, "r+b") as fh:
+        await fh.truncate(upload.offset)
+        await fh.seek(upload.offset)
+        try:
+            async for chunk in request.stream():
+                written += len(chunk)
+                if written > room:
+                    await fh.truncate(upload.offset)
+                    raise HTTPException(status_code=413, detail="Upload too large")
+                if digest is not None:
+                    digest.update(chunk)
+                await fh.write(chunk)
+        except ClientDisconnect:
+            if digest is not None:
+                written = 0
+        if digest is not None and written and digest.digest() != checksum[1]:
+            await fh.truncate(upload.offset)
+            raise HTTPException(status_code=CHECKSUM_MISMATCH, detail="Checksum mismatch")
+        await fh.truncate(upload.offset + written)
+        await fh.flush()
+        await anyio.to_thread.run_sync(os.fsync, fh.wrapped.fileno())
+    return upload.offset + written
+
+
+_last_collected = 0.0
+
+
+def collect_garbage(engine, force: bool = False) -> int:
+    """Delete uploads idle for ``upload_expire_seconds`` and stray staging files.
+
+    Runs at most every few minutes per process unless ``force`` is set.
+    Returns the number of uploads removed.
+    """
+    global _last_collected
+    now = time.monotonic()
+    if not force and now - _last_collected < min(600.0, settings.upload_expire_seconds / 4):
+        return 0
+    _last_collected = now
+    cutoff = _iso_ago(settings.upload_expire_seconds)
+    with Session(engine) as session:
+        expired = session.exec(
+            select(Upload).where(
+                Upload.updated_at < cutoff,
+                or_(Upload.locked_at.is_(None), Upload.locked_at < cutoff),
+            )
+        ).all()
+        for upload in expired:
+            remove_staging_file(upload.upload_id)
+            session.delete(upload)
+        session.commit()
+        known = set(session.exec(select(Upload.upload_id)).all())
+    stale = time.time() - settings.upload_expire_seconds
+    for path in staging_dir().iterdir():
+        if path.name not in known and path.stat().st_mtime < stale:
+            path.unlink(missing_ok=True)
+    if expired:
+        logger.info("Removed %d abandoned uploads", len(expired))
+    return len(expired)
@@ -75,6 +75,14 @@ class RecordingUpdate(BaseModel):
         return self
 
 
+class BibleRead(BaseModel):
+    bible_id: int
+    name: str
+    language: str
+    version: str
+    model_config = ConfigDict(from_attributes=True)
+
+
 class RecordingRead(BaseModel):
     recording_id: int
     book_name: str
@@ -84,5 +92,27 @@ class RecordingRead(BaseModel):
     date_recorded: str
     accessed_count: int
     duration_seconds: Optional[float]
-    transcription_text: Optional[str]
+    transcription_text: Optional[str] = None
     computed_wpm: Optional[float]
+
+
+class RecordingPage(BaseModel):
+    items: list[RecordingRead]
+    next_cursor: Optional[str] = None
+
+
+class PassageRequest(BaseModel):
+    # Each entry may hold several references separated by ";", e.g. "John 3:16-4:2; Rom 8".
+    references: list[str]
+    versions: list[str] = ["KJV"]
+
+
+class UploadCreate(BaseModel):
+    chapter_id: int
+    verse_index_start: int
+    verse_index_end: int
+    duration_seconds: Optional[float] = None
+    transcription_text: Optional[str] = None
+    file_mime: Optional[str] = None
+    # Total bytes, if known up front; commit then requires exactly this many.
+    size: Optional[int] = None
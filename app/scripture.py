@@ -1,7 +1,15 @@
 import csv
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
 from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from . import metrics
 
 # Canonical book order for reference and ordering.
 CANONICAL_ORDER = [
@@ -74,53 +82,153 @@ CANONICAL_ORDER = [
 ]
 
 SCRIPTURE_PATH = Path(__file__).resolve().parent.parent / "scripture.csv"
+# Compiled, mmap-able form of scripture.csv (see build_index).
+SCRIPTURE_INDEX_PATH = SCRIPTURE_PATH.with_suffix(".bin")
+
+INDEX_MAGIC = b"PABSCR01"
+MISSING_VERSE = 0xFFFFFFFF
 
 
 class ScriptureData:
     def __init__(self):
-        self.verse_lookup: Dict[Tuple[str, int, str, int], str] = {}
         self.chapter_counts: Dict[Tuple[str, int], int] = {}
         self.books_meta: List[Dict] = []
         self.versions: List[str] = []
+        self.source: Dict = {}
+        # (version, book, chapter) -> (first verse slot, verse count)
+        self.chapter_index: Dict[Tuple[str, str, int], Tuple[int, int]] = {}
+        # Two uint32 per verse slot: start/end byte offsets into ``text``.
+        self.slots: Optional[memoryview] = None
+        self.text: Optional[memoryview] = None
+        self._mmap: Optional[mmap.mmap] = None
 
 
-@lru_cache()
-def load_scripture_data() -> ScriptureData:
-    data = ScriptureData()
-    if not SCRIPTURE_PATH.exists():
-        return data
+def _books_meta(books) -> List[Dict]:
+    order_map = {name: idx + 1 for idx, name in enumerate(CANONICAL_ORDER)}
+    meta = []
+    for book in sorted(books, key=lambda b: order_map.get(b, 999)):
+        order = order_map.get(book, len(CANONICAL_ORDER) + 1)
+        testament = "Old" if order <= 39 else "New"
+        meta.append({"canon_book_name": book, "canonical_order": order, "testament": testament})
+    return meta
 
-    version_set = set()
-    chapter_max: Dict[Tuple[str, int], int] = {}
-    seen_books = set()
 
-    with SCRIPTURE_PATH.open(newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
+def _source_stamp(csv_path: Path) -> Dict:
+    stat = csv_path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def build_index(csv_path: Path = SCRIPTURE_PATH, out_path: Path = SCRIPTURE_INDEX_PATH) -> Path:
+    """Compile scripture.csv into the binary index.
+
+    Layout: magic, u32 header length, JSON header, verse slot table
+    (u32 start/end pairs), UTF-8 text. Each chapter's verses are stored as
+    ``"1 text 2 text ..."`` so any verse range is one contiguous byte slice.
+    """
+    verses: Dict[Tuple[str, str, int], Dict[int, str]] = {}
+    chapter_max: Dict[Tuple[str, int], int] = {}
+    digest = hashlib.sha256()
+    with csv_path.open("rb") as raw:
+        for chunk in iter(lambda: raw.read(1 << 20), b""):
+            digest.update(chunk)
+    with csv_path.open(newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
             book = row["CanonBookName"].strip()
             chapter = int(row["CanonBookChapter"])
             verse_num = int(row["CanonChapterVerse"])
             version = row.get("Version", "KJV").strip() or "KJV"
             text = row.get("Text", "").strip()
-            data.verse_lookup[(book, chapter, version, verse_num)] = text
-            version_set.add(version)
+            verses.setdefault((version, book, chapter), {})[verse_num] = text
             chapter_max[(book, chapter)] = max(chapter_max.get((book, chapter), 0), verse_num)
-            seen_books.add(book)
 
-    order_map = {name: idx + 1 for idx, name in enumerate(CANONICAL_ORDER)}
-    books_ordered = sorted(seen_books, key=lambda b: order_map.get(b, 999))
-    for book in books_ordered:
-        order = order_map.get(book, len(CANONICAL_ORDER) + 1)
-        testament = "Old" if order <= 39 else "New"
-        data.books_meta.append(
-            {"canon_book_name": book, "canonical_order": order, "testament": testament}
-        )
+    order_map = {name: idx for idx, name in enumerate(CANONICAL_ORDER)}
+    chapters = []
+    slots = []
+    text = bytearray()
+    for key in sorted(verses, key=lambda k: (k[0], order_map.get(k[1], 999), k[1], k[2])):
+        version, book, chapter = key
+        by_num = verses[key]
+        count = max(by_num)
+        chapters.append([version, book, chapter, len(slots) // 2, count])
+        for verse_num in range(1, count + 1):
+            if verse_num not in by_num:
+                slots.extend((MISSING_VERSE, MISSING_VERSE))
+                continue
+            if verse_num > 1:
+                text += b" "
+            start = len(text)
+            text += f"{verse_num} {by_num[verse_num]}".strip().encode("utf-8")
+            slots.extend((start, len(text)))
 
-    data.chapter_counts = chapter_max
-    data.versions = sorted(version_set)
+    header = json.dumps(
+        {
+            "source": {**_source_stamp(csv_path), "sha256": digest.hexdigest()},
+            "books_meta": _books_meta({book for _, book, _ in verses}),
+            "versions": sorted({version for version, _, _ in verses}),
+            "chapter_counts": [[book, chapter, count] for (book, chapter), count in chapter_max.items()],
+            "chapters": chapters,
+        }
+    ).encode("utf-8")
+
+    fd, tmp_path = tempfile.mkstemp(dir=out_path.parent, prefix=out_path.name)
+    with os.fdopen(fd, "wb") as out:
+        out.write(INDEX_MAGIC)
+        out.write(struct.pack("<I", len(header)))
+        out.write(header)
+        out.write(struct.pack(f"<{len(slots)}I", *slots))
+        out.write(text)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def _read_header(path: Path) -> Optional[Dict]:
+    try:
+        with path.open("rb") as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                return None
+            (length,) = struct.unpack("<I", f.read(4))
+            return json.loads(f.read(length))
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def _open_index(path: Path) -> ScriptureData:
+    data = ScriptureData()
+    with path.open("rb") as f:
+        data._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(data._mmap)
+    (length,) = struct.unpack_from("<I", view, len(INDEX_MAGIC))
+    header_end = len(INDEX_MAGIC) + 4 + length
+    header = json.loads(bytes(view[len(INDEX_MAGIC) + 4 : header_end]))
+    slot_count = sum(count for *_, count in header["chapters"])
+    slots_end = header_end + 8 * slot_count
+    data.slots = view[header_end:slots_end].cast("I")
+    data.text = view[slots_end:]
+    data.source = header["source"]
+    data.books_meta = header["books_meta"]
+    data.versions = header["versions"]
+    data.chapter_counts = {(book, chapter): count for book, chapter, count in header["chapter_counts"]}
+    data.chapter_index = {
+        (version, book, chapter): (first, count) for version, book, chapter, first, count in header["chapters"]
+    }
     return data
 
 
+@lru_cache()
+def load_scripture_data() -> ScriptureData:
+    """Map the compiled index, rebuilding it first if scripture.csv changed."""
+    with metrics.timed("scripture_load"):
+        if SCRIPTURE_PATH.exists():
+            header = _read_header(SCRIPTURE_INDEX_PATH)
+            stamp = _source_stamp(SCRIPTURE_PATH)
+            if header is None or any(header["source"].get(k) != v for k, v in stamp.items()):
+                build_index()
+        elif not SCRIPTURE_INDEX_PATH.exists():
+            return ScriptureData()
+        return _open_index(SCRIPTURE_INDEX_PATH)
+
+
 def get_books_meta() -> List[Dict]:
     return load_scripture_data().books_meta
 
@@ -135,10 +243,48 @@ def get_chapter_count(book: str, chapter: int) -> int:
 
 def get_passage_text(book: str, chapter: int, start: int, end: int, version: str) -> str:
     data = load_scripture_data()
-    verses = []
-    for verse_num in range(start, end + 1):
-        text = data.verse_lookup.get((book, chapter, version, verse_num))
-        if text is None:
+    entry = data.chapter_index.get((version, book, chapter))
+    if entry is None:
+        return ""
+    first, count = entry
+    if start < 1 or end > count or end < start:
+        return ""
+    slots = data.slots
+    for slot in range(first + start - 1, first + end):
+        if slots[2 * slot] == MISSING_VERSE:
             return ""
-        verses.append(f"{verse_num} {text}".strip())
-    return " ".join(verses)
+    lo = slots[2 * (first + start - 1)]
+    hi = slots[2 * (first + end - 1) + 1]
+    return str(data.text[lo:hi], "utf-8")
+
+
+def get_verses(book: str, chapter: int, start: int, end: int, version: str) -> List[Optional[str]]:
+    """Text of each verse in ``start``..``end`` without its number; None where the version lacks a verse.
+
+    Verses past the end of the chapter are None too. Raises ValueError if ``start`` is below 1.
+    """
+    if start < 1:
+        raise ValueError(f"verse numbers start at 1, got {start}")
+    data = load_scripture_data()
+    entry = data.chapter_index.get((version, book, chapter))
+    if entry is None:
+        return [None] * max(end - start + 1, 0)
+    first, count = entry
+    slots, text = data.slots, data.text
+    verses: List[Optional[str]] = []
+    # Slots past ``count`` belong to the next chapter, so the range is clamped to this one.
+    for verse in range(start, min(end, count) + 1):
+        slot = first + verse - 1
+        if slots[2 * slot] == MISSING_VERSE:
+            verses.append(None)
+            continue
+        # Stored as "<n> <text>"; drop the number.
+        raw = str(text[slots[2 * slot] : slots[2 * slot + 1]], "utf-8")
+        verses.append(raw.partition(" ")[2])
+    verses.extend([None] * (end - max(start - 1, count)))
+    return verses
+
+
+if __name__ == "__main__":
+    path = build_index()
+    print("Scripture index written to", path)
@@ -0,0 +1,212 @@
+import re
+from typing import Optional
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from . import crud, models
+from .scripture import load_scripture_data
+
+# Prefix indexes make "word*" queries as cheap as whole-word lookups.
+FTS_OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'"
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+
+_INSERT_VERSE = text(
+    "INSERT INTO scripture_fts (text, version, book, chapter, verse) VALUES (:text, :version, :book, :chapter, :verse)"
+)
+# How long a process may hold the rebuild claim before others assume it died.
+REBUILD_LEASE_SECONDS = 600.0
+_QUERY_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def available(engine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def create_tables(engine):
+    if not available(engine):
+        return
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS scripture_fts USING fts5("
+            f"text, version UNINDEXED, book UNINDEXED, chapter UNINDEXED, verse UNINDEXED, {FTS_OPTIONS})"
+        )
+    create_transcript_table(engine)
+
+
+def create_transcript_table(engine):
+    """The transcript index alone; shards (see app/db.py) have this one but share the verse index."""
+    if not available(engine):
+        return
+    with engine.begin() as conn:
+        # rowid is the recording_id.
+        conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS transcripts_fts USING fts5(text, bible_id UNINDEXED, {FTS_OPTIONS})"
+        )
+
+
+def build_match(query: str) -> Optional[str]:
+    """Turn user input into an FTS5 MATCH expression.
+
+    ``"quoted words"`` become phrase queries, a trailing ``*`` makes a prefix
+    query, and everything else is an implicitly AND-ed term. FTS5 operators
+    in user input are neutralised by quoting every term.
+    """
+    parts = []
+    for phrase, word in _QUERY_TOKEN.findall(query):
+        if phrase:
+            words = _WORD.findall(phrase)
+            if words:
+                parts.append('"' + " ".join(words) + '"')
+            continue
+        prefix = word.endswith("*")
+        words = _WORD.findall(word)
+        if not words:
+            continue
+        if len(words) > 1:
+            parts.append('"' + " ".join(words) + '"' + (" *" if prefix else ""))
+        else:
+            parts.append(f'"{words[0]}"' + ("*" if prefix else ""))
+    return " ".join(parts) or None
+
+
+def index_scripture(session: Session, force: bool = False) -> bool:
+    """(Re)build the verse index when the compiled scripture source changed.
+
+    With several app processes only the one that claims the rebuild does it;
+    the others start with the index as it stands. Batches are committed as
+    they go so the write lock is never held for the whole rebuild.
+    """
+    data = load_scripture_data()
+    fingerprint = data.source.get("sha256")
+    if not fingerprint or (not force and crud.get_state(session, "scripture_fts") == fingerprint):
+        return False
+    if not crud.claim_state(session, "scripture_fts:rebuild", REBUILD_LEASE_SECONDS):
+        return False
+    try:
+        # Another process may have finished a rebuild between the check and the claim.
+        if not force and crud.get_state(session, "scripture_fts") == fingerprint:
+            return False
+        _rebuild_scripture(session, data)
+        crud.set_state(session, "scripture_fts", fingerprint)
+        session.commit()
+        return True
+    finally:
+        crud.release_state(session, "scripture_fts:rebuild")
+
+
+def _rebuild_scripture(session: Session, data):
+    session.exec(text("DELETE FROM scripture_fts"))
+    session.commit()
+    batch = []
+    for (version, book, chapter), (first, count) in data.chapter_index.items():
+        for verse in range(1, count + 1):
+            start, end = data.slots[2 * (first + verse - 1)], data.slots[2 * (first + verse - 1) + 1]
+            if start == end:
+                continue
+            numbered = str(data.text[start:end], "utf-8")
+            verse_text = numbered.split(" ", 1)[1] if " " in numbered else ""
+            batch.append({"text": verse_text, "version": version, "book": book, "chapter": chapter, "verse": verse})
+            if len(batch) >= 5000:
+                session.exec(_INSERT_VERSE, params=batch)
+                session.commit()
+                batch = []
+    if batch:
+        session.exec(_INSERT_VERSE, params=batch)
+
+
+def index_recording(session: Session, recording_id: int, bible_id: int, transcript: Optional[str]):
+    """Add or replace one recording's transcript; runs in the caller's transaction."""
+    remove_recording(session, recording_id)
+    if transcript:
+        session.exec(
+            text("INSERT INTO transcripts_fts (rowid, text, bible_id) VALUES (:id, :text, :bible_id)"),
+            params={"id": recording_id, "text": transcript, "bible_id": bible_id},
+        )
+
+
+def remove_recording(session: Session, recording_id: int):
+    session.exec(text("DELETE FROM transcripts_fts WHERE rowid = :id"), params={"id": recording_id})
+
+
+def index_transcripts(session: Session, force: bool = False) -> bool:
+    """Backfill the transcript index once for databases that predate it (claimed like ``index_scripture``)."""
+    if not force and crud.get_state(session, "transcripts_fts") == "1":
+        return False
+    if not crud.claim_state(session, "transcripts_fts:rebuild", REBUILD_LEASE_SECONDS):
+        return False
+    try:
+        if not force and crud.get_state(session, "transcripts_fts") == "1":
+            return False
+        _backfill_transcripts(session)
+        return True
+    finally:
+        crud.release_state(session, "transcripts_fts:rebuild")
+
+
+def _backfill_transcripts(session: Session):
+    session.exec(text("DELETE FROM transcripts_fts"))
+    rows = session.exec(
+        select(models.Recordings.recording_id, models.Books.bible_id, models.Recordings.transcription_text)
+        .join(models.Chapters, models.Chapters.chapter_id == models.Recordings.chapter_id)
+        .join(models.Books, models.Books.book_id == models.Chapters.book_id)
+        .where(models.Recordings.transcription_text.is_not(None))
+        .execution_options(yield_per=1000)
+    )
+    for recording_id, bible_id, transcript in rows:
+        index_recording(session, recording_id, bible_id, transcript)
+    crud.set_state(session, "transcripts_fts", "1")
+    session.commit()
+
+
+def search_scripture(session: Session, match: str, version: Optional[str], limit: int, offset: int) -> list[dict]:
+    sql = (
+        "SELECT version, book, chapter, verse, "
+        f"highlight(scripture_fts, 0, '{HIGHLIGHT_OPEN}', '{HIGHLIGHT_CLOSE}') AS highlight, "
+        "bm25(scripture_fts) AS score FROM scripture_fts WHERE scripture_fts MATCH :match"
+    )
+    params = {"match": match, "limit": limit, "offset": offset}
+    if version:
+        sql += " AND version = :version"
+        params["version"] = version
+    sql += " ORDER BY score LIMIT :limit OFFSET :offset"
+    return [
+        {
+            "version": row.version,
+            "book": row.book,
+            "chapter": row.chapter,
+            "verse": row.verse,
+            "highlight": row.highlight,
+            "score": -row.score,
+        }
+        for row in session.exec(text(sql), params=params)
+    ]
+
+
+def search_transcripts(session: Session, match: str, bible_id: int, limit: int, offset: int) -> list[dict]:
+    sql = text(
+        "SELECT f.rowid AS recording_id, "
+        f"snippet(transcripts_fts, 0, '{HIGHLIGHT_OPEN}', '{HIGHLIGHT_CLOSE}', '…', 24) AS highlight, "
+        "bm25(transcripts_fts) AS score, c.canon_book_name, c.canon_book_chapter, "
+        "r.verse_index_start, r.verse_index_end "
+        "FROM transcripts_fts AS f "
+        "JOIN recordings AS r ON r.recording_id = f.rowid "
+        "JOIN chapters AS c ON c.chapter_id = r.chapter_id "
+        "WHERE transcripts_fts MATCH :match AND f.bible_id = :bible_id "
+        "ORDER BY score LIMIT :limit OFFSET :offset"
+    )
+    rows = session.exec(sql, params={"match": match, "bible_id": bible_id, "limit": limit, "offset": offset})
+    return [
+        {
+            "recording_id": row.recording_id,
+            "book_name": row.canon_book_name,
+            "chapter_number": row.canon_book_chapter,
+            "verse_start": row.verse_index_start,
+            "verse_end": row.verse_index_end,
+            "highlight": row.highlight,
+            "score": -row.score,
+        }
+        for row in rows
+    ]
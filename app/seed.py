@@ -1,97 +1,135 @@
+import hashlib
+import json
+import sys
 from collections import defaultdict
+from typing import Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlmodel import Session, select
 
-from . import models
+from . import crud, models, navigation
 from .db import engine
 from .models import utc_now_iso
-from .scripture import get_books_meta, load_scripture_data
+from .scripture import load_scripture_data
+
+DEFAULT_BIBLES = [{"bible_id": 1, "name": "Sample Bible", "language": "English"}]
+_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _upsert(session: Session, model, rows: list[dict], keys: list[str], update: tuple = ()):
+    """Bulk ``INSERT ... ON CONFLICT`` keyed on ``keys``; ``update`` columns are refreshed on conflict."""
+    if not rows:
+        return
+    stmt = _INSERTS[session.bind.dialect.name](model)
+    if update:
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_={col: stmt.excluded[col] for col in update})
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+    session.exec(stmt, params=rows)
 
 
-def seed():
+def _fingerprint(scripture, version: str) -> str:
+    payload = {
+        "books": scripture.books_meta,
+        "chapters": sorted([book, chapter, count] for (book, chapter), count in scripture.chapter_counts.items()),
+        "version": version,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def seed(bibles: Optional[list[dict]] = None, force: bool = False) -> bool:
+    """Upsert canon data and each bible's books/chapters in a handful of statements.
+
+    ``bibles`` lists ``{"bible_id", "name", "language"}`` dicts (defaults to
+    the sample bible). The stored fingerprint covers only the scripture
+    source, so seeding a different set of bibles (startup seeds the default,
+    ``python -m app.seed N`` seeds N) does not invalidate it. While it
+    matches, only bibles without a row yet are seeded, and nothing runs if
+    there are none. Returns True if anything ran.
+    """
     scripture = load_scripture_data()
-    books_meta = scripture.books_meta
-    chapter_counts = scripture.chapter_counts
-    versions = scripture.versions or ["KJV"]
-    default_version = versions[0]
+    bibles = bibles or DEFAULT_BIBLES
+    default_version = (scripture.versions or ["KJV"])[0]
+    fingerprint = _fingerprint(scripture, default_version)
 
     with Session(engine) as session:
-        # Bible
-        bible = session.exec(select(models.Bibles).where(models.Bibles.bible_id == 1)).first()
-        if not bible:
-            bible = models.Bibles(
-                bible_id=1,
-                name="Sample Bible",
-                language="English",
-                version=default_version,
-            )
-            session.add(bible)
-        else:
-            bible.version = default_version
-
-        # Canon books/chapters
-        for book in books_meta:
-            book_name = book["canon_book_name"]
-            order = book["canonical_order"]
-            testament = book["testament"]
-            canon_book = session.exec(
-                select(models.CanonBooks).where(models.CanonBooks.canon_book_name == book_name)
-            ).first()
-            if not canon_book:
-                canon_book = models.CanonBooks(canon_book_name=book_name, canonical_order=order, testament=testament)
-                session.add(canon_book)
-            else:
-                canon_book.canonical_order = order
-                canon_book.testament = testament
-
-            chapter_nums = sorted({ch for (b, ch), _ in chapter_counts.items() if b == book_name})
-            for chapter_num in chapter_nums:
-                verse_count = chapter_counts[(book_name, chapter_num)]
-                canon_chapter = session.exec(
-                    select(models.CanonChapters).where(
-                        models.CanonChapters.canon_book_name == book_name,
-                        models.CanonChapters.canon_book_chapter == chapter_num,
-                    )
-                ).first()
-                if not canon_chapter:
-                    canon_chapter = models.CanonChapters(
-                        canon_book_name=book_name,
-                        canon_book_chapter=chapter_num,
-                        verse_count=verse_count,
-                    )
-                    session.add(canon_chapter)
-
-        # Books and chapters for bible 1
-        for book in books_meta:
-            book_name = book["canon_book_name"]
-            book = session.exec(
-                select(models.Books).where(
-                    models.Books.bible_id == 1, models.Books.canon_book_name == book_name
-                )
-            ).first()
-            if not book:
-                book = models.Books(bible_id=1, canon_book_name=book_name)
-                session.add(book)
-                session.flush()
-            chapter_nums = sorted({ch for (b, ch), _ in chapter_counts.items() if b == book_name})
-            for chapter_num in chapter_nums:
-                chapter = session.exec(
-                    select(models.Chapters).where(
-                        models.Chapters.book_id == book.book_id,
-                        models.Chapters.canon_book_name == book_name,
-                        models.Chapters.canon_book_chapter == chapter_num,
-                    )
-                ).first()
-                if not chapter:
-                    session.add(
-                        models.Chapters(
-                            book_id=book.book_id,
-                            canon_book_name=book_name,
-                            canon_book_chapter=chapter_num,
-                        )
+        if not force and crud.get_state(session, "seed") == fingerprint:
+            existing = set(
+                session.exec(
+                    select(models.Bibles.bible_id).where(
+                        models.Bibles.bible_id.in_([bible["bible_id"] for bible in bibles])
                     )
+                ).all()
+            )
+            bibles = [bible for bible in bibles if bible["bible_id"] not in existing]
+            if not bibles:
+                return False
+
+        chapters_by_book = defaultdict(list)
+        for (book_name, chapter_num), verse_count in sorted(scripture.chapter_counts.items()):
+            chapters_by_book[book_name].append((chapter_num, verse_count))
+
+        _upsert(
+            session,
+            models.Bibles,
+            [{**bible, "version": bible.get("version", default_version)} for bible in bibles],
+            ["bible_id"],
+            update=("version",),
+        )
+        _upsert(
+            session,
+            models.CanonBooks,
+            scripture.books_meta,
+            ["canon_book_name"],
+            update=("canonical_order", "testament"),
+        )
+        _upsert(
+            session,
+            models.CanonChapters,
+            [
+                {"canon_book_name": book_name, "canon_book_chapter": chapter_num, "verse_count": verse_count}
+                for book_name, chapters in chapters_by_book.items()
+                for chapter_num, verse_count in chapters
+            ],
+            ["canon_book_name", "canon_book_chapter"],
+            update=("verse_count",),
+        )
+
+        bible_ids = [bible["bible_id"] for bible in bibles]
+        _upsert(
+            session,
+            models.Books,
+            [
+                {"bible_id": bible_id, "canon_book_name": meta["canon_book_name"]}
+                for bible_id in bible_ids
+                for meta in scripture.books_meta
+            ],
+            ["bible_id", "canon_book_name"],
+        )
+        books = session.exec(
+            select(models.Books.book_id, models.Books.canon_book_name).where(models.Books.bible_id.in_(bible_ids))
+        ).all()
+        _upsert(
+            session,
+            models.Chapters,
+            [
+                {"book_id": book_id, "canon_book_name": book_name, "canon_book_chapter": chapter_num}
+                for book_id, book_name in books
+                for chapter_num, _ in chapters_by_book.get(book_name, ())
+            ],
+            ["book_id", "canon_book_chapter"],
+        )
+
+        crud.set_state(session, "seed", fingerprint)
         session.commit()
+    navigation.invalidate()
+    return True
 
 
 if __name__ == "__main__":
-    seed()
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    extra = [
+        {"bible_id": bible_id, "name": f"Bible {bible_id}", "language": "English"} for bible_id in range(2, count + 1)
+    ]
+    seed(DEFAULT_BIBLES + extra, force=True)
     print("Seed data inserted at", utc_now_iso())
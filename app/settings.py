@@ -1,12 +1,112 @@
 import secrets
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     database_url: str = "sqlite:///./app.db"
+    # Defaults to database_url with its async driver (aiosqlite / asyncpg).
+    async_database_url: Optional[str] = None
+    # Read-only endpoints (navigation, listing, analytics, search) use this replica when set.
+    read_database_url: Optional[str] = None
+    async_read_database_url: Optional[str] = None
+    # Connection pools are per engine and per process: N workers open up to N * (size + overflow).
+    # The default matches the 40-thread request threadpool, so sync endpoints never wait for a connection.
+    db_pool_size: int = 10
+    db_max_overflow: int = 30
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    # Applied to every new SQLite connection (see app/db.py).
+    sqlite_journal_mode: str = "wal"
+    sqlite_synchronous: str = "normal"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_kib: int = 64 * 1024
+    # Optional sharding (SQLite only, see app/db.py): each bible's recordings go to one of
+    # shard_count files under shard_dir. 0 keeps everything in database_url. May grow, never shrink.
+    shard_count: int = 0
+    shard_dir: str = "./shards"
     secret_key: str = secrets.token_urlsafe(32)
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 60 * 24
+    # Recording audio lives in a blob store, not in the database.
+    blob_backend: str = "local"  # "local" or "s3"
+    blob_root: str = "./blobs"
+    # A blob whose last recording was deleted is removed this long afterwards, if nothing uses it by then.
+    blob_release_grace_seconds: float = 3600.0
+    s3_bucket: Optional[str] = None
+    s3_prefix: str = "recordings/"
+    s3_endpoint_url: Optional[str] = None
+    # Uploads larger than this are rejected with 413.
+    max_upload_bytes: int = 512 * 1024 * 1024
+    # Threads reserved for copying uploads into the blob store, separate from the request threadpool.
+    upload_concurrency: int = 4
+    # Resumable uploads (see app/resumable.py) are staged here, on local disk, until committed.
+    upload_staging_dir: str = "./upload-staging"
+    # Uploads untouched for this long are deleted along with their staged bytes.
+    upload_expire_seconds: float = 24 * 3600
+    upload_lease_seconds: float = 600.0
+    # Per-user listen/manage grants are cached in-process (see app/permissions.py).
+    grant_cache_ttl_seconds: float = 30.0
+    grant_cache_size: int = 4096
+    # Validated bearer tokens are cached with a snapshot of their user, never past the token's expiry.
+    token_cache_ttl_seconds: float = 60.0
+    token_cache_size: int = 10000
+    # bcrypt work factor; stored hashes below it are upgraded at the next login.
+    bcrypt_rounds: int = 12
+    # Password hashing runs on its own pool (see app/passwords.py); beyond max_pending callers get a 503.
+    # Set password_hash_processes to False to hash on threads where spawning processes is not possible.
+    password_hash_workers: int = 2
+    password_hash_processes: bool = True
+    password_hash_max_pending: int = 32
+    # Background jobs (see app/jobs.py) run in a process pool inside each app process.
+    jobs_enabled: bool = True
+    job_workers: int = 2
+    job_poll_seconds: float = 1.0
+    job_lease_seconds: float = 600.0
+    job_max_attempts: int = 3
+    # Maintenance (see app/maintenance.py): every interval, tasks with outstanding rows are run as
+    # chains of low-priority batch jobs, pausing between batches.
+    maintenance_enabled: bool = True
+    maintenance_interval_seconds: float = 3600.0
+    maintenance_batch_size: int = 200
+    maintenance_pause_seconds: float = 2.0
+    # Uploads are transcoded to Opus renditions when ffmpeg is available.
+    ffmpeg_path: str = "ffmpeg"
+    ffprobe_path: str = "ffprobe"
+    default_rendition: str = "high"
+    # Pre-serialized books/chapters/versions responses (see app/navigation.py).
+    nav_cache_ttl_seconds: float = 300.0
+    nav_cache_size: int = 1024
+    # Batch passage lookups (see app/passages.py): rendered passages kept in an LRU,
+    # responses above passage_stream_verses stream as NDJSON, and larger requests are refused.
+    passage_cache_size: int = 4096
+    passage_stream_verses: int = 500
+    passage_max_verses: int = 40_000
+    # Verse alignment (see app/alignment.py): below this share of matched scripture words the
+    # transcript is ignored and verses are spread by their text length instead.
+    alignment_min_coverage: float = 0.3
+    # Columnar analytics (see app/columnar.py) reload the recording metrics after this long.
+    analytics_frame_ttl_seconds: float = 60.0
+    # Chapter/book playlists (see app/playlist.py).
+    segment_seconds: float = 6.0
+    segment_url_ttl_seconds: int = 6 * 3600
+    playlist_cache_ttl_seconds: float = 30.0
+    playlist_cache_size: int = 256
+    # A listener's replays of a recording's first segment within this window count as one play.
+    play_repeat_seconds: float = 600.0
+    # Play counts are buffered in memory and written in batches this often (see app/plays.py).
+    play_flush_seconds: float = 2.0
+    # Prometheus metrics at /metrics (see app/metrics.py); per process, unauthenticated.
+    metrics_enabled: bool = True
+    # Requests with an X-Profile header are stack-sampled into profile_dir (see app/profiling.py).
+    # If profile_token is set the header must carry it; profile_sample_rate profiles only a share of them.
+    profiling_enabled: bool = False
+    profile_token: Optional[str] = None
+    profile_sample_rate: float = 1.0
+    profile_interval_ms: float = 5.0
+    profile_dir: str = "./profiles"
 
 
 settings = Settings()
@@ -0,0 +1,92 @@
+import json
+import math
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class DDSketch:
+    """Mergeable quantile sketch with relative-error guarantees (DDSketch).
+
+    Positive values fall into logarithmic buckets ``ceil(log_gamma(x))``, so any
+    quantile is answered within ``relative_accuracy`` of the true value. Bucket
+    counts can be decremented, which lets the sketch follow deletions exactly.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.buckets.values())
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        return 2 * self.gamma**index / (self.gamma + 1)
+
+    def add(self, value: float, weight: int = 1):
+        """Add ``weight`` occurrences of ``value``; a negative weight removes them."""
+        if value <= 0:
+            self.zero_count = max(self.zero_count + weight, 0)
+            return
+        idx = self._index(value)
+        count = self.buckets.get(idx, 0) + weight
+        if count > 0:
+            self.buckets[idx] = count
+        else:
+            self.buckets.pop(idx, None)
+
+    def merge(self, other: "DDSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        self.zero_count += other.zero_count
+        for idx, count in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + count
+
+    def items(self) -> Iterator[Tuple[float, int]]:
+        """Yield ``(representative value, count)`` in ascending order."""
+        if self.zero_count:
+            yield 0.0, self.zero_count
+        for idx in sorted(self.buckets):
+            yield self._value(idx), self.buckets[idx]
+
+    def _value_at_rank(self, rank: int) -> Optional[float]:
+        seen = 0
+        for value, count in self.items():
+            seen += count
+            if seen > rank:
+                return value
+        return None
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Quantile with linear interpolation between neighbouring ranks."""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        lo = int(rank)
+        hi = min(lo + 1, total - 1)
+        low_value = self._value_at_rank(lo)
+        if hi == lo:
+            return low_value
+        return low_value * (hi - rank) + self._value_at_rank(hi) * (rank - lo)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"a": self.relative_accuracy, "z": self.zero_count, "b": {str(k): v for k, v in self.buckets.items()}},
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, raw: Optional[str]) -> "DDSketch":
+        if not raw:
+            return cls()
+        data = json.loads(raw)
+        sketch = cls(data.get("a", 0.01))
+        sketch.zero_count = data.get("z", 0)
+        sketch.buckets = {int(k): v for k, v in data.get("b", {}).items()}
+        return sketch
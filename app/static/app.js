@@ -119,9 +119,23 @@ async function loadChapters() {
   await fillTranscriptionFromSelection();
 }
 
+async function fetchAllRecordings(bibleId) {
+  const rows = [];
+  let cursor = null;
+  do {
+    const params = new URLSearchParams({ fields: 'summary', limit: '500' });
+    if (cursor) params.set('cursor', cursor);
+    const page = await apiGet(`${apiBase}/bibles/${bibleId}/recordings?${params}`);
+    if (!page) return null;
+    rows.push(...page.items);
+    cursor = page.next_cursor;
+  } while (cursor);
+  return rows;
+}
+
 async function loadRecordings() {
   const bibleId = bibleSelect.value;
-  const rows = await apiGet(`${apiBase}/bibles/${bibleId}/recordings`);
+  const rows = await fetchAllRecordings(bibleId);
   if (!rows) return;
   recordingsTable.innerHTML = '';
   rows.forEach(row => {
@@ -244,6 +258,7 @@ function updateVerseLimits() {
 }
 
 async function fetchAudio(id) {
+  playlistRun++;
   const res = await fetch(`${apiBase}/recordings/${id}/audio`, { headers: headers() });
   if (res.status === 401) return authFail();
   if (!res.ok) return;
@@ -253,6 +268,77 @@ async function fetchAudio(id) {
   document.getElementById('player').play();
 }
 
+// Continuous playback of a playlist: segments are appended to one MediaSource
+// in "sequence" mode so recordings follow each other without gaps.
+let playlistRun = 0;
+
+async function fetchSegment(url) {
+  const res = await fetch(url);
+  if (!res.ok) throw new Error('Segment failed');
+  return res.arrayBuffer();
+}
+
+function appendBuffer(sourceBuffer, data) {
+  return new Promise((resolve, reject) => {
+    sourceBuffer.addEventListener('updateend', resolve, { once: true });
+    sourceBuffer.addEventListener('error', reject, { once: true });
+    sourceBuffer.appendBuffer(data);
+  });
+}
+
+async function playSegmentsWithMediaSource(player, items, run) {
+  const mediaSource = new MediaSource();
+  player.src = URL.createObjectURL(mediaSource);
+  await new Promise(resolve => mediaSource.addEventListener('sourceopen', resolve, { once: true }));
+  const sourceBuffer = mediaSource.addSourceBuffer(items[0].mime);
+  sourceBuffer.mode = 'sequence';
+  let started = false;
+  for (const item of items) {
+    for (const segment of item.segments) {
+      if (run !== playlistRun) return;
+      await appendBuffer(sourceBuffer, await fetchSegment(segment.url));
+      if (!started) {
+        started = true;
+        player.play();
+      }
+    }
+  }
+  if (mediaSource.readyState === 'open') mediaSource.endOfStream();
+}
+
+async function playItemsInTurn(player, items, run) {
+  // Fallback: whole recordings one after another, fetching the next while one plays.
+  const load = item => Promise.all(item.segments.map(s => fetchSegment(s.url)))
+    .then(parts => URL.createObjectURL(new Blob(parts, { type: item.mime })));
+  let next = load(items[0]);
+  for (let i = 0; i < items.length; i++) {
+    const url = await next;
+    if (run !== playlistRun) return;
+    if (i + 1 < items.length) next = load(items[i + 1]);
+    player.src = url;
+    await player.play();
+    await new Promise(resolve => player.addEventListener('ended', resolve, { once: true }));
+  }
+}
+
+async function playPlaylist(params) {
+  const run = ++playlistRun;
+  const query = new URLSearchParams(params);
+  const manifest = await apiGet(`${apiBase}/bibles/${bibleSelect.value}/playlist?${query}`);
+  if (!manifest || !manifest.items.length) return;
+  const player = document.getElementById('player');
+  const mime = manifest.items[0].mime;
+  const sameMime = manifest.items.every(item => item.mime === mime);
+  if (window.MediaSource && sameMime && MediaSource.isTypeSupported(mime)) {
+    await playSegmentsWithMediaSource(player, manifest.items, run);
+  } else {
+    await playItemsInTurn(player, manifest.items, run);
+  }
+}
+
+document.getElementById('play-chapter').onclick = () => playPlaylist({ chapter_id: chapterSelect.value });
+document.getElementById('play-book').onclick = () => playPlaylist({ book_id: bookSelect.value });
+
 recordingsTable.onclick = async (e) => {
   if (e.target.tagName !== 'BUTTON') return;
   const id = e.target.getAttribute('data-id');
@@ -319,23 +405,76 @@ function stopRecording() {
   recordMsg.textContent = 'Recording stopped. Ready to upload.';
 }
 
+// Recordings above this size go up in chunks through /api/uploads, so a dropped
+// connection resumes from the server's offset instead of starting over.
+const RESUMABLE_THRESHOLD = 8 * 1024 * 1024;
+const UPLOAD_CHUNK = 4 * 1024 * 1024;
+
+async function uploadResumable(blob, meta) {
+  const jsonHeaders = { ...headers(), 'Content-Type': 'application/json' };
+  let res = await fetch(`${apiBase}/uploads`, {
+    method: 'POST',
+    headers: jsonHeaders,
+    body: JSON.stringify({ ...meta, file_mime: blob.type, size: blob.size })
+  });
+  if (!res.ok) return res;
+  const { upload_id: id } = await res.json();
+  let offset = 0, failures = 0;
+  while (offset < blob.size) {
+    try {
+      res = await fetch(`${apiBase}/uploads/${id}`, {
+        method: 'PATCH',
+        headers: { ...headers(), 'Upload-Offset': String(offset), 'Content-Type': 'application/offset+octet-stream' },
+        body: blob.slice(offset, offset + UPLOAD_CHUNK)
+      });
+    } catch (e) {
+      res = null;
+    }
+    if (res && res.ok) {
+      offset = Number(res.headers.get('Upload-Offset'));
+      failures = 0;
+      recordMsg.textContent = `Uploading... ${Math.round(100 * offset / blob.size)}%`;
+      continue;
+    }
+    if (res && res.status !== 409 && res.status < 500) return res;
+    if (++failures > 5) return res || new Response(null, { status: 503 });
+    await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+    const head = await fetch(`${apiBase}/uploads/${id}`, { method: 'HEAD', headers: headers() });
+    if (!head.ok) return head;
+    offset = Number(head.headers.get('Upload-Offset'));
+  }
+  return fetch(`${apiBase}/uploads/${id}/commit`, { method: 'POST', headers: headers() });
+}
+
 async function uploadRecording() {
   const blob = new Blob(chunks, { type: 'audio/webm' });
-  const form = new FormData();
-  form.append('bible_id', bibleSelect.value);
-  form.append('chapter_id', chapterSelect.value);
-  form.append('verse_index_start', document.getElementById('verse-start').value);
-  form.append('verse_index_end', document.getElementById('verse-end').value);
   const duration = lastDuration || (startTime ? Math.round((Date.now() - startTime) / 1000) : 0);
-  form.append('duration_seconds', duration || '');
-  form.append('transcription_text', document.getElementById('transcription').value);
-  form.append('file', blob, 'recording.webm');
+  const meta = {
+    chapter_id: Number(chapterSelect.value),
+    verse_index_start: Number(document.getElementById('verse-start').value),
+    verse_index_end: Number(document.getElementById('verse-end').value),
+    duration_seconds: duration || null,
+    transcription_text: document.getElementById('transcription').value
+  };
 
-  const res = await fetch(`${apiBase}/recordings`, {
-    method: 'POST',
-    headers: headers(),
-    body: form
-  });
+  let res;
+  if (blob.size > RESUMABLE_THRESHOLD) {
+    res = await uploadResumable(blob, meta);
+  } else {
+    const form = new FormData();
+    form.append('bible_id', bibleSelect.value);
+    form.append('chapter_id', meta.chapter_id);
+    form.append('verse_index_start', meta.verse_index_start);
+    form.append('verse_index_end', meta.verse_index_end);
+    form.append('duration_seconds', duration || '');
+    form.append('transcription_text', meta.transcription_text);
+    form.append('file', blob, 'recording.webm');
+    res = await fetch(`${apiBase}/recordings`, {
+      method: 'POST',
+      headers: headers(),
+      body: form
+    });
+  }
   if (res.status === 401) return authFail();
   if (!res.ok) {
     recordMsg.textContent = 'Upload failed';
@@ -0,0 +1,306 @@
+import abc
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import tempfile
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, Optional
+
+from sqlalchemy import inspect, text
+
+from . import metrics
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Called with a blob's key before it is written or reused (see crud.retain_blob).
+Retain = Optional[Callable[[str], None]]
+
+
+@dataclass(frozen=True)
+class BlobRef:
+    key: str
+    size: int
+    sha256: str
+    crc32: int
+
+
+class BlobStore(abc.ABC):
+    """Object store with an S3-style interface.
+
+    Keys are the SHA-256 hex digest of the content, so storing the same audio
+    twice only keeps one object. The ``retain`` callback of the store methods
+    runs once the key is known and before the object is written or found, so a
+    pending deletion of the same content can be cancelled first.
+    """
+
+    @abc.abstractmethod
+    def put_object(self, key: str, body: BinaryIO) -> None:
+        """Write ``body`` under ``key``."""
+
+    @abc.abstractmethod
+    def get_object(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield the bytes in ``[start, end)`` of the object in chunks."""
+
+    @abc.abstractmethod
+    def head_object(self, key: str) -> Optional[int]:
+        """Return the object size, or None if it does not exist."""
+
+    @abc.abstractmethod
+    def delete_object(self, key: str) -> None:
+        """Remove the object; a missing key is not an error."""
+
+    def store(self, fileobj: BinaryIO, retain: Retain = None) -> BlobRef:
+        digest = hashlib.sha256()
+        crc = 0
+        size = 0
+        with tempfile.TemporaryFile() as spool:
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                spool.write(chunk)
+            key = digest.hexdigest()
+            if retain is not None:
+                retain(key)
+            if self.head_object(key) is None:
+                spool.seek(0)
+                self.put_object(key, spool)
+        return BlobRef(key=key, size=size, sha256=key, crc32=crc)
+
+    def store_bytes(self, data: bytes, retain: Retain = None) -> BlobRef:
+        return self.store(io.BytesIO(data), retain)
+
+    def store_path(self, path: Path, retain: Retain = None) -> BlobRef:
+        """Store a finished local file, which is left in place."""
+        with open(path, "rb") as fh:
+            return self.store(fh, retain)
+
+    def crc32(self, key: str) -> int:
+        crc = 0
+        for chunk in self.get_object(key):
+            crc = zlib.crc32(chunk, crc)
+        return crc
+
+
+class LocalBlobStore(BlobStore):
+    """Content-addressed files under ``root/ab/cd/<sha256>``."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.tmp_dir = self.root / ".tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / key
+
+    def _commit(self, tmp_path: str, key: str) -> None:
+        final = self.path(key)
+        if final.exists():
+            os.unlink(tmp_path)
+            return
+        final.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, final)
+
+    def put_object(self, key: str, body: BinaryIO) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: body.read(CHUNK_SIZE), b""):
+                out.write(chunk)
+        self._commit(tmp_path, key)
+
+    def store(self, fileobj: BinaryIO, retain: Retain = None) -> BlobRef:
+        # Hash while writing straight into the store, then rename into place.
+        digest = hashlib.sha256()
+        crc = 0
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    crc = zlib.crc32(chunk, crc)
+                    size += len(chunk)
+                    out.write(chunk)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        key = digest.hexdigest()
+        try:
+            if retain is not None:
+                retain(key)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._commit(tmp_path, key)
+        return BlobRef(key=key, size=size, sha256=key, crc32=crc)
+
+    def store_path(self, path: Path, retain: Retain = None) -> BlobRef:
+        # Hash in place and hard-link into the store when it is on the same filesystem; no copy,
+        # and the file stays where it is until the caller removes it.
+        digest = hashlib.sha256()
+        crc = 0
+        size = 0
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+        key = digest.hexdigest()
+        if retain is not None:
+            retain(key)
+        if self.head_object(key) is None:
+            final = self.path(key)
+            final.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(path, final)
+            except FileExistsError:
+                pass
+            except OSError:
+                return super().store_path(path)
+        return BlobRef(key=key, size=size, sha256=key, crc32=crc)
+
+    @metrics.timed_generator("blob_read")
+    def get_object(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        with self.path(key).open("rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def head_object(self, key: str) -> Optional[int]:
+        try:
+            return self.path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def delete_object(self, key: str) -> None:
+        self.path(key).unlink(missing_ok=True)
+
+
+class S3BlobStore(BlobStore):
+    """Any S3-compatible service (AWS, MinIO, ...) via boto3."""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError as exc:
+                raise RuntimeError("The s3 blob backend requires boto3") from exc
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def put_object(self, key: str, body: BinaryIO) -> None:
+        self.client.upload_fileobj(body, self.bucket, self._key(key))
+
+    @metrics.timed_generator("blob_read")
+    def get_object(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        byte_range = f"bytes={start}-{'' if end is None else end - 1}"
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(key), Range=byte_range)
+        yield from response["Body"].iter_chunks(CHUNK_SIZE)
+
+    def head_object(self, key: str) -> Optional[int]:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except self.client.exceptions.ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return response["ContentLength"]
+
+    def delete_object(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+
+@lru_cache()
+def get_blob_store() -> BlobStore:
+    if settings.blob_backend == "local":
+        return LocalBlobStore(settings.blob_root)
+    if settings.blob_backend == "s3":
+        if not settings.s3_bucket:
+            raise RuntimeError("BLOB_BACKEND=s3 requires S3_BUCKET")
+        return S3BlobStore(settings.s3_bucket, settings.s3_prefix, settings.s3_endpoint_url)
+    raise RuntimeError(f"Unknown blob backend: {settings.blob_backend}")
+
+
+def migrate_legacy_blobs(engine, batch_size: int = 50) -> int:
+    """Move audio out of the old ``recordings.file`` column into the blob store.
+
+    Rows are copied one at a time so memory stays bounded, each batch is
+    committed, and the column is dropped once it is empty. Returns the number
+    of recordings moved.
+
+    Dropping the column needs SQLite 3.35 or another database with DROP COLUMN;
+    older SQLite keeps the emptied column. VACUUM only runs on SQLite.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns("recordings")}
+    if "file" not in columns:
+        return 0
+
+    store = get_blob_store()
+    moved = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            ids = conn.execute(
+                text(
+                    "SELECT recording_id FROM recordings WHERE blob_key IS NULL AND recording_id > :last "
+                    "ORDER BY recording_id LIMIT :limit"
+                ),
+                {"last": last_id, "limit": batch_size},
+            ).scalars().all()
+            if not ids:
+                break
+            for recording_id in ids:
+                content = conn.execute(
+                    text("SELECT file FROM recordings WHERE recording_id = :id"), {"id": recording_id}
+                ).scalar_one()
+                blob = store.store_bytes(content or b"")
+                conn.execute(
+                    text(
+                        "UPDATE recordings SET blob_key = :key, file_size = :size, file_sha256 = :sha, "
+                        "file_crc32 = :crc, file = :empty WHERE recording_id = :id"
+                    ),
+                    {
+                        "key": blob.key, "size": blob.size, "sha": blob.sha256, "crc": blob.crc32, "empty": b"",
+                        "id": recording_id,
+                    },
+                )
+                moved += 1
+            last_id = ids[-1]
+
+    sqlite = engine.dialect.name == "sqlite"
+    if sqlite and sqlite3.sqlite_version_info < (3, 35, 0):
+        logger.warning("SQLite %s cannot drop recordings.file; leaving the emptied column", sqlite3.sqlite_version)
+        return moved
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE recordings DROP COLUMN file")
+    if sqlite:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM")
+    return moved
+
+
+if __name__ == "__main__":
+    from .db import engine, init_db
+
+    init_db(migrate_blobs=False)
+    moved = migrate_legacy_blobs(engine)
+    print(f"Moved {moved} recordings into the {settings.blob_backend} blob store")
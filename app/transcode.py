@@ -0,0 +1,168 @@
+import logging
+import shutil
+import subprocess
+import tempfile
+import wave
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from . import alignment, analytics, columnar, crud, jobs, models, playlist
+from .db import shard_of
+from .settings import settings
+from .storage import get_blob_store
+
+logger = logging.getLogger(__name__)
+
+KIND = "transcode"
+RENDITION_MIME = "audio/webm"
+# Mono Opus bitrates in bits per second.
+RENDITIONS = {"low": 24_000, "medium": 48_000, "high": 96_000}
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(settings.ffmpeg_path) is not None
+
+
+def probe_duration(path: Path) -> Optional[float]:
+    """Duration in seconds via ffprobe, falling back to the wave module for WAV files."""
+    if shutil.which(settings.ffprobe_path):
+        result = subprocess.run(
+            [settings.ffprobe_path, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+            capture_output=True,
+            text=True,
+        )
+        try:
+            return float(result.stdout.strip())
+        except ValueError:
+            pass
+    try:
+        with wave.open(str(path), "rb") as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return None
+
+
+def fetch_blob(blob_key: str, path: Path):
+    with open(path, "wb") as fh:
+        for chunk in get_blob_store().get_object(blob_key):
+            fh.write(chunk)
+
+
+def transcode(payload: dict) -> dict:
+    """Job body, run in a worker process: probe the upload and encode each Opus rendition."""
+    store = get_blob_store()
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        fetch_blob(payload["blob_key"], source)
+        result = {"duration_seconds": probe_duration(source), "renditions": []}
+        if not ffmpeg_available():
+            return result
+        for quality, bitrate in RENDITIONS.items():
+            target = Path(tmp) / f"{quality}.webm"
+            subprocess.run(
+                [
+                    settings.ffmpeg_path, "-nostdin", "-v", "error", "-y", "-i", str(source),
+                    "-vn", "-ac", "1", "-c:a", "libopus", "-b:a", str(bitrate), "-f", "webm", str(target),
+                ],
+                check=True,
+                capture_output=True,
+            )
+            with open(target, "rb") as fh:
+                blob = store.store(fh, crud.retain_blob)
+            result["renditions"].append(
+                {"quality": quality, "bitrate": bitrate, "blob_key": blob.key, "size": blob.size, "sha256": blob.sha256}
+            )
+    return result
+
+
+def refresh_metrics(
+    session: Session,
+    recording: models.Recordings,
+    book: models.Books,
+    duration: Optional[float],
+    word_count: Optional[int] = None,
+):
+    """Set the duration, re-derive word count and WPM, and move the recording's share of the aggregates."""
+    scopes = analytics.scopes_for(book.bible_id, book.book_id, recording.chapter_id)
+    analytics.apply_recording(session, recording, scopes, sign=-1)
+    recording.duration_seconds = duration
+    if word_count is None and recording.transcription_text:
+        word_count = crud.word_count(recording.transcription_text)
+    recording.word_count = word_count
+    recording.wpm = recording.word_count / duration * 60 if recording.word_count and duration and duration > 0 else None
+    analytics.apply_recording(session, recording, scopes)
+
+
+def finish(session: Session, payload: dict, result: dict):
+    recording = session.get(models.Recordings, payload["recording_id"])
+    made = [rendition["blob_key"] for rendition in result["renditions"]]
+    if recording is None or recording.blob_key != payload["blob_key"]:
+        # Deleted or replaced while the job ran.
+        for blob_key in made:
+            crud.release_blob(session, blob_key)
+        return
+    chapter = session.get(models.Chapters, recording.chapter_id)
+    book = session.get(models.Books, chapter.book_id)
+    if result["duration_seconds"]:
+        refresh_metrics(session, recording, book, result["duration_seconds"])
+    old = session.exec(
+        select(models.Renditions.blob_key).where(models.Renditions.recording_id == recording.recording_id)
+    ).all()
+    session.exec(delete(models.Renditions).where(models.Renditions.recording_id == recording.recording_id))
+    for rendition in result["renditions"]:
+        session.add(
+            models.Renditions(
+                recording_id=recording.recording_id,
+                quality=rendition["quality"],
+                mime=RENDITION_MIME,
+                bitrate=rendition["bitrate"],
+                blob_key=rendition["blob_key"],
+                file_size=rendition["size"],
+                file_sha256=rendition["sha256"],
+            )
+        )
+    session.add(recording)
+    session.flush()
+    for blob_key in set(old) - set(made):
+        crud.release_blob(session, blob_key)
+    playlist.invalidate(session, book.bible_id)
+    columnar.invalidate()
+    # Verse offsets are worked out against the probed duration.
+    alignment.enqueue(session, recording)
+    if not result["renditions"]:
+        logger.info("ffmpeg not found; recording %s is served in its original format", recording.recording_id)
+
+
+def enqueue(session: Session, recording: models.Recordings) -> models.Jobs:
+    return jobs.enqueue(
+        session,
+        KIND,
+        {
+            "recording_id": recording.recording_id,
+            "blob_key": recording.blob_key,
+            "shard": shard_of(recording.recording_id),
+        },
+    )
+
+
+def pick_rendition(
+    renditions: dict[str, models.Renditions], quality: Optional[str], accept: str, save_data: bool
+) -> Optional[models.Renditions]:
+    """Choose which rendition to serve; None means the original upload.
+
+    An explicit ``quality`` wins. Otherwise ``Save-Data`` asks for the smallest
+    rendition, and clients whose ``Accept`` header rules out WebM/Opus get the
+    original.
+    """
+    if quality:
+        return renditions.get(quality)
+    accepted = {part.split(";", 1)[0].strip().lower() for part in accept.split(",")} if accept else {"*/*"}
+    if not accepted & {RENDITION_MIME, "audio/*", "*/*"}:
+        return None
+    return renditions.get("low" if save_data else settings.default_rendition)
+
+
+jobs.register(KIND, transcode, finish)
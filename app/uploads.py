@@ -0,0 +1,99 @@
+from typing import BinaryIO
+
+import anyio
+from fastapi import HTTPException, UploadFile
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import crud, metrics
+from .settings import settings
+from .storage import BlobRef, get_blob_store
+
+# Blob-store copies run on their own threads so large uploads cannot take
+# every slot of the shared threadpool that serves sync endpoints.
+upload_limiter = anyio.CapacityLimiter(settings.upload_concurrency)
+metrics.register_limiter("uploads", upload_limiter)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class LimitedReader:
+    """File wrapper that raises UploadTooLarge once more than ``limit`` bytes are read."""
+
+    def __init__(self, fileobj: BinaryIO, limit: int):
+        self.fileobj = fileobj
+        self.limit = limit
+        self.consumed = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.fileobj.read(size)
+        self.consumed += len(chunk)
+        if self.consumed > self.limit:
+            raise UploadTooLarge()
+        return chunk
+
+
+class UploadSizeLimitMiddleware:
+    """Reject request bodies larger than the upload limit with 413.
+
+    A declared Content-Length over the limit is refused before anything is
+    read. Chunked bodies (or a Content-Length that undercounts) are counted as
+    they arrive, and reading stops with 413 as soon as the total passes the
+    limit, before the multipart parser has spooled the rest to disk.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                await _reject(send)
+                return
+        received = 0
+        started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI turns this into the 413 response wherever the body is being read.
+                    raise HTTPException(status_code=413, detail="Upload too large")
+            return message
+
+        async def tracked_send(message: Message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as exc:
+            if exc.status_code != 413 or started:
+                raise
+            await _reject(send)
+
+
+async def _reject(send: Send):
+    await send({"type": "http.response.start", "status": 413, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b'{"detail":"Upload too large"}'})
+
+
+async def store_upload(file: UploadFile) -> BlobRef:
+    """Copy an upload into the blob store in chunks, enforcing the size limit."""
+    if not await file.read(1):
+        raise HTTPException(status_code=400, detail="Empty file")
+    await file.seek(0)
+    reader = LimitedReader(file.file, settings.max_upload_bytes)
+    try:
+        return await anyio.to_thread.run_sync(get_blob_store().store, reader, crud.retain_blob, limiter=upload_limiter)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Upload too large")
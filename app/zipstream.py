@@ -0,0 +1,269 @@
+import hashlib
+import struct
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional
+
+ZIP64_LIMIT = 0xFFFFFFFF
+# Deflate can grow incompressible input slightly; switch to zip64 well before 4 GiB.
+DEFLATE_ZIP64_THRESHOLD = 0xF0000000
+UTF8_FLAG = 0x0800
+DESCRIPTOR_FLAG = 0x0008
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+MADE_BY_UNIX = 3 << 8
+EXTERNAL_ATTR = 0o100644 << 16
+
+# Media types that are already compressed; deflating them only burns CPU.
+COMPRESSED_MIME_TYPES = {
+    "audio/webm",
+    "audio/ogg",
+    "audio/opus",
+    "audio/mpeg",
+    "audio/mp3",
+    "audio/mp4",
+    "audio/aac",
+    "audio/x-m4a",
+}
+
+
+@dataclass
+class ZipEntry:
+    name: str
+    size: int
+    read: Callable[[int, int], Iterator[bytes]]
+    mtime: datetime
+    compress: bool = False
+    crc32: Optional[int] = None
+    fingerprint: str = ""
+
+
+@dataclass
+class _Written:
+    entry: ZipEntry
+    offset: int
+    method: int
+    flags: int
+    crc32: int
+    compressed_size: int
+    zip64: bool
+
+
+def should_compress(mime: Optional[str]) -> bool:
+    base = (mime or "").split(";", 1)[0].strip().lower()
+    return bool(base) and base not in COMPRESSED_MIME_TYPES
+
+
+def _dos_datetime(value: datetime) -> tuple[int, int]:
+    year = min(max(value.year, 1980), 2107)
+    date = ((year - 1980) << 9) | (value.month << 5) | value.day
+    time = (value.hour << 11) | (value.minute << 5) | (value.second // 2)
+    return time, date
+
+
+def _local_header(entry: ZipEntry, method: int, flags: int, crc: int, csize: int, zip64: bool) -> bytes:
+    name = entry.name.encode("utf-8")
+    time, date = _dos_datetime(entry.mtime)
+    extra = b""
+    usize = entry.size
+    if zip64:
+        if flags & DESCRIPTOR_FLAG:
+            usize_field, csize_field = 0, 0
+        else:
+            usize_field, csize_field = usize, csize
+        extra = struct.pack("<HHQQ", 0x0001, 16, usize_field, csize_field)
+        usize = csize = ZIP64_LIMIT
+    elif flags & DESCRIPTOR_FLAG:
+        usize = csize = 0
+    return (
+        struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50,
+            VERSION_ZIP64 if zip64 else VERSION_DEFAULT,
+            flags,
+            method,
+            time,
+            date,
+            crc,
+            csize,
+            usize,
+            len(name),
+            len(extra),
+        )
+        + name
+        + extra
+    )
+
+
+def _central_record(item: _Written) -> bytes:
+    entry = item.entry
+    name = entry.name.encode("utf-8")
+    time, date = _dos_datetime(entry.mtime)
+    fields = []
+    usize, csize, offset = entry.size, item.compressed_size, item.offset
+    if usize >= ZIP64_LIMIT or item.zip64:
+        fields.append(usize)
+        usize = ZIP64_LIMIT
+    if csize >= ZIP64_LIMIT or item.zip64:
+        fields.append(csize)
+        csize = ZIP64_LIMIT
+    if offset >= ZIP64_LIMIT:
+        fields.append(offset)
+        offset = ZIP64_LIMIT
+    extra = struct.pack(f"<HH{len(fields)}Q", 0x0001, 8 * len(fields), *fields) if fields else b""
+    version = VERSION_ZIP64 if fields else VERSION_DEFAULT
+    return (
+        struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            0x02014B50,
+            MADE_BY_UNIX | version,
+            version,
+            item.flags,
+            item.method,
+            time,
+            date,
+            item.crc32,
+            csize,
+            usize,
+            len(name),
+            len(extra),
+            0,
+            0,
+            0,
+            EXTERNAL_ATTR,
+            offset,
+        )
+        + name
+        + extra
+    )
+
+
+def _end_records(count: int, cd_offset: int, cd_size: int) -> bytes:
+    out = b""
+    if count >= 0xFFFF or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+        eocd64_offset = cd_offset + cd_size
+        out += struct.pack(
+            "<IQHHIIQQQQ",
+            0x06064B50,
+            44,
+            MADE_BY_UNIX | VERSION_ZIP64,
+            VERSION_ZIP64,
+            0,
+            0,
+            count,
+            count,
+            cd_size,
+            cd_offset,
+        )
+        out += struct.pack("<IIQI", 0x07064B50, 0, eocd64_offset, 1)
+        count = min(count, 0xFFFF)
+        cd_offset = min(cd_offset, ZIP64_LIMIT)
+        cd_size = min(cd_size, ZIP64_LIMIT)
+    out += struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count, cd_size, cd_offset, 0)
+    return out
+
+
+class ZipStream:
+    """Zip archive generated on the fly from entries whose bytes are read lazily.
+
+    Only entry metadata is kept in memory. When every entry is stored
+    (uncompressed) with a known CRC the whole layout is fixed up front, so
+    ``size`` is known and ``read`` can serve arbitrary byte ranges; otherwise
+    the archive can only be produced front to back with ``stream``.
+    """
+
+    def __init__(self, entries: List[ZipEntry]):
+        self.entries = entries
+        self.seekable = all(not e.compress and e.crc32 is not None for e in entries)
+        self._layout: List[tuple[int, bytes, _Written]] = []
+        self._central: Optional[bytes] = None
+        self.size: Optional[int] = None
+        if self.seekable:
+            self._plan()
+
+    @property
+    def etag(self) -> str:
+        digest = hashlib.sha256()
+        for e in self.entries:
+            digest.update(f"{e.name}\0{e.fingerprint}\0{e.size}\0{e.mtime.isoformat()}\n".encode("utf-8"))
+        return f'"{digest.hexdigest()}"'
+
+    def _plan(self):
+        offset = 0
+        written = []
+        for entry in self.entries:
+            zip64 = entry.size >= ZIP64_LIMIT
+            item = _Written(entry, offset, 0, UTF8_FLAG, entry.crc32, entry.size, zip64)
+            header = _local_header(entry, 0, UTF8_FLAG, entry.crc32, entry.size, zip64)
+            self._layout.append((offset, header, item))
+            written.append(item)
+            offset += len(header) + entry.size
+        central = b"".join(_central_record(item) for item in written)
+        self._central = central + _end_records(len(written), offset, len(central))
+        self._central_offset = offset
+        self.size = offset + len(self._central)
+
+    def read(self, start: int, end: int) -> Iterator[bytes]:
+        """Yield archive bytes ``[start, end)``; only valid for seekable archives."""
+        for offset, header, item in self._layout:
+            data_start = offset + len(header)
+            data_end = data_start + item.entry.size
+            if data_end <= start:
+                continue
+            if offset >= end:
+                return
+            if start < data_start:
+                yield header[max(start - offset, 0) : min(end, data_start) - offset]
+            lo, hi = max(start, data_start), min(end, data_end)
+            if lo < hi:
+                yield from item.entry.read(lo - data_start, hi - data_start)
+        if end > self._central_offset:
+            yield self._central[max(start - self._central_offset, 0) : end - self._central_offset]
+
+    def stream(self) -> Iterator[bytes]:
+        if self.seekable:
+            yield from self.read(0, self.size)
+            return
+        offset = 0
+        written = []
+        for entry in self.entries:
+            if not entry.compress and entry.crc32 is not None:
+                zip64 = entry.size >= ZIP64_LIMIT
+                header = _local_header(entry, 0, UTF8_FLAG, entry.crc32, entry.size, zip64)
+                yield header
+                yield from entry.read(0, entry.size)
+                written.append(_Written(entry, offset, 0, UTF8_FLAG, entry.crc32, entry.size, zip64))
+                offset += len(header) + entry.size
+                continue
+
+            method = 8 if entry.compress else 0
+            flags = UTF8_FLAG | DESCRIPTOR_FLAG
+            zip64 = entry.size >= DEFLATE_ZIP64_THRESHOLD
+            header = _local_header(entry, method, flags, 0, 0, zip64)
+            yield header
+            crc = 0
+            csize = 0
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if method else None
+            for chunk in entry.read(0, entry.size):
+                crc = zlib.crc32(chunk, crc)
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                csize += len(chunk)
+                if chunk:
+                    yield chunk
+            if compressor:
+                tail = compressor.flush()
+                csize += len(tail)
+                yield tail
+            if zip64:
+                descriptor = struct.pack("<IIQQ", 0x08074B50, crc, csize, entry.size)
+            else:
+                descriptor = struct.pack("<IIII", 0x08074B50, crc, csize, entry.size)
+            yield descriptor
+            written.append(_Written(entry, offset, method, flags, crc, csize, zip64))
+            offset += len(header) + csize + len(descriptor)
+
+        central = b"".join(_central_record(item) for item in written)
+        yield central
+        yield _end_records(len(written), offset, len(central))
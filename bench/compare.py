@@ -0,0 +1,68 @@
+"""Compare two bench.run result files and flag regressions.
+
+    python -m bench.compare base.json head.json --threshold 0.15
+
+Exits with status 1 when a watched route's p95/p99 latency grows, or its
+throughput drops, by more than the threshold.
+"""
+import argparse
+import json
+import sys
+from typing import Optional
+
+WATCHED_ROUTES = ["list_recordings", "bible_analytics", "download_zip", "stream_audio"]
+LATENCY_KEYS = ["p50_ms", "p95_ms", "p99_ms"]
+GATED_KEYS = ["p95_ms", "p99_ms"]
+
+
+def _change(base: Optional[float], head: Optional[float]) -> Optional[float]:
+    if not base or head is None:
+        return None
+    return (head - base) / base
+
+
+def compare(base: dict, head: dict, threshold: float, watched: list[str]) -> tuple[list[str], list[str]]:
+    """Return (report lines, regressions)."""
+    lines = [f"{'route':<18}" + "".join(f"{key:>22}" for key in LATENCY_KEYS + ["throughput_rps"])]
+    regressions = []
+    for name in sorted(set(base["routes"]) & set(head["routes"])):
+        old, new = base["routes"][name], head["routes"][name]
+        cells = []
+        for key in LATENCY_KEYS + ["throughput_rps"]:
+            change = _change(old.get(key), new.get(key))
+            cells.append(f"{new.get(key) or 0:>12.1f} ({change:+.0%})" if change is not None else f"{'-':>22}")
+            if name not in watched or change is None:
+                continue
+            if key in GATED_KEYS and change > threshold:
+                regressions.append(f"{name} {key} {old[key]:.1f} -> {new[key]:.1f} ({change:+.0%})")
+            if key == "throughput_rps" and change < -threshold:
+                regressions.append(f"{name} throughput {old[key]:.1f} -> {new[key]:.1f} rps ({change:+.0%})")
+        if new.get("errors", 0) > old.get("errors", 0) and name in watched:
+            regressions.append(f"{name} errors {old.get('errors', 0)} -> {new['errors']}")
+        lines.append(f"{name:<18}" + "".join(f"{cell:>22}" for cell in cells))
+    return lines, regressions
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative change (default 0.15)")
+    parser.add_argument("--routes", nargs="*", default=WATCHED_ROUTES, help="routes that gate the exit status")
+    args = parser.parse_args(argv)
+
+    with open(args.base) as fh:
+        base = json.load(fh)
+    with open(args.head) as fh:
+        head = json.load(fh)
+    lines, regressions = compare(base, head, args.threshold, args.routes)
+    print(f"base {base['meta'].get('commit')}  head {head['meta'].get('commit')}")
+    print("\n".join(lines))
+    print(f"peak RSS {base.get('peak_rss_mb', 0):.0f} MB -> {head.get('peak_rss_mb', 0):.0f} MB")
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
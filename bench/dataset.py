@@ -0,0 +1,147 @@
+"""Synthetic dataset for benchmarks.
+
+Builds on ``seed()`` and adds users with grants, extra bibles and recordings
+whose audio sizes and transcripts resemble real uploads. Import this only
+after ``DATABASE_URL``/``BLOB_ROOT`` point at a scratch location.
+"""
+import random
+from dataclasses import asdict, dataclass
+
+from sqlmodel import Session, select
+
+from app import alignment, analytics, auth, models, scripture, search
+from app.db import engine, init_db
+from app.models import utc_now_iso
+from app.seed import seed
+from app.storage import get_blob_store
+
+BENCH_PASSWORD = "bench-password"
+
+# Bytes per second of audio for what MediaRecorder typically produces.
+AUDIO_FORMATS = {
+    "audio/webm": 4_000,  # Opus at ~32 kbit/s
+    "audio/wav": 32_000,  # 16 kHz, 16-bit mono PCM
+}
+
+
+@dataclass
+class DatasetSpec:
+    users: int = 20
+    bibles: int = 2
+    recordings: int = 500
+    min_seconds: float = 15.0
+    max_seconds: float = 120.0
+    wav_fraction: float = 0.1
+    seed: int = 505
+
+
+def _transcript(book: str, chapter: int, start: int, end: int, version: str) -> str:
+    text = scripture.get_passage_text(book, chapter, start, end, version)
+    return " ".join(word for word in text.split() if not word.isdigit())
+
+
+def build(spec: DatasetSpec) -> dict:
+    """Create the dataset and return ids/tokens the load generator needs."""
+    rng = random.Random(spec.seed)
+    init_db()
+    seed([{"bible_id": i, "name": f"Bench Bible {i}", "language": "English"} for i in range(1, spec.bibles + 1)])
+    version = (scripture.get_versions() or ["KJV"])[0]
+    password = auth.get_password_hash(BENCH_PASSWORD)
+    store = get_blob_store()
+
+    with Session(engine) as session:
+        bible_ids = list(range(1, spec.bibles + 1))
+
+        users = []
+        for i in range(spec.users):
+            user = models.Users(
+                username=f"bench{i}", name=f"Bench {i}", email=f"bench{i}@example.com", password=password
+            )
+            session.add(user)
+            session.flush()
+            grant = models.Auths(user_id=user.user_id)
+            session.add(grant)
+            session.flush()
+            managed = bible_ids[i % len(bible_ids)]
+            session.add(models.ManageAuths(auth_id=grant.auth_id, bible_id=managed))
+            for bible_id in bible_ids:
+                session.add(models.ListenAuths(auth_id=grant.auth_id, bible_id=bible_id))
+            users.append((user.user_id, user.username, managed))
+
+        chapters = session.exec(
+            select(
+                models.Chapters.chapter_id,
+                models.Chapters.canon_book_name,
+                models.Chapters.canon_book_chapter,
+                models.Books.bible_id,
+            ).join(models.Books, models.Books.book_id == models.Chapters.book_id)
+        ).all()
+        by_bible = {}
+        for row in chapters:
+            by_bible.setdefault(row.bible_id, []).append(row)
+
+        audio_bytes = 0
+        for _ in range(spec.recordings):
+            user_id, _, bible_id = rng.choice(users)
+            chapter = rng.choice(by_bible[bible_id])
+            verse_count = scripture.get_chapter_count(chapter.canon_book_name, chapter.canon_book_chapter) or 1
+            start = rng.randint(1, verse_count)
+            end = min(verse_count, start + rng.randint(0, 5))
+            mime = "audio/wav" if rng.random() < spec.wav_fraction else "audio/webm"
+            duration = rng.uniform(spec.min_seconds, spec.max_seconds)
+            blob = store.store_bytes(rng.randbytes(int(duration * AUDIO_FORMATS[mime])))
+            audio_bytes += blob.size
+            text = _transcript(chapter.canon_book_name, chapter.canon_book_chapter, start, end, version) or None
+            word_count = len(text.split()) if text else None
+            recording = models.Recordings(
+                user_id=user_id,
+                chapter_id=chapter.chapter_id,
+                date_recorded=utc_now_iso(),
+                verse_index_start=start,
+                verse_index_end=end,
+                blob_key=blob.key,
+                file_size=blob.size,
+                file_sha256=blob.sha256,
+                file_crc32=blob.crc32,
+                file_mime=mime,
+                duration_seconds=duration,
+                transcription_text=text,
+                word_count=word_count,
+                wpm=word_count / duration * 60 if word_count else None,
+                accessed_count=rng.randint(0, 50),
+            )
+            session.add(recording)
+            session.flush()
+            # Worker jobs never run under the benchmark, so align in place as the align job would.
+            payload = {
+                "recording_id": recording.recording_id,
+                "fingerprint": alignment.fingerprint(recording),
+                "book": chapter.canon_book_name,
+                "chapter": chapter.canon_book_chapter,
+                "start": start,
+                "end": end,
+                "version": version,
+                "text": text,
+                "duration": duration,
+            }
+            alignment.finish(session, payload, alignment.run(payload))
+        session.commit()
+
+        analytics.rebuild(session)
+        if search.available(engine):
+            search.index_scripture(session)
+            search.index_transcripts(session, force=True)
+
+        return {
+            "spec": asdict(spec),
+            "audio_bytes": audio_bytes,
+            "users": [
+                {
+                    "user_id": user_id,
+                    "username": username,
+                    "bible_id": bible_id,
+                    "token": auth.create_access_token({"sub": str(user_id)}),
+                }
+                for user_id, username, bible_id in users
+            ],
+        }
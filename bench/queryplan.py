@@ -0,0 +1,166 @@
+"""Check that the queries behind every /api route use indexes.
+
+    python -m bench.queryplan --recordings 5000
+
+Seeds a scratch database, drives each route of ``bench.run`` a few times
+while recording every SQL statement the app issues, then runs ``EXPLAIN
+QUERY PLAN`` on each distinct statement. Exits with status 1 when a
+statement scans a whole table that grows with usage (anything not in
+``SMALL_TABLES``), unless it is one of the deliberate whole-table reads in
+``FULL_READS``. SQLite only.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Bounded by the canon or by configuration; scanning them is cheap at any scale.
+SMALL_TABLES = {"bibles", "canonbooks", "canonchapters", "appstate", "schemamigrations"}
+# Statements that read a whole table on purpose, matched against the SQL with whitespace collapsed.
+FULL_READS = [
+    # columnar.load: the in-memory analytics frame, rebuilt at most once per ANALYTICS_FRAME_TTL_SECONDS.
+    re.compile(r"^SELECT recordings\.recording_id, books\.bible_id, .* ORDER BY recordings\.recording_id$"),
+    # maintenance.status: job counts by kind and status for GET /api/maintenance.
+    re.compile(r"^SELECT jobs\.kind, jobs\.status, count\(\*\) AS count_1 FROM jobs GROUP BY"),
+    # resumable.collect_garbage: in-flight upload ids to match staging files against, every few minutes.
+    re.compile(r"^SELECT uploads\.upload_id FROM uploads$"),
+]
+# "SCAN t" and "SCAN t USING [COVERING] INDEX ..." both visit every row; "SEARCH t ..." does not.
+# FTS lookups show up as "SCAN f VIRTUAL TABLE INDEX ..." and are fine.
+_TABLE_SCAN = re.compile(r"^SCAN (\w+)(?!\w| VIRTUAL TABLE)")
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+
+@dataclass
+class Statement:
+    sql: str
+    params: tuple
+    routes: set = field(default_factory=set)
+    plan: list[str] = field(default_factory=list)
+    scans: list[str] = field(default_factory=list)
+
+
+class Recorder:
+    """Collects distinct statements per route through SQLAlchemy cursor events."""
+
+    def __init__(self):
+        self.route: Optional[str] = None
+        self.statements: dict[str, Statement] = {}
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.route is None or not statement.lstrip().upper().startswith(_EXPLAINABLE):
+            return
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        entry = self.statements.setdefault(statement, Statement(statement, tuple(parameters or ())))
+        entry.routes.add(self.route)
+
+
+def explain(engine, statements: list[Statement]):
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for entry in statements:
+            # The detail column of each plan row, e.g. "SEARCH recordings USING INDEX ...".
+            entry.plan = [row[3] for row in cursor.execute("EXPLAIN QUERY PLAN " + entry.sql, entry.params)]
+            entry.scans = [
+                match.group(1)
+                for match in map(_TABLE_SCAN.match, entry.plan)
+                if match and match.group(1).lower() not in SMALL_TABLES
+            ]
+    finally:
+        raw.close()
+    for entry in statements:
+        sql = " ".join(entry.sql.split())
+        if any(pattern.match(sql) for pattern in FULL_READS):
+            entry.scans = []
+
+
+async def record(routes: list[str], users: list[dict], requests: int, seed: int) -> Recorder:
+    from sqlalchemy import event
+
+    from app import db
+
+    from .run import ROUTES, Context, _client, discover, run_route
+
+    recorder = Recorder()
+    engines = {db.engine, db.read_engine, db.async_engine.sync_engine, db.async_read_engine.sync_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", recorder)
+    rng = random.Random(seed)
+    ctx = Context(users)
+    async with _client(None) as client:
+        await discover(client, ctx)
+        for route in ROUTES:
+            if routes and route.name not in routes:
+                continue
+            recorder.route = route.name
+            # One at a time, so every statement is attributed to the route that issued it.
+            await run_route(client, ctx, route, max(1, int(requests / route.share)), 1, rng)
+            recorder.route = None
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", recorder)
+    return recorder
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", help="where app.db and blobs go (default: a new temp dir)")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--bibles", type=int, default=4)
+    parser.add_argument("--recordings", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=3, help="requests per route")
+    parser.add_argument("--routes", nargs="*", help="only check these routes")
+    parser.add_argument("--seed", type=int, default=505)
+    parser.add_argument("--json", action="store_true", help="print every statement and its plan as JSON")
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="pab-queryplan-")
+    os.makedirs(data_dir, exist_ok=True)
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(data_dir, 'app.db')}")
+    os.environ.setdefault("BLOB_ROOT", os.path.join(data_dir, "blobs"))
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+    from app.db import engine
+
+    from . import dataset
+
+    if engine.dialect.name != "sqlite":
+        parser.error("EXPLAIN QUERY PLAN checks need a SQLite DATABASE_URL")
+    spec = dataset.DatasetSpec(
+        users=args.users, bibles=args.bibles, recordings=args.recordings, min_seconds=1, max_seconds=3, seed=args.seed
+    )
+    data = dataset.build(spec)
+    recorder = asyncio.run(record(args.routes, data["users"], args.requests, args.seed))
+    statements = list(recorder.statements.values())
+    explain(engine, statements)
+
+    offenders = [entry for entry in statements if entry.scans]
+    if args.json:
+        print(json.dumps(
+            [
+                {"routes": sorted(entry.routes), "sql": entry.sql, "plan": entry.plan, "scans": entry.scans}
+                for entry in statements
+            ],
+            indent=2,
+        ))
+    else:
+        print(f"{len(statements)} distinct statements from {len({r for e in statements for r in e.routes})} routes")
+        for entry in offenders:
+            print(f"\nTABLE SCAN of {', '.join(entry.scans)} in {', '.join(sorted(entry.routes))}:")
+            print("  " + " ".join(entry.sql.split()))
+            for line in entry.plan:
+                print("    " + line)
+    if offenders:
+        print(f"{len(offenders)} statements scan a large table", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,523 @@
+"""Drive every /api route and report latency percentiles, throughput and peak RSS.
+
+    python -m bench.run --recordings 500 --requests 200 --workers 8 --out results.json
+
+By default a scratch database and blob store are created in a temp directory
+and requests go through an in-process ASGI transport. ``--processes`` runs
+that many load generators in parallel (each with its own in-process app on
+the shared database). ``--url`` targets a running server instead; start it
+with the same DATABASE_URL, BLOB_ROOT and SECRET_KEY as the benchmark.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+# Resumable uploads in the benchmark are two chunks of this size.
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+@dataclass
+class Route:
+    name: str
+    op: Callable[..., Awaitable]
+    # Fraction of --requests issued against this route; keeps slow routes
+    # (bcrypt, whole-bible zips) from dominating the run.
+    share: float = 1.0
+
+
+class Context:
+    def __init__(self, users: list[dict]):
+        self.users = users
+        self.books: dict[int, list[int]] = {}
+        self.chapters: dict[int, list[dict]] = {}
+        self.recordings: dict[int, list[int]] = {}
+        self.created: list[tuple[dict, int]] = []
+        # Resumable uploads: still receiving chunks, and complete but not yet committed.
+        self.uploads: list[dict] = []
+        self.complete_uploads: list[dict] = []
+        self.segments: dict[int, list[str]] = {}
+        self.counter = 0
+
+    def user(self, rng: random.Random) -> tuple[dict, dict]:
+        user = rng.choice(self.users)
+        return user, {"Authorization": f"Bearer {user['token']}"}
+
+
+async def discover(client, ctx: Context):
+    """Collect ids for each bible through the API itself."""
+    for bible_id in sorted({user["bible_id"] for user in ctx.users}):
+        headers = {"Authorization": f"Bearer {next(u for u in ctx.users if u['bible_id'] == bible_id)['token']}"}
+        books = (await client.get(f"/api/bibles/{bible_id}/books", headers=headers)).json()
+        ctx.books[bible_id] = [row["Books"]["book_id"] for row in books]
+        ctx.chapters[bible_id] = []
+        for book_id in ctx.books[bible_id]:
+            for row in (await client.get(f"/api/books/{book_id}/chapters", headers=headers)).json():
+                ctx.chapters[bible_id].append({**row["Chapters"], "verse_count": row["CanonChapters"]["verse_count"]})
+        ids, cursor = [], None
+        while True:
+            params = {"fields": "summary", "limit": 500, **({"cursor": cursor} if cursor else {})}
+            page = (await client.get(f"/api/bibles/{bible_id}/recordings", params=params, headers=headers)).json()
+            ids.extend(item["recording_id"] for item in page["items"])
+            cursor = page.get("next_cursor")
+            if not cursor:
+                break
+        ctx.recordings[bible_id] = ids
+        playlist = (await client.get(f"/api/bibles/{bible_id}/playlist", headers=headers)).json()
+        ctx.segments[bible_id] = [seg["url"] for item in playlist["items"] for seg in item["segments"]]
+
+
+async def op_register(client, ctx, rng):
+    ctx.counter += 1
+    name = f"load{os.getpid()}_{ctx.counter}_{rng.randrange(1 << 30)}"
+    payload = {"username": name, "name": name, "email": f"{name}@example.com", "password": "bench-password"}
+    return await client.post("/api/register", json=payload)
+
+
+async def op_login(client, ctx, rng):
+    payload = {"username_or_email": rng.choice(ctx.users)["username"], "password": "bench-password"}
+    return await client.post("/api/login", json=payload)
+
+
+async def op_bibles(client, ctx, rng):
+    _, headers = ctx.user(rng)
+    return await client.get("/api/bibles", headers=headers)
+
+
+async def op_books(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    return await client.get(f"/api/bibles/{user['bible_id']}/books", headers=headers)
+
+
+async def op_chapters(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    return await client.get(f"/api/books/{rng.choice(ctx.books[user['bible_id']])}/chapters", headers=headers)
+
+
+async def op_versions(client, ctx, rng):
+    _, headers = ctx.user(rng)
+    return await client.get("/api/versions", headers=headers)
+
+
+async def op_verses(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    chapter = rng.choice(ctx.chapters[user["bible_id"]])
+    start = rng.randint(1, chapter["verse_count"])
+    params = {
+        "book": chapter["canon_book_name"],
+        "chapter": chapter["canon_book_chapter"],
+        "start": start,
+        "end": min(chapter["verse_count"], start + 4),
+    }
+    return await client.get("/api/verses", params=params, headers=headers)
+
+
+def _references(ctx: Context, rng: random.Random, bible_id: int) -> list[str]:
+    first, second = rng.sample(ctx.chapters[bible_id], 2)
+    return [
+        f"{first['canon_book_name']} {first['canon_book_chapter']}",
+        f"{second['canon_book_name']} {second['canon_book_chapter']}:1-{second['verse_count']}",
+    ]
+
+
+async def op_get_passages(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    versions = (await client.get("/api/versions", headers=headers)).json()
+    params = {"ref": _references(ctx, rng, user["bible_id"]), "version": versions}
+    return await client.get("/api/passages", params=params, headers=headers)
+
+
+async def op_passages(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    references = _references(ctx, rng, user["bible_id"])
+    versions = (await client.get("/api/versions", headers=headers)).json()
+    return await client.post("/api/passages", json={"references": references, "versions": versions}, headers=headers)
+
+
+async def op_analytics(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    return await client.get(f"/api/bibles/{user['bible_id']}/analytics", headers=headers)
+
+
+async def op_analytics_groups(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    params = {"by": rng.choice(["book", "chapter", "user", "testament", "month"])}
+    return await client.get(f"/api/bibles/{user['bible_id']}/analytics/groups", params=params, headers=headers)
+
+
+async def op_analytics_trend(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    params = {"bucket": rng.choice(["day", "week", "month"])}
+    return await client.get(f"/api/bibles/{user['bible_id']}/analytics/trend", params=params, headers=headers)
+
+
+async def op_analytics_compare(client, ctx, rng):
+    _, headers = ctx.user(rng)
+    params = {"by": rng.choice(["all", "testament", "book"])}
+    return await client.get("/api/analytics/compare", params=params, headers=headers)
+
+
+async def op_maintenance(client, ctx, rng):
+    _, headers = ctx.user(rng)
+    return await client.get("/api/maintenance", headers=headers)
+
+
+async def op_search(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    params = {"q": rng.choice(["light", "beginning", "word*", '"the word"', "grace"])}
+    if rng.random() < 0.5:
+        params.update(scope="transcripts", bible_id=user["bible_id"])
+    return await client.get("/api/search", params=params, headers=headers)
+
+
+async def op_list_recordings(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    params = {"limit": 100, "fields": rng.choice(["full", "summary"])}
+    return await client.get(f"/api/bibles/{user['bible_id']}/recordings", params=params, headers=headers)
+
+
+async def op_create_recording(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    chapter = rng.choice(ctx.chapters[user["bible_id"]])
+    data = {
+        "bible_id": user["bible_id"],
+        "chapter_id": chapter["chapter_id"],
+        "verse_index_start": 1,
+        "verse_index_end": 1,
+        "duration_seconds": 30,
+        "transcription_text": "in the beginning was the word",
+    }
+    files = {"file": ("bench.webm", rng.randbytes(120_000), "audio/webm")}
+    response = await client.post("/api/recordings", data=data, files=files, headers=headers)
+    if response.status_code == 200:
+        ctx.created.append((user, response.json()["recording_id"]))
+    return response
+
+
+async def op_stream_audio(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    recording_id = rng.choice(ctx.recordings[user["bible_id"]])
+    if rng.random() < 0.5:
+        headers = {**headers, "Range": "bytes=0-65535"}
+    return await client.get(f"/api/recordings/{recording_id}/audio", headers=headers)
+
+
+async def op_recording_verses(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    recording_id = rng.choice(ctx.recordings[user["bible_id"]])
+    return await client.get(f"/api/recordings/{recording_id}/verses", headers=headers)
+
+
+async def op_create_upload(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    chapter = rng.choice(ctx.chapters[user["bible_id"]])
+    data = rng.randbytes(UPLOAD_CHUNK_BYTES * 2)
+    payload = {
+        "chapter_id": chapter["chapter_id"],
+        "verse_index_start": 1,
+        "verse_index_end": 1,
+        "duration_seconds": 30,
+        "transcription_text": "in the beginning was the word",
+        "file_mime": "audio/webm",
+        "size": len(data),
+    }
+    response = await client.post("/api/uploads", json=payload, headers=headers)
+    if response.status_code == 201:
+        ctx.uploads.append({"user": user, "upload_id": response.json()["upload_id"], "data": data, "offset": 0})
+    return response
+
+
+async def _pending_upload(client, ctx, rng) -> dict:
+    if not ctx.uploads:
+        await op_create_upload(client, ctx, rng)
+    return rng.choice(ctx.uploads)
+
+
+async def op_get_upload(client, ctx, rng):
+    upload = await _pending_upload(client, ctx, rng)
+    headers = {"Authorization": f"Bearer {upload['user']['token']}"}
+    return await client.get(f"/api/uploads/{upload['upload_id']}", headers=headers)
+
+
+async def op_head_upload(client, ctx, rng):
+    upload = await _pending_upload(client, ctx, rng)
+    headers = {"Authorization": f"Bearer {upload['user']['token']}"}
+    return await client.head(f"/api/uploads/{upload['upload_id']}", headers=headers)
+
+
+async def op_append_upload(client, ctx, rng):
+    # Taken out of the pool while in flight: a second PATCH to the same upload would get 409.
+    if not ctx.uploads:
+        await op_create_upload(client, ctx, rng)
+    upload = ctx.uploads.pop()
+    offset = upload["offset"]
+    headers = {
+        "Authorization": f"Bearer {upload['user']['token']}",
+        "Upload-Offset": str(offset),
+        "Content-Type": "application/offset+octet-stream",
+    }
+    chunk = upload["data"][offset:offset + UPLOAD_CHUNK_BYTES]
+    response = await client.patch(f"/api/uploads/{upload['upload_id']}", content=chunk, headers=headers)
+    if response.status_code == 204:
+        upload["offset"] = int(response.headers["Upload-Offset"])
+    (ctx.complete_uploads if upload["offset"] == len(upload["data"]) else ctx.uploads).append(upload)
+    return response
+
+
+async def op_commit_upload(client, ctx, rng):
+    while not ctx.complete_uploads:
+        await op_append_upload(client, ctx, rng)
+    upload = ctx.complete_uploads.pop()
+    headers = {"Authorization": f"Bearer {upload['user']['token']}"}
+    response = await client.post(f"/api/uploads/{upload['upload_id']}/commit", headers=headers)
+    if response.status_code == 200:
+        ctx.created.append((upload["user"], response.json()["recording_id"]))
+    return response
+
+
+async def op_abort_upload(client, ctx, rng):
+    if not ctx.uploads:
+        await op_create_upload(client, ctx, rng)
+    upload = ctx.uploads.pop()
+    headers = {"Authorization": f"Bearer {upload['user']['token']}"}
+    return await client.delete(f"/api/uploads/{upload['upload_id']}", headers=headers)
+
+
+async def op_delete_recording(client, ctx, rng):
+    if not ctx.created:
+        await op_create_recording(client, ctx, rng)
+    user, recording_id = ctx.created.pop()
+    headers = {"Authorization": f"Bearer {user['token']}"}
+    return await client.delete(f"/api/recordings/{recording_id}", headers=headers)
+
+
+async def op_playlist(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    params = {"book_id": rng.choice(ctx.books[user["bible_id"]])}
+    return await client.get(f"/api/bibles/{user['bible_id']}/playlist", params=params, headers=headers)
+
+
+async def op_segment(client, ctx, rng):
+    user, _ = ctx.user(rng)
+    return await client.get(rng.choice(ctx.segments[user["bible_id"]]))
+
+
+async def op_download_zip(client, ctx, rng):
+    user, headers = ctx.user(rng)
+    return await client.get(f"/api/bibles/{user['bible_id']}/download", headers=headers)
+
+
+ROUTES = [
+    Route("register", op_register, share=0.05),
+    Route("login", op_login, share=0.05),
+    Route("get_bibles", op_bibles),
+    Route("get_books", op_books),
+    Route("get_chapters", op_chapters),
+    Route("get_versions", op_versions),
+    Route("get_verses", op_verses),
+    Route("get_passages", op_get_passages),
+    Route("post_passages", op_passages),
+    Route("search_text", op_search),
+    Route("list_recordings", op_list_recordings),
+    Route("bible_analytics", op_analytics),
+    Route("analytics_groups", op_analytics_groups),
+    Route("analytics_trend", op_analytics_trend),
+    Route("analytics_compare", op_analytics_compare),
+    Route("maintenance_status", op_maintenance),
+    Route("recording_verses", op_recording_verses),
+    Route("stream_audio", op_stream_audio),
+    Route("bible_playlist", op_playlist),
+    Route("get_segment", op_segment),
+    Route("create_recording", op_create_recording, share=0.25),
+    # Upload routes run in this order, so each one finds the uploads the previous left behind.
+    Route("create_upload", op_create_upload, share=0.25),
+    Route("get_upload", op_get_upload, share=0.25),
+    Route("head_upload", op_head_upload, share=0.25),
+    Route("append_upload", op_append_upload, share=0.5),
+    Route("commit_upload", op_commit_upload, share=0.2),
+    Route("abort_upload", op_abort_upload, share=0.05),
+    Route("delete_recording", op_delete_recording, share=0.25),
+    Route("download_zip", op_download_zip, share=0.05),
+]
+
+
+async def run_route(client, ctx: Context, route: Route, requests: int, workers: int, rng: random.Random) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    pending = iter(range(max(1, int(requests * route.share))))
+
+    async def worker():
+        nonlocal errors
+        for _ in pending:
+            started = time.perf_counter()
+            try:
+                response = await route.op(client, ctx, rng)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return {"latencies": latencies, "errors": errors, "elapsed": time.perf_counter() - started}
+
+
+def _client(url: Optional[str]):
+    import httpx
+
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=120)
+    from app.main import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120)
+
+
+async def generate(options: dict, users: list[dict], barrier=None) -> dict:
+    rng = random.Random(options["seed"] + os.getpid())
+    ctx = Context(users)
+    results = {}
+    async with _client(options["url"]) as client:
+        await discover(client, ctx)
+        for route in ROUTES:
+            if options["routes"] and route.name not in options["routes"]:
+                continue
+            if barrier is not None:
+                await asyncio.to_thread(barrier.wait)
+            results[route.name] = await run_route(client, ctx, route, options["requests"], options["workers"], rng)
+    return {"routes": results, "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def _child(options: dict, users: list[dict], barrier, queue):
+    queue.put(asyncio.run(generate(options, users, barrier)))
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    rank = q * (len(values) - 1)
+    lo = int(rank)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (rank - lo)
+
+
+def summarize(runs: list[dict]) -> dict:
+    routes = {}
+    for name in runs[0]["routes"]:
+        latencies = sorted(lat for run in runs for lat in run["routes"][name]["latencies"])
+        elapsed = max(run["routes"][name]["elapsed"] for run in runs)
+        errors = sum(run["routes"][name]["errors"] for run in runs)
+        routes[name] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "mean_ms": sum(latencies) / len(latencies) if latencies else None,
+            "throughput_rps": (len(latencies) - errors) / elapsed if elapsed else None,
+        }
+    return routes
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", help="where app.db and blobs go (default: a new temp dir)")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--bibles", type=int, default=2)
+    parser.add_argument("--recordings", type=int, default=500)
+    parser.add_argument("--wav-fraction", type=float, default=0.1)
+    parser.add_argument("--requests", type=int, default=200, help="requests per route per process")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent requests per process")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--routes", nargs="*", help="only run these routes")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--seed", type=int, default=505)
+    parser.add_argument("--out", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="pab-bench-")
+    os.makedirs(data_dir, exist_ok=True)
+    # Settings are read at import time, so configure the environment first.
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(data_dir, 'app.db')}")
+    os.environ.setdefault("BLOB_ROOT", os.path.join(data_dir, "blobs"))
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+    from . import dataset
+
+    spec = dataset.DatasetSpec(
+        users=args.users, bibles=args.bibles, recordings=args.recordings, wav_fraction=args.wav_fraction, seed=args.seed
+    )
+    seeded_at = time.perf_counter()
+    data = dataset.build(spec)
+    seed_seconds = time.perf_counter() - seeded_at
+
+    options = {
+        "url": args.url,
+        "requests": args.requests,
+        "workers": args.workers,
+        "routes": args.routes,
+        "seed": args.seed,
+    }
+    if args.processes <= 1:
+        runs = [asyncio.run(generate(options, data["users"]))]
+    else:
+        mp = multiprocessing.get_context("spawn")
+        barrier = mp.Barrier(args.processes)
+        queue = mp.Queue()
+        procs = [mp.Process(target=_child, args=(options, data["users"], barrier, queue)) for _ in range(args.processes)]
+        for proc in procs:
+            proc.start()
+        runs = [queue.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": args.url or "in-process",
+            "processes": args.processes,
+            "workers": args.workers,
+            "requests_per_route": args.requests,
+        },
+        "dataset": {**data["spec"], "audio_bytes": data["audio_bytes"], "seed_seconds": seed_seconds},
+        "peak_rss_mb": max(
+            [run["peak_rss_kb"] for run in runs] + [resource.getrusage(resource.RUSAGE_SELF).ru_maxrss]
+        )
+        / 1024,
+        "routes": summarize(runs),
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(output + "\n")
+    else:
+        print(output)
+    failed = [name for name, stats in report["routes"].items() if stats["errors"]]
+    if failed:
+        print("Routes with errors: " + ", ".join(failed), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
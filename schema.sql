@@ -68,7 +68,9 @@ CREATE TABLE recordings (
     verse_index_start INTEGER,
     verse_index_end INTEGER,
     accessed_count INTEGER DEFAULT 0,
-    file BLOB,
+    blob_key TEXT,
+    file_size INTEGER,
+    file_sha256 TEXT,
     file_mime TEXT,
     duration_seconds REAL,
     transcription_text TEXT